@@ -1,20 +1,38 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any
-from app.services.ai_service import AIServiceWithFallback
+from typing import Dict, Any, List, Optional
+from app.core import codecs
 from app.core.config import settings
+from app.core.storage import JSONStorageService
+from app.services.ai_service import AIServiceWithFallback, pairs_from_plan_results
+from app.services.local_inference import InferenceQueueFull
 
 router = APIRouter()
 
 # Dependencies
-def get_ai_service():
-    return AIServiceWithFallback(settings.huggingface_token)
+def get_ai_service(request: Request) -> AIServiceWithFallback:
+    return request.app.state.ai_service
+
+def get_storage(request: Request) -> JSONStorageService:
+    return request.app.state.storage
 
 class AIAnalysisRequest(BaseModel):
     expected: Dict[str, Any]
     actual: Dict[str, Any]
     custom_prompt: str = ""
 
+class AIBatchPair(BaseModel):
+    id: Optional[str] = None
+    expected: Any
+    actual: Any
+    custom_prompt: str = ""
+
+class AIBatchRequest(BaseModel):
+    pairs: Optional[List[AIBatchPair]] = None
+    test_id: Optional[str] = None  # Analyze baseline vs target for every step of a run
+    custom_prompt: str = ""
+
 class AIAnalysisResponse(BaseModel):
     differences: list
     summary: str
@@ -35,16 +53,50 @@ async def analyze_api_differences(
             request.custom_prompt
         )
         return AIAnalysisResponse(**analysis)
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI analysis failed: {str(e)}")
 
+@router.post("/analyze-batch")
+async def analyze_batch(
+    request: AIBatchRequest,
+    ai_service: AIServiceWithFallback = Depends(get_ai_service),
+    storage: JSONStorageService = Depends(get_storage)
+):
+    """Analyze many response pairs, streaming one NDJSON line per pair as it completes"""
+    if (request.pairs is None) == (request.test_id is None):
+        raise HTTPException(status_code=400, detail="Provide either pairs or test_id")
+    
+    if request.test_id is not None:
+        test_result = await storage.get_test_result(request.test_id)
+        if not test_result:
+            raise HTTPException(status_code=404, detail="Test result not found")
+        pairs = pairs_from_plan_results(test_result.get("plan_results", {}))
+    else:
+        pairs = [pair.dict() for pair in request.pairs]
+    
+    if len(pairs) > settings.ai_batch_max_pairs:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch has {len(pairs)} pairs, the limit is {settings.ai_batch_max_pairs}"
+        )
+    
+    async def lines():
+        async for result in ai_service.analyze_batch(pairs, request.custom_prompt):
+            yield codecs.encode_line(result)
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @router.get("/usage-stats")
 async def get_ai_usage_stats(ai_service: AIServiceWithFallback = Depends(get_ai_service)):
     """Get current AI usage statistics"""
     return {
         "requests_today": ai_service.request_count,
         "daily_limit": ai_service.daily_limit,
-        "cloud_requests_remaining": max(0, ai_service.daily_limit - ai_service.request_count),
+        "cloud_requests_remaining": ai_service.quota.remaining(),
         "cloud_enabled": ai_service.use_cloud,
-        "model_preference": "cloud" if ai_service.use_cloud else "local"
+        "model_preference": "cloud" if ai_service.use_cloud else "local",
+        "cache": ai_service.cache.stats() if ai_service.cache else None,
+        "local_model": ai_service.local_model.stats() if ai_service.local_model else None
     }
\ No newline at end of file
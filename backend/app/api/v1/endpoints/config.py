@@ -1,17 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from app.core.storage import JSONStorageService
-from app.core.config import settings
+from app.services.catalog import ProductCatalog
+from app.services.severity import SeverityRuleBook
 
 router = APIRouter()
 
 # Dependency to get storage service
-def get_storage():
-    return JSONStorageService(settings.data_dir)
+def get_storage(request: Request) -> JSONStorageService:
+    return request.app.state.storage
+
+def get_catalog(request: Request) -> ProductCatalog:
+    # Shared with the test executor, so both always resolve the same plans
+    return request.app.state.catalog
+
+def get_severity_rules(request: Request) -> SeverityRuleBook:
+    return request.app.state.severity_rules
 
 class ConfigReloadResponse(BaseModel):
     status: str
     message: str
+    total_plans: int = 0
 
 @router.get("/environments")
 async def get_environments(storage: JSONStorageService = Depends(get_storage)):
@@ -36,9 +45,9 @@ async def get_environments(storage: JSONStorageService = Depends(get_storage)):
     return config
 
 @router.get("/products")
-async def get_products(storage: JSONStorageService = Depends(get_storage)):
+async def get_products(catalog: ProductCatalog = Depends(get_catalog)):
     """Get product configurations"""
-    config = await storage.load_config("products")
+    config = catalog.get().products
     if not config:
         # Return example if no config exists
         return {
@@ -62,41 +71,23 @@ async def get_products(storage: JSONStorageService = Depends(get_storage)):
     return config
 
 @router.get("/plan-keys")
-async def get_plan_keys(storage: JSONStorageService = Depends(get_storage)):
+async def get_plan_keys(catalog: ProductCatalog = Depends(get_catalog)):
     """Get flat list of all available plan keys"""
-    config = await storage.load_config("products")
-    plan_keys = {"all_plans": [], "by_category": {}}
-    
-    if not config:
-        return plan_keys
-    
-    categories = config.get("categories", {})
-    
-    for category_key, category_data in categories.items():
-        category_plans = []
-        products = category_data.get("products", {})
-        
-        for product_key, product_data in products.items():
-            plans = product_data.get("plans", {})
-            for plan_key in plans.keys():
-                full_key = f"{category_key}:{product_key}:{plan_key}"
-                plan_keys["all_plans"].append(full_key)
-                category_plans.append(full_key)
-        
-        if category_plans:
-            plan_keys["by_category"][category_key] = category_plans
-    
-    return plan_keys
+    return catalog.get().plan_keys()
 
 @router.post("/reload", response_model=ConfigReloadResponse)
-async def reload_configuration(storage: JSONStorageService = Depends(get_storage)):
+async def reload_configuration(
+    catalog: ProductCatalog = Depends(get_catalog),
+    severity_rules: SeverityRuleBook = Depends(get_severity_rules)
+):
     """Reload configuration from JSON files"""
     try:
-        # In a real implementation, this would clear cache and reload
-        # For now, just return success
+        compiled = catalog.reload()
+        severity_rules.reload()
         return ConfigReloadResponse(
             status="success",
-            message="Configuration reloaded successfully"
+            message="Configuration reloaded successfully",
+            total_plans=len(compiled.all_plans)
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to reload configuration: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to reload configuration: {str(e)}")
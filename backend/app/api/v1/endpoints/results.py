@@ -1,20 +1,37 @@
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import base64
+import binascii
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional
+from app.core import codecs
+from app.core.job_queue import PlanQueue
 from app.core.storage import JSONStorageService
-from app.core.config import settings
+from app.services.run_registry import TestRunRegistry
 
 router = APIRouter()
 
 # Dependencies
-def get_storage():
-    return JSONStorageService(settings.data_dir)
+def get_storage(request: Request) -> JSONStorageService:
+    return request.app.state.storage
+
+def get_registry(request: Request) -> TestRunRegistry:
+    return request.app.state.run_registry
+
+def get_plan_queue(request: Request) -> PlanQueue:
+    return request.app.state.plan_queue
+
+# Top-level parts of a result that can be requested with ?sections=
+RESULT_SECTIONS = ("test_metadata", "execution_summary", "latency_analysis", "plan_results")
 
 class TestResultResponse(BaseModel):
     test_id: str
-    test_metadata: Dict[str, Any]
-    execution_summary: Dict[str, Any]
-    plan_results: Dict[str, Any]
+    test_metadata: Optional[Dict[str, Any]] = None
+    execution_summary: Optional[Dict[str, Any]] = None
+    latency_analysis: Optional[Dict[str, Any]] = None
+    plan_results: Optional[Dict[str, Any]] = None
+    next_cursor: Optional[str] = None
 
 class UserTestsResponse(BaseModel):
     user_id: str
@@ -24,50 +41,151 @@ class UserTestsResponse(BaseModel):
 @router.get("/{test_id}", response_model=TestResultResponse)
 async def get_test_result(
     test_id: str,
+    sections: Optional[str] = None,
+    plan_fields: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
     storage: JSONStorageService = Depends(get_storage)
 ):
-    """Get complete test result"""
+    """Get a test result, streamed plan by plan.
+    
+    ``sections`` picks top-level parts (comma-separated), ``plan_fields``
+    picks plan fields, or drops them when prefixed with ``-`` (for example
+    ``-api_calls``), ``status`` filters plans, and ``limit`` with ``cursor``
+    pages through plans. Without parameters the full result is returned.
+    """
     try:
-        test_data = await storage.get_test_result(test_id)
+        test_data = await storage.get_test_document(test_id)
         if not test_data:
             raise HTTPException(status_code=404, detail="Test result not found")
         
-        return TestResultResponse(
-            test_id=test_id,
-            test_metadata=test_data.get("test_metadata", {}),
-            execution_summary=test_data.get("execution_summary", {}),
-            plan_results=test_data.get("plan_results", {})
+        wanted = _split(sections) or list(RESULT_SECTIONS)
+        unknown = [section for section in wanted if section not in RESULT_SECTIONS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(unknown)}")
+        
+        fields = _split(plan_fields)
+        excluded = {field[1:] for field in fields if field.startswith("-")}
+        included = {field for field in fields if not field.startswith("-")}
+        if excluded and included:
+            raise HTTPException(status_code=400, detail="plan_fields cannot mix included and excluded fields")
+        
+        after = _decode_cursor(cursor) if cursor else None
+        # A cursor names the last plan of a page; one naming no plan would silently end the results
+        if after is not None and not await storage.has_plan_result(test_id, test_data, after):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        statuses = set(_split(status)) or None
+        
+        chunks = _result_chunks(
+            storage, test_id, test_data, wanted, statuses, after, limit, included, excluded
         )
+        return StreamingResponse(chunks, media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get test result: {str(e)}")
 
+def _split(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in value.split(",") if part.strip()] if value else []
+
+def _encode_cursor(plan_key: str) -> str:
+    return base64.urlsafe_b64encode(plan_key.encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str) -> str:
+    try:
+        after = base64.b64decode(cursor.encode("ascii"), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, ValueError):
+        after = ""
+    if not after:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return after
+
+def _result_chunks(
+    storage: JSONStorageService,
+    test_id: str,
+    test_data: Dict[str, Any],
+    sections: List[str],
+    statuses: Optional[set],
+    after: Optional[str],
+    limit: Optional[int],
+    included: set,
+    excluded: set
+) -> Iterator[bytes]:
+    """Write the result JSON incrementally; runs in a worker thread"""
+    yield b'{"test_id":' + codecs.json_dumps(test_id)
+    for section in ("test_metadata", "execution_summary"):
+        if section in sections:
+            yield b',"' + section.encode("ascii") + b'":' + codecs.json_dumps(test_data.get(section, {}))
+    if "latency_analysis" in sections:
+        # Only finished runs have one
+        yield b',"latency_analysis":' + codecs.json_dumps(test_data.get("latency_analysis"))
+    
+    page: Dict[str, Any] = {}
+    if "plan_results" in sections:
+        yield b',"plan_results":{'
+        separator = b""
+        plans = storage.iter_plan_page(
+            test_id, test_data, page, statuses, after, limit, included, excluded
+        )
+        for plan_key, plan_result in plans:
+            yield separator + codecs.json_dumps(plan_key) + b":" + codecs.json_dumps(plan_result)
+            separator = b","
+        yield b"}"
+    
+    next_cursor = _encode_cursor(page["next_after"]) if page.get("next_after") else None
+    yield b',"next_cursor":' + codecs.json_dumps(next_cursor) + b"}"
+
 @router.get("/user/{user_id}", response_model=UserTestsResponse)
 async def get_user_tests(
     user_id: str,
+    status: Optional[str] = None,
+    scope_type: Optional[str] = None,
+    target_env: Optional[str] = None,
+    baseline_env: Optional[str] = None,
+    sort_by: str = "started_at",
+    descending: bool = True,
+    limit: int = Query(10, ge=1, le=500),
+    offset: int = Query(0, ge=0),
     storage: JSONStorageService = Depends(get_storage)
 ):
-    """Get all tests for a user (max 10)"""
+    """Get test summaries for a user, newest first by default"""
+    filters = {
+        "user_id": user_id,
+        "status": status,
+        "scope_type": scope_type,
+        "target_env": target_env,
+        "baseline_env": baseline_env
+    }
     try:
-        user_tests = await storage.get_user_tests(user_id)
+        user_tests, total = await storage.list_tests(filters, limit, offset, sort_by, descending)
         return UserTestsResponse(
             user_id=user_id,
             tests=user_tests,
-            total_tests=len(user_tests)
+            total_tests=total
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get user tests: {str(e)}")
 
 @router.delete("/{test_id}")
 async def delete_test_result(
     test_id: str,
-    storage: JSONStorageService = Depends(get_storage)
+    storage: JSONStorageService = Depends(get_storage),
+    registry: TestRunRegistry = Depends(get_registry),
+    queue: PlanQueue = Depends(get_plan_queue)
 ):
-    """Delete a test result"""
+    """Delete a test result with its plan journal, cassette and index entry"""
     try:
-        # In JSON file system, we would delete the file
-        # For now, this is a placeholder
+        # Queued runs may be executing in another process
+        if registry.is_active(test_id) or await asyncio.to_thread(queue.has_run, test_id):
+            raise HTTPException(status_code=409, detail="Test is still running")
+        if not await storage.delete_test_result(test_id):
+            raise HTTPException(status_code=404, detail="Test result not found")
+        registry.forget(test_id)
         return {"message": f"Test {test_id} deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete test: {str(e)}")
\ No newline at end of file
@@ -1,18 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends
+import json
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any
-from app.core.storage import JSONStorageService
-from app.services.test_executor import TestExecutorService
+import asyncio
+from typing import Dict, Any, List, Optional, AsyncIterator
 from app.core.config import settings
+from app.services.run_registry import TestRunRegistry, compact_status
+from app.services.test_executor import TestExecutorService
 
 router = APIRouter()
 
 # Dependencies
-def get_storage():
-    return JSONStorageService(settings.data_dir)
-
-def get_test_executor(storage: JSONStorageService = Depends(get_storage)):
-    return TestExecutorService(storage)
+def get_test_executor(request: Request) -> TestExecutorService:
+    # Shared executor created at startup, so every request sees the same run registry
+    return request.app.state.test_executor
 
 class TestStartRequest(BaseModel):
     user_id: str
@@ -22,11 +23,23 @@ class TestStartRequest(BaseModel):
     admin_token: str
     customer_token: str
     ai_prompt: str
+    max_concurrency: Optional[int] = None  # Capped by Settings.max_concurrent_plans_per_run
+    record: bool = False  # Capture exchanges into a replay cassette
 
 class TestStartResponse(BaseModel):
     test_id: str
     message: str
 
+class TestResumeRequest(BaseModel):
+    admin_token: str
+    customer_token: str
+    max_concurrency: Optional[int] = None
+
+class TestResumeResponse(BaseModel):
+    test_id: str
+    message: str
+    resumed_plans: List[str]
+
 class TestStatusResponse(BaseModel):
     test_id: str
     status: str
@@ -36,6 +49,7 @@ class TestStatusResponse(BaseModel):
     plans: Dict[str, Any]
     target_env: str
     baseline_env: str
+    environment_limits: Optional[Dict[str, Any]] = None
 
 @router.post("/start", response_model=TestStartResponse)
 async def start_test(
@@ -59,6 +73,35 @@ async def start_test(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to start test: {str(e)}")
 
+@router.post("/{test_id}/resume", response_model=TestResumeResponse)
+async def resume_test(
+    test_id: str,
+    resume_request: TestResumeRequest,
+    executor: TestExecutorService = Depends(get_test_executor)
+):
+    """Rerun the failed and unfinished plans of a stopped test; completed plans are kept"""
+    try:
+        if executor.registry.is_active(test_id) or await asyncio.to_thread(executor.queue.has_run, test_id):
+            raise HTTPException(status_code=409, detail="Test is still running")
+        
+        test_data = await executor.storage.get_test_document(test_id)
+        if not test_data:
+            raise HTTPException(status_code=404, detail="Test not found")
+        
+        plans = await executor.resume_test(test_id, test_data, resume_request.dict())
+        if not plans:
+            raise HTTPException(status_code=400, detail="Every plan of this test has already completed")
+        
+        return TestResumeResponse(
+            test_id=test_id,
+            message=f"Resumed {len(plans)} plans of test {test_id}",
+            resumed_plans=plans
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to resume test: {str(e)}")
+
 @router.get("/{test_id}/status", response_model=TestStatusResponse)
 async def get_test_status(
     test_id: str,
@@ -75,4 +118,63 @@ async def get_test_status(
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get test status: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to get test status: {str(e)}")
+
+def _sse(event: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(event, separators=(',', ':'), default=str)}\n\n"
+
+async def _run_events(
+    request: Request,
+    registry: TestRunRegistry,
+    test_id: str,
+    finished_snapshot: Optional[Dict[str, Any]]
+) -> AsyncIterator[str]:
+    """Yield a snapshot followed by delta events until the run finishes"""
+    # Subscribe before taking the snapshot so no event falls between the two
+    subscription = registry.subscribe(test_id, settings.sse_max_pending_events)
+    try:
+        snapshot = registry.snapshot(test_id) or finished_snapshot
+        yield _sse(snapshot)
+        if snapshot["status"] != "running":
+            yield _sse({"type": "run_finished", "status": snapshot["status"], "progress": snapshot["progress"]})
+            return
+        
+        while True:
+            events = await subscription.next_events(settings.sse_heartbeat_seconds)
+            if subscription.needs_resync:
+                # The viewer fell too far behind; replace its backlog with current state
+                subscription.needs_resync = False
+                events = [registry.snapshot(test_id)] + [e for e in events if e["type"] == "run_finished"]
+            
+            if not events:
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            
+            for event in events:
+                yield _sse(event)
+            if any(event["type"] == "run_finished" for event in events):
+                return
+    finally:
+        registry.unsubscribe(test_id, subscription)
+
+@router.get("/{test_id}/events")
+async def stream_test_events(
+    test_id: str,
+    request: Request,
+    executor: TestExecutorService = Depends(get_test_executor)
+):
+    """Stream test progress as Server-Sent Events"""
+    finished_snapshot = None
+    if executor.registry.get(test_id) is None:
+        status_data = await executor.get_test_status(test_id)
+        if "error" in status_data:
+            raise HTTPException(status_code=404, detail=status_data["error"])
+        finished_snapshot = compact_status(status_data)
+    
+    return StreamingResponse(
+        _run_events(request, executor.registry, test_id, finished_snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
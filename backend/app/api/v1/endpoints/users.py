@@ -1,15 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from typing import Dict, Any
 from datetime import datetime
 from app.core.storage import JSONStorageService
-from app.core.config import settings
 
 router = APIRouter()
 
 # Dependency to get storage service
-def get_storage():
-    return JSONStorageService(settings.data_dir)
+def get_storage(request: Request) -> JSONStorageService:
+    return request.app.state.storage
 
 class UserCreate(BaseModel):
     name: str
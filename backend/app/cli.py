@@ -0,0 +1,89 @@
+"""Maintenance commands for the platform's data directory.
+
+Usage: python -m app.cli <command> [options]
+"""
+import argparse
+import asyncio
+from pathlib import Path
+from app.core.config import settings
+from app.core.job_queue import PlanQueue
+from app.core.storage import JSONStorageService
+from app.services.retention import RetentionWorker
+
+
+async def rebuild_index(args: argparse.Namespace):
+    storage = JSONStorageService(args.data_dir)
+    count = await storage.rebuild_index()
+    print(f"Indexed {count} test results")
+
+
+async def migrate_storage(args: argparse.Namespace):
+    storage = JSONStorageService(args.data_dir)
+    stats = await storage.migrate_storage()
+    print(
+        f"Migrated {stats['files']} files: "
+        f"{stats['bytes_before']:,} bytes -> {stats['bytes_after']:,} bytes"
+    )
+    if stats["skipped_live"]:
+        print(f"Skipped {stats['skipped_live']} running test results; migrate again once they finish")
+
+
+async def reshard(args: argparse.Namespace):
+    storage = JSONStorageService(args.data_dir)
+    stats = await storage.reshard()
+    print(f"Moved {stats['moved']} test results into date shards, skipped {stats['skipped']}")
+
+
+async def apply_retention(args: argparse.Namespace):
+    # Runs still in the plan queue are left alone
+    queue_path = Path(args.data_dir) / "queue" / "plans.sqlite3"
+    queue = PlanQueue(queue_path, settings.queue_max_attempts, settings.queue_credentials_key) if queue_path.exists() else None
+    worker = RetentionWorker(
+        JSONStorageService(args.data_dir),
+        max_per_user=args.max_per_user,
+        max_total=args.max_total,
+        max_age_days=args.max_age_days,
+        archive=args.archive,
+        batch_size=args.batch_size,
+        queue=queue
+    )
+    total = 0
+    while True:
+        stats = await worker.run_once()
+        total += stats["removed"]
+        if stats["archive"]:
+            print(f"Archived to {stats['archive']}")
+        if stats["removed"] < args.batch_size:
+            break
+    if queue is not None:
+        queue.close()
+    print(f"Removed {total} test results")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Insurance Testing Platform maintenance")
+    parser.add_argument("--data-dir", default=settings.data_dir)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("rebuild-index", help="Rebuild the result index from stored test results")
+    commands.add_parser("migrate-storage", help="Rewrite stored data with the configured codecs")
+    commands.add_parser("reshard", help="Move test results from the flat tests directory into date shards")
+    retention = commands.add_parser("apply-retention", help="Remove finished test results beyond the retention limits")
+    retention.add_argument("--max-per-user", type=int, default=settings.max_tests_per_user)
+    retention.add_argument("--max-total", type=int, default=settings.retention_max_tests_total)
+    retention.add_argument("--max-age-days", type=int, default=settings.retention_max_age_days)
+    retention.add_argument("--archive", action="store_true", default=settings.retention_archive)
+    retention.add_argument("--batch-size", type=int, default=settings.retention_batch_size)
+
+    args = parser.parse_args()
+    handlers = {
+        "rebuild-index": rebuild_index,
+        "migrate-storage": migrate_storage,
+        "reshard": reshard,
+        "apply-retention": apply_retention
+    }
+    asyncio.run(handlers[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Serialization and compression codecs for stored data.
+
+A codec spec is ``<format>[+<compression>]``:
+
+- formats: ``json`` (compact), ``json-pretty`` (indented, the original
+  layout), ``msgpack``
+- compression: ``gzip``, ``zstd``
+
+Writes use the codec configured for each data type in
+``Settings.storage_codecs``. Reads detect the codec from the content, so files
+written with any earlier codec, including old pretty-printed JSON, still load.
+orjson, msgpack and zstandard are optional; without orjson the stdlib json
+module is used, and the other two are only needed if they are configured.
+"""
+import gzip
+import io
+import json
+from pathlib import Path
+from typing import Any, BinaryIO, Tuple
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMATS = ("json", "json-pretty", "msgpack")
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Codecs used when Settings.storage_codecs does not name a data type
+DEFAULT_CODECS = {
+    "users": "json-pretty",
+    "configs": "json-pretty",
+    "tests": "json",
+    "plans": "json+gzip",
+    "analysis": "json"
+}
+
+
+def parse_codec(spec: str) -> Tuple[str, str]:
+    """Split a codec spec into (format, compression) and check both are usable"""
+    fmt, _, compression = spec.partition("+")
+    compression = compression or "none"
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown storage format: {fmt}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown storage compression: {compression}")
+    if fmt == "msgpack" and msgpack is None:
+        raise ValueError("The msgpack format requires the msgpack package")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the zstandard package")
+    return fmt, compression
+
+
+def codec_for(data_type: str) -> str:
+    """Codec spec configured for a data type"""
+    return settings.storage_codecs.get(data_type) or DEFAULT_CODECS.get(data_type, "json")
+
+
+def json_dumps(data: Any, pretty: bool = False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(data, default=str, option=option)
+    if pretty:
+        return json.dumps(data, indent=2, default=str).encode("utf-8")
+    return json.dumps(data, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def canonical_json(data: Any) -> bytes:
+    """Compact JSON with sorted keys, for hashing content regardless of key order"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS)
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def json_loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def encode(data: Any, spec: str) -> bytes:
+    """Serialize and optionally compress data with the given codec spec"""
+    fmt, compression = parse_codec(spec)
+    if fmt == "msgpack":
+        raw = msgpack.packb(data, default=str, use_bin_type=True)
+    else:
+        raw = json_dumps(data, pretty=fmt == "json-pretty")
+    return compress(raw, compression)
+
+
+def decode(raw: bytes) -> Any:
+    """Decode data written by any codec"""
+    raw = decompress(raw)
+    stripped = raw.lstrip()
+    if stripped[:1] in (b"{", b"["):
+        return json_loads(raw)
+    if msgpack is None:
+        raise ValueError("Stored data is not JSON and msgpack is not installed")
+    return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+
+def compress(raw: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        return gzip.compress(raw, compresslevel=settings.storage_gzip_level)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=settings.storage_zstd_level).compress(raw)
+    return raw
+
+
+def decompress(raw: bytes) -> bytes:
+    if raw[:2] == GZIP_MAGIC:
+        return gzip.decompress(raw)
+    if raw[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ValueError("Stored data is zstd compressed and zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(raw)
+    return raw
+
+
+def encode_line(record: Any) -> bytes:
+    """One compact JSON line for append-only journals"""
+    return json_dumps(record) + b"\n"
+
+
+def decode_line(line: bytes) -> Any:
+    return json_loads(line)
+
+
+def open_line_reader(path: Path) -> BinaryIO:
+    """Open a JSON Lines file for streaming, whatever compression it was written with"""
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic[:2] == GZIP_MAGIC:
+        return gzip.open(path, "rb")
+    if magic == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ValueError("Journal is zstd compressed and zstandard is not installed")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    return open(path, "rb")
+
+
+def open_line_writer(path: Path, spec: str) -> BinaryIO:
+    """Open a JSON Lines file for writing with the codec's compression"""
+    _, compression = parse_codec(spec)
+    if compression == "gzip":
+        return gzip.open(path, "wb", compresslevel=settings.storage_gzip_level)
+    if compression == "zstd":
+        compressor = zstandard.ZstdCompressor(level=settings.storage_zstd_level)
+        return compressor.stream_writer(open(path, "wb"), closefd=True)
+    return open(path, "wb")
+
+
+def is_compressed(path: Path) -> bool:
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    return magic[:2] == GZIP_MAGIC or magic == ZSTD_MAGIC
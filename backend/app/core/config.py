@@ -1,3 +1,4 @@
+from typing import Dict, List
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -6,8 +7,118 @@ class Settings(BaseSettings):
     data_dir: str = "./data"
     max_tests_per_user: int = 10
     
+    # Retention of stored test results. When enabled, a background task removes
+    # finished runs beyond max_tests_per_user per user, beyond the total limit
+    # or older than the age limit (0 disables a limit), at most
+    # retention_batch_size runs per pass. With retention_archive they are
+    # bundled into data/archive/*.tar.gz before being removed.
+    retention_enabled: bool = False
+    retention_interval_seconds: float = 3600
+    retention_max_tests_total: int = 0
+    retention_max_age_days: int = 0
+    retention_archive: bool = False
+    retention_batch_size: int = 500
+    
+    # Storage codecs per data type (users, configs, tests, plans, analysis), e.g.
+    # STORAGE_CODECS='{"tests": "msgpack+zstd"}'. See app/core/codecs.py.
+    storage_codecs: Dict[str, str] = {}
+    storage_gzip_level: int = 6
+    storage_zstd_level: int = 3
+    
+    # Seconds between products.json mtime checks by the product catalog
+    catalog_check_interval_seconds: float = 1.0
+    
+    # Test execution
+    run_history_size: int = 100  # Finished runs kept in memory for status polling
+    max_concurrent_plans: int = 50  # Plans one worker process runs at once, across all tests
+    max_concurrent_plans_per_run: int = 10  # Cap for a single test run
+    plan_timeout_seconds: float = 600
+    
+    # Plan job queue (data/queue/plans.sqlite3). The API runs an embedded
+    # worker unless worker_embedded is off; more workers are started with
+    # python -m app.worker. A job whose worker stops heartbeating for
+    # queue_lease_seconds is handed to another worker, at most
+    # queue_max_attempts times.
+    worker_embedded: bool = True
+    queue_lease_seconds: float = 60
+    queue_poll_interval_seconds: float = 0.5
+    queue_max_attempts: int = 3
+    # Passphrase that encrypts run tokens in the queue for standalone workers; same value in every process.
+    # Without it tokens stay in the memory of the API process, and only its embedded worker can run the plans.
+    queue_credentials_key: str = ""
+    
+    # Progress streaming (GET /tests/{test_id}/events)
+    sse_heartbeat_seconds: float = 15
+    sse_max_pending_events: int = 2000  # Per viewer, after coalescing by plan
+    
+    # Outbound HTTP to target/baseline environments (one pool per environment)
+    http_timeout_seconds: float = 30
+    http_connect_timeout_seconds: float = 10
+    http_max_connections_per_env: int = 100
+    http_max_keepalive_per_env: int = 20
+    http_keepalive_expiry_seconds: float = 30
+    http2_enabled: bool = True  # Used when the h2 package is installed
+    http_max_text_body_chars: int = 10000  # Non-JSON bodies are truncated to this
+    
+    # Outbound limits per environment; an environments.json entry can override each under "rate_limit"
+    env_limiter_enabled: bool = True
+    env_requests_per_second: float = 0  # 0 = no rate cap
+    env_burst: int = 0  # 0 = one second's worth of requests
+    env_initial_concurrency: int = 16
+    env_min_concurrency: int = 1
+    env_max_concurrency: int = 64
+    env_latency_tolerance: float = 2.0  # Latency above this multiple of the recent minimum halves the limit
+    env_max_retries: int = 3  # Retries after 429/503 and failed connects
+    env_retry_backoff_seconds: float = 0.5
+    env_retry_backoff_max_seconds: float = 30  # Also caps Retry-After
+    
+    # Structural diff of API responses
+    diff_numeric_abs_tolerance: float = 0.0
+    diff_numeric_rel_tolerance: float = 0.0
+    diff_date_tolerance_seconds: float = 0.0
+    diff_list_keys: List[str] = ["id", "code", "key", "plan_id"]  # Keys used to align arrays of objects
+    diff_max_differences: int = 1000
+    diff_max_value_chars: int = 200
+    
+    # Metrics exposed at GET /metrics in Prometheus text format
+    metrics_enabled: bool = True
+    metrics_loop_lag_interval_seconds: float = 0.5
+    
+    # Latency analysis: a target is slower when it exceeds both the ratio and the absolute delta
+    latency_sketch_accuracy: float = 0.01  # Relative error of reported quantiles
+    latency_regression_ratio: float = 0.25
+    latency_regression_min_ms: float = 50
+    latency_min_samples: int = 5  # Calls needed on each side before a step or endpoint gets a verdict
+    latency_history_runs: int = 5  # Earlier runs against the same target compared with each run
+    
     # Hugging Face AI (optional)
     huggingface_token: str = ""
+    ai_daily_cloud_limit: int = 50  # Conservative daily limit for free tier
+    ai_max_concurrent_cloud_requests: int = 4
+    
+    # On-box model used when cloud analysis is off (empty disables it). Runs in
+    # worker processes; only they import torch/transformers.
+    ai_local_model: str = ""  # e.g. "Qwen/Qwen2.5-0.5B-Instruct"
+    ai_local_workers: int = 1
+    ai_local_threads_per_worker: int = 0  # 0 leaves torch's default
+    ai_local_max_batch_size: int = 8
+    ai_local_batch_wait_ms: float = 20
+    ai_local_max_queue: int = 64  # Further requests get 503 until the queue drains
+    ai_local_max_new_tokens: int = 400
+    ai_local_prompt_max_differences: int = 40
+    
+    # Batch analysis (POST /ai/analyze-batch)
+    ai_batch_max_pairs: int = 5000
+    ai_batch_prompt_budget_chars: int = 6000  # Payload characters per grouped cloud prompt
+    ai_batch_max_pairs_per_prompt: int = 8
+    ai_batch_process_min_bytes: int = 256 * 1024  # Larger pairs are diffed in a worker process
+    ai_batch_process_workers: int = 0  # 0 uses one worker per CPU
+    
+    # Cache of difference analysis results (memory LRU in front of data/cache/analysis)
+    analysis_cache_enabled: bool = True
+    analysis_cache_memory_entries: int = 1000
+    analysis_cache_max_disk_mb: int = 256
+    analysis_cache_ttl_seconds: float = 7 * 24 * 3600
     
     class Config:
         env_file = ".env"
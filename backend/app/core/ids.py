@@ -0,0 +1,81 @@
+"""Run identifiers.
+
+New runs get ULID-style IDs, ``test_`` followed by 26 Crockford base32
+characters: a 48-bit millisecond timestamp then 80 random bits. They sort by
+creation time as plain strings and cannot collide between runs started in
+the same second. IDs generated in the same millisecond by one process
+increment the random part, so they still sort in creation order.
+
+Older runs use ``test_%Y%m%d_%H%M%S``. Both kinds resolve to a creation time
+and from it a ``YYYY/MM/DD`` shard directory.
+"""
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+PREFIX = "test_"
+
+CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_DECODE = {char: value for value, char in enumerate(CROCKFORD)}
+
+ULID_ID = re.compile(r"^test_([0-9A-HJKMNP-TV-Z]{26})$", re.IGNORECASE)
+LEGACY_ID = re.compile(r"^test_(\d{8}_\d{6})$")
+
+_lock = threading.Lock()
+_last_ms = -1
+_last_random = 0
+
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        chars.append(CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_test_id() -> str:
+    """A new time-sortable run ID"""
+    global _last_ms, _last_random
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms <= _last_ms:
+            # Same millisecond (or the clock stepped back): stay monotonic
+            now_ms = _last_ms
+            _last_random = (_last_random + 1) & ((1 << 80) - 1)
+        else:
+            _last_ms = now_ms
+            _last_random = int.from_bytes(os.urandom(10), "big")
+        return PREFIX + _encode(now_ms, 10) + _encode(_last_random, 16)
+
+
+def test_id_time(test_id: str) -> Optional[datetime]:
+    """Creation time encoded in a run ID, or None for IDs of unknown shape.
+
+    ULID-style IDs give a UTC time; legacy IDs give the server's local time
+    they were written with, without a timezone.
+    """
+    match = ULID_ID.match(test_id)
+    if match:
+        ms = 0
+        for char in match.group(1)[:10].upper():
+            ms = ms * 32 + _DECODE[char]
+        return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+    match = LEGACY_ID.match(test_id)
+    if match:
+        try:
+            return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+        except ValueError:
+            return None
+    return None
+
+
+def shard_for(test_id: str) -> Optional[str]:
+    """Relative ``YYYY/MM/DD`` directory for a run, or None if the ID has no date"""
+    created = test_id_time(test_id)
+    if created is None:
+        return None
+    return created.strftime("%Y/%m/%d")
@@ -0,0 +1,415 @@
+"""Durable queue of plan-level work items.
+
+Starting a run enqueues one job per plan in a SQLite database under
+``data/queue``. Workers (the one embedded in the API, and any started with
+``python -m app.worker``) claim jobs under a lease, extend it with
+heartbeats while the plan runs, and complete the job with a short result
+summary. The plan's full result goes to the run's plan journal. When a
+worker dies, its lease runs out and the job is handed to another worker, up
+to ``max_attempts`` claims in total.
+
+Every visible change stamps the job with the next revision number, so the
+API follows progress by reading only the rows changed since its last look.
+
+Run credentials never reach the database in plain text. The process that
+queues a run keeps them in memory and renews a hold on the run while it is
+alive. With a ``credentials_key``, they are also stored encrypted, so
+standalone workers with the same key can run the plans. Credentials are
+dropped as soon as the run is finalized. A run whose credentials no live
+process can supply is "stranded" and gets interrupted.
+"""
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    CRYPTOGRAPHY_AVAILABLE = True
+except ImportError:
+    CRYPTOGRAPHY_AVAILABLE = False
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    test_id TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    max_concurrency INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    finalizing INTEGER NOT NULL DEFAULT 0,
+    credentials TEXT,
+    credentials_held_until REAL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    test_id TEXT NOT NULL,
+    plan_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    rev INTEGER NOT NULL,
+    UNIQUE (test_id, plan_key)
+);
+CREATE INDEX IF NOT EXISTS jobs_run_status ON jobs (test_id, status, job_id);
+CREATE INDEX IF NOT EXISTS jobs_status_lease ON jobs (status, lease_expires);
+CREATE INDEX IF NOT EXISTS jobs_rev ON jobs (rev);
+CREATE TABLE IF NOT EXISTS revision (value INTEGER NOT NULL);
+INSERT INTO revision SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM revision);
+"""
+
+# Job states: waiting for a worker, held under a lease, finished
+QUEUED, LEASED, DONE = "queued", "leased", "done"
+
+# Run config fields kept out of the runs.config column
+CREDENTIAL_FIELDS = ("admin_token", "customer_token")
+
+
+class CredentialSealer:
+    """Encrypts run credentials with a key shared by the API and worker processes"""
+
+    def __init__(self, key: str):
+        if not CRYPTOGRAPHY_AVAILABLE:
+            raise RuntimeError("The cryptography package is needed to store run credentials encrypted")
+        # Any passphrase works; Fernet wants 32 url-safe base64 bytes
+        self._fernet = Fernet(base64.urlsafe_b64encode(hashlib.sha256(key.encode("utf-8")).digest()))
+
+    def seal(self, credentials: Dict[str, Any]) -> str:
+        return self._fernet.encrypt(json.dumps(credentials).encode("utf-8")).decode("ascii")
+
+    def unseal(self, token: str) -> Optional[Dict[str, Any]]:
+        """The credentials, or None when they were sealed with another key"""
+        try:
+            return json.loads(self._fernet.decrypt(token.encode("ascii")))
+        except InvalidToken:
+            return None
+
+
+def split_credentials(config: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(config without credentials, credentials)"""
+    public = {key: value for key, value in config.items() if key not in CREDENTIAL_FIELDS}
+    credentials = {key: config[key] for key in CREDENTIAL_FIELDS if key in config}
+    return public, credentials
+
+
+class PlanQueue:
+    """SQLite-backed plan job queue shared by the API and worker processes.
+
+    Each process opens its own connection; writes take SQLite's write lock
+    with ``BEGIN IMMEDIATE``, so claims from concurrent workers never hand out
+    the same job. Methods are synchronous; callers run them in a thread.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_attempts: int = 3,
+        credentials_key: str = "",
+        credentials_lease_seconds: float = 60
+    ):
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.sealer = CredentialSealer(credentials_key) if credentials_key else None
+        self.credentials_lease_seconds = credentials_lease_seconds
+        # Credentials of the runs this process queued
+        self._credentials: Dict[str, Dict[str, Any]] = {}
+        self._renewed_at = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def enqueue_run(self, test_id: str, config: Dict[str, Any], plan_keys: List[str], max_concurrency: int):
+        """Queue every plan of a run in one transaction; credentials stay in memory or are stored sealed"""
+        public, credentials = split_credentials(config)
+        now = time.time()
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO runs (test_id, config, max_concurrency, created_at, credentials, credentials_held_until) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (test_id, json.dumps(public, separators=(",", ":"), default=str), max_concurrency, now,
+                 self.sealer.seal(credentials) if self.sealer else None, now + self.credentials_lease_seconds)
+            )
+            self._credentials[test_id] = credentials
+            rev = self._next_revisions(conn, len(plan_keys))
+            conn.executemany(
+                "INSERT INTO jobs (test_id, plan_key, status, rev) VALUES (?, ?, ?, ?)",
+                [(test_id, plan_key, QUEUED, rev + i) for i, plan_key in enumerate(plan_keys)]
+            )
+
+    def claim(self, worker_id: str, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        """Lease up to ``limit`` jobs, oldest run first, within each run's concurrency cap"""
+        if limit <= 0:
+            return []
+        now = time.time()
+        claimed: List[Dict[str, Any]] = []
+        with self._write() as conn:
+            self._expire_leases(conn, now)
+            leased = dict(conn.execute(
+                "SELECT test_id, COUNT(*) FROM jobs WHERE status = ? GROUP BY test_id", (LEASED,)
+            ).fetchall())
+            runs = conn.execute(
+                "SELECT test_id, config, max_concurrency, credentials FROM runs WHERE finalizing = 0 ORDER BY created_at"
+            ).fetchall()
+            for run in runs:
+                room = min(run["max_concurrency"] - leased.get(run["test_id"], 0), limit - len(claimed))
+                if room <= 0:
+                    continue
+                credentials = self._run_credentials(run["test_id"], run["credentials"])
+                if credentials is None:
+                    # Left to a process that holds the credentials
+                    continue
+                rows = conn.execute(
+                    "SELECT job_id, plan_key, attempts FROM jobs WHERE test_id = ? AND status = ? ORDER BY job_id LIMIT ?",
+                    (run["test_id"], QUEUED, room)
+                ).fetchall()
+                if not rows:
+                    continue
+                config = dict(json.loads(run["config"]), **credentials)
+                rev = self._next_revisions(conn, len(rows))
+                for i, row in enumerate(rows):
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, worker_id = ?, lease_expires = ?, attempts = attempts + 1, rev = ? "
+                        "WHERE job_id = ?",
+                        (LEASED, worker_id, now + lease_seconds, rev + i, row["job_id"])
+                    )
+                    claimed.append({
+                        "job_id": row["job_id"],
+                        "test_id": run["test_id"],
+                        "plan_key": row["plan_key"],
+                        "attempt": row["attempts"] + 1,
+                        "config": config
+                    })
+                if len(claimed) >= limit:
+                    break
+        return claimed
+
+    def heartbeat(self, worker_id: str, job_ids: List[int], lease_seconds: float) -> List[int]:
+        """Extend the leases this worker still holds; returns the jobs it holds"""
+        if not job_ids:
+            return []
+        placeholders = ", ".join("?" * len(job_ids))
+        with self._write() as conn:
+            conn.execute(
+                f"UPDATE jobs SET lease_expires = ? WHERE worker_id = ? AND status = ? AND job_id IN ({placeholders})",
+                [time.time() + lease_seconds, worker_id, LEASED] + list(job_ids)
+            )
+            rows = conn.execute(
+                f"SELECT job_id FROM jobs WHERE worker_id = ? AND status = ? AND job_id IN ({placeholders})",
+                [worker_id, LEASED] + list(job_ids)
+            ).fetchall()
+        return [row["job_id"] for row in rows]
+
+    def complete(self, job_id: int, worker_id: str, result: Dict[str, Any]) -> bool:
+        """Record a finished job; False if another worker has taken it over"""
+        with self._write() as conn:
+            # A job whose lease lapsed but that nobody has claimed again is still ours to finish
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, lease_expires = NULL, rev = ? "
+                "WHERE job_id = ? AND (status = ? OR (status = ? AND worker_id = ?))",
+                (DONE, json.dumps(result, separators=(",", ":"), default=str), self._next_revisions(conn, 1),
+                 job_id, QUEUED, LEASED, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, worker_id: str, job_ids: List[int]):
+        """Hand unfinished jobs back without counting the attempt, e.g. on shutdown"""
+        with self._write() as conn:
+            for job_id in job_ids:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker_id = NULL, lease_expires = NULL, "
+                    "attempts = MAX(attempts - 1, 0), rev = ? WHERE job_id = ? AND worker_id = ? AND status = ?",
+                    (QUEUED, self._next_revisions(conn, 1), job_id, worker_id, LEASED)
+                )
+
+    def changes(self, since_rev: int, limit: int = 5000) -> Tuple[List[Dict[str, Any]], int]:
+        """Jobs changed after ``since_rev``, and the revision to continue from"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT test_id, plan_key, status, attempts, result, rev FROM jobs WHERE rev > ? ORDER BY rev LIMIT ?",
+                (since_rev, limit)
+            ).fetchall()
+        changed = [
+            {
+                "test_id": row["test_id"],
+                "plan_key": row["plan_key"],
+                "status": row["status"],
+                "attempts": row["attempts"],
+                "result": json.loads(row["result"]) if row["result"] else None
+            }
+            for row in rows
+        ]
+        return changed, rows[-1]["rev"] if rows else since_rev
+
+    def runs(self) -> List[str]:
+        """Runs that still have a queue entry"""
+        with self._lock:
+            return [row["test_id"] for row in self._conn.execute("SELECT test_id FROM runs")]
+
+    def has_run(self, test_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM runs WHERE test_id = ?", (test_id,)).fetchone() is not None
+
+    def run_plans(self, test_id: str) -> List[str]:
+        """Plan keys queued for a run, in queue order"""
+        with self._lock:
+            rows = self._conn.execute("SELECT plan_key FROM jobs WHERE test_id = ? ORDER BY job_id", (test_id,))
+            return [row["plan_key"] for row in rows]
+
+    def drained_runs(self) -> List[str]:
+        """Runs whose jobs are all done and that nobody is finalizing yet"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT test_id FROM runs r WHERE finalizing = 0 AND NOT EXISTS ("
+                "SELECT 1 FROM jobs j WHERE j.test_id = r.test_id AND j.status != ?)",
+                (DONE,)
+            ).fetchall()
+        return [row["test_id"] for row in rows]
+
+    def claim_finalization(self, test_id: str) -> bool:
+        """Only one API process gets to finalize a drained or stranded run; its credentials go at once"""
+        with self._write() as conn:
+            cursor = conn.execute(
+                "UPDATE runs SET finalizing = 1, credentials = NULL WHERE test_id = ? AND finalizing = 0", (test_id,)
+            )
+            if cursor.rowcount == 1:
+                self._credentials.pop(test_id, None)
+            return cursor.rowcount == 1
+
+    def remove_run(self, test_id: str):
+        with self._write() as conn:
+            conn.execute("DELETE FROM jobs WHERE test_id = ?", (test_id,))
+            conn.execute("DELETE FROM runs WHERE test_id = ?", (test_id,))
+            self._credentials.pop(test_id, None)
+
+    def renew_credentials(self):
+        """Tell other processes the runs queued here still have their credentials"""
+        now = time.time()
+        if not self._credentials or now - self._renewed_at < self.credentials_lease_seconds / 3:
+            return
+        self._renewed_at = now
+        test_ids = list(self._credentials)
+        with self._write() as conn:
+            for start in range(0, len(test_ids), 500):
+                batch = test_ids[start:start + 500]
+                placeholders = ", ".join("?" * len(batch))
+                conn.execute(
+                    f"UPDATE runs SET credentials_held_until = ? WHERE test_id IN ({placeholders})",
+                    [now + self.credentials_lease_seconds] + batch
+                )
+                # Runs another process finalized or removed need no credentials any more
+                present = {row["test_id"] for row in conn.execute(
+                    f"SELECT test_id FROM runs WHERE finalizing = 0 AND test_id IN ({placeholders})", batch
+                )}
+                for test_id in set(batch) - present:
+                    self._credentials.pop(test_id, None)
+
+    def stranded_runs(self) -> List[str]:
+        """Runs whose credentials are neither stored nor held by a live process"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT test_id, credentials FROM runs WHERE finalizing = 0 "
+                "AND (credentials_held_until IS NULL OR credentials_held_until < ?)",
+                (time.time(),)
+            ).fetchall()
+        # Sealed credentials count only when this process can read them
+        return [row["test_id"] for row in rows if self._run_credentials(row["test_id"], row["credentials"]) is None]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            runs = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        return {"runs": runs, **{status: counts.get(status, 0) for status in (QUEUED, LEASED, DONE)}}
+
+    def _write(self) -> "QueueTransaction":
+        return QueueTransaction(self)
+
+    def _run_credentials(self, test_id: str, sealed: Optional[str]) -> Optional[Dict[str, Any]]:
+        credentials = self._credentials.get(test_id)
+        if credentials is None and sealed and self.sealer:
+            credentials = self.sealer.unseal(sealed)
+        return credentials
+
+    def _migrate(self):
+        """Add the credential columns, and move tokens out of configs stored before them"""
+        with self._write() as conn:
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(runs)")}
+            for column, kind in (("credentials", "TEXT"), ("credentials_held_until", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE runs ADD COLUMN {column} {kind}")
+            now = time.time()
+            for row in conn.execute("SELECT test_id, config FROM runs").fetchall():
+                public, credentials = split_credentials(json.loads(row["config"]))
+                if not credentials:
+                    continue
+                conn.execute(
+                    "UPDATE runs SET config = ?, credentials = ?, credentials_held_until = ? WHERE test_id = ?",
+                    (json.dumps(public, separators=(",", ":"), default=str),
+                     self.sealer.seal(credentials) if self.sealer else None,
+                     now + self.credentials_lease_seconds, row["test_id"])
+                )
+                self._credentials[row["test_id"]] = credentials
+
+    def _next_revisions(self, conn: sqlite3.Connection, count: int) -> int:
+        """Reserve ``count`` revision numbers; returns the first"""
+        conn.execute("UPDATE revision SET value = value + ?", (count,))
+        return conn.execute("SELECT value FROM revision").fetchone()[0] - count + 1
+
+    def _expire_leases(self, conn: sqlite3.Connection, now: float):
+        """Requeue jobs whose worker stopped heartbeating, or fail them after max_attempts"""
+        rows = conn.execute(
+            "SELECT job_id, attempts FROM jobs WHERE status = ? AND lease_expires < ?", (LEASED, now)
+        ).fetchall()
+        for row in rows:
+            rev = self._next_revisions(conn, 1)
+            if row["attempts"] >= self.max_attempts:
+                result = {
+                    "status": "failed",
+                    "error": f"Plan abandoned after {row['attempts']} workers stopped responding",
+                    "api_call_count": 0,
+                    "comparison_status": None
+                }
+                conn.execute(
+                    "UPDATE jobs SET status = ?, result = ?, lease_expires = NULL, rev = ? WHERE job_id = ?",
+                    (DONE, json.dumps(result), rev, row["job_id"])
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker_id = NULL, lease_expires = NULL, rev = ? WHERE job_id = ?",
+                    (QUEUED, rev, row["job_id"])
+                )
+
+
+class QueueTransaction:
+    """Holds the queue's connection lock and SQLite's write lock until exit"""
+
+    def __init__(self, queue: PlanQueue):
+        self.queue = queue
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.queue._lock.acquire()
+        try:
+            self.queue._conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.queue._lock.release()
+            raise
+        return self.queue._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.queue._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.queue._lock.release()
+        return False
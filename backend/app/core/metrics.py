@@ -0,0 +1,289 @@
+"""In-process metrics with Prometheus text exposition.
+
+Metric families are declared once at import time. Call sites bind the
+labelled child they need, either at import time for fixed labels or through
+``labels()`` whose children are cached per label tuple, so recording a value
+is an attribute update with no per-call dict allocation. Histogram buckets
+are preallocated lists.
+
+Values are recorded from the event loop thread and are not locked. Each
+process keeps its own values; ``GET /metrics`` on an API process reports that
+process and its embedded plan worker.
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; request handlers, storage and outbound calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Seconds; AI backends and whole plans take much longer
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+LOOP_LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+
+class HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bucket plus the +Inf overflow
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricFamily:
+    """A named metric with a fixed set of label names"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[Tuple[str, ...], object] = {}
+        # Metrics without labels record straight into their single child
+        self._default = self.labels() if not self.labelnames else None
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            child = self.children[values] = self._new_child()
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self.children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: Tuple[str, ...], child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class Counter(MetricFamily):
+    kind = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+
+class Gauge(MetricFamily):
+    kind = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default.dec(amount)
+
+
+class Histogram(MetricFamily):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _render_child(self, values: Tuple[str, ...], child: HistogramChild) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """All metric families of the process, rendered in declaration order"""
+
+    def __init__(self):
+        self.families: Dict[str, MetricFamily] = {}
+
+    def _add(self, family: MetricFamily) -> MetricFamily:
+        if family.name in self.families:
+            raise ValueError(f"Metric {family.name} is already registered")
+        self.families[family.name] = family
+        return family
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in self.families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# API requests, labelled by route template so path parameters do not multiply series
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "API requests handled", ("method", "route", "status")
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time until the response headers were ready", ("method", "route")
+)
+
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "event_loop_lag_seconds", "Delay of timer callbacks behind schedule", buckets=LOOP_LAG_BUCKETS
+)
+
+STORAGE_SECONDS = REGISTRY.histogram(
+    "storage_operation_duration_seconds", "Result storage reads and writes", ("operation",)
+)
+STORAGE_BYTES = REGISTRY.counter(
+    "storage_bytes_total", "Bytes read from and written to result storage", ("operation",)
+)
+
+PLAN_JOBS = REGISTRY.gauge("plan_queue_jobs", "Jobs in the plan queue by status", ("status",))
+QUEUED_RUNS = REGISTRY.gauge("plan_queue_runs", "Runs with jobs in the plan queue")
+ACTIVE_RUNS = REGISTRY.gauge("test_runs_active", "Runs registered as in flight in this process")
+ACTIVE_PLANS = REGISTRY.gauge("plans_active", "Plans executing in this process")
+PLANS_FINISHED = REGISTRY.counter("plans_finished_total", "Plans executed in this process", ("status",))
+PLAN_SECONDS = REGISTRY.histogram(
+    "plan_duration_seconds", "Time to execute one plan", ("status",), buckets=SLOW_BUCKETS
+)
+
+OUTBOUND_REQUESTS = REGISTRY.counter(
+    "outbound_requests_total", "Calls to tested environments", ("environment", "outcome")
+)
+OUTBOUND_SECONDS = REGISTRY.histogram(
+    "outbound_request_duration_seconds", "Latency of calls to tested environments", ("environment",)
+)
+OUTBOUND_RETRIES = REGISTRY.counter(
+    "outbound_retries_total", "Retried calls to tested environments", ("environment", "reason")
+)
+OUTBOUND_CONCURRENCY_LIMIT = REGISTRY.gauge(
+    "outbound_concurrency_limit", "Adaptive limit on calls in flight to a tested environment", ("environment",)
+)
+
+AI_REQUESTS = REGISTRY.counter(
+    "ai_requests_total", "AI analysis calls by backend", ("backend", "outcome")
+)
+AI_SECONDS = REGISTRY.histogram(
+    "ai_request_duration_seconds", "Duration of AI analysis calls", ("backend",), buckets=SLOW_BUCKETS
+)
+
+
+def status_class(status_code: Optional[int]) -> str:
+    """Outcome label for a response: "2xx", "4xx", ... or "error" without one"""
+    return f"{status_code // 100}xx" if status_code else "error"
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a timer that should fire every ``interval``"""
+
+    def __init__(self, interval: float = 0.5, clock: Callable[[], float] = time.perf_counter):
+        self.interval = interval
+        self.clock = clock
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            started = self.clock()
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG_SECONDS.observe(max(0.0, self.clock() - started - self.interval))
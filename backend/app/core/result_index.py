@@ -0,0 +1,238 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# Columns that listings may filter on
+FILTER_COLUMNS = ("user_id", "status", "scope_type", "target_env", "baseline_env")
+
+# Columns that listings may sort on
+SORT_COLUMNS = ("started_at", "completed_at", "total_plans", "failed_plans")
+
+# Runs in these states are never picked for retention
+ACTIVE_STATUSES = ("pending", "running")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    test_id TEXT PRIMARY KEY,
+    user_id TEXT,
+    status TEXT,
+    scope_type TEXT,
+    scope TEXT,
+    target_env TEXT,
+    baseline_env TEXT,
+    started_at TEXT,
+    completed_at TEXT,
+    total_plans INTEGER,
+    completed_plans INTEGER,
+    failed_plans INTEGER,
+    total_api_calls INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_user_started ON runs (user_id, started_at DESC);
+CREATE INDEX IF NOT EXISTS runs_status_started ON runs (status, started_at DESC);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started_at DESC);
+"""
+
+
+class ResultIndex:
+    """SQLite secondary index of test run metadata.
+
+    Holds one row per run with the fields the listings need, so user listings,
+    filters and top-N queries never open the result documents themselves. The
+    JSON files stay the source of truth and the index can be rebuilt from them.
+    Methods are synchronous; the storage service calls them from a worker thread.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def transaction(self) -> "IndexTransaction":
+        """Hold the index write lock and an open transaction until exit"""
+        return IndexTransaction(self)
+
+    def upsert(self, test_id: str, test_data: Dict[str, Any]):
+        with self.transaction() as tx:
+            tx.upsert(test_id, test_data)
+
+    def delete(self, test_id: str):
+        with self.transaction() as tx:
+            tx.delete(test_id)
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM runs LIMIT 1").fetchone() is None
+
+    def query(
+        self,
+        filters: Dict[str, Any],
+        limit: int = 10,
+        offset: int = 0,
+        sort_by: str = "started_at",
+        descending: bool = True
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Return (run summaries, total matching runs) for the given filters"""
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort_by}")
+
+        where, params = self._where(filters)
+        order = "DESC" if descending else "ASC"
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM runs{where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM runs{where} ORDER BY {sort_by} {order}, test_id {order} LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [self._to_summary(row) for row in rows], total
+
+    def retention_candidates(
+        self,
+        max_per_user: int = 0,
+        max_total: int = 0,
+        started_before: Optional[str] = None,
+        limit: int = 500
+    ) -> Dict[str, str]:
+        """Finished runs past a retention limit, oldest first, mapped to the limit they exceed.
+
+        A limit of 0 (or no ``started_before``) is not enforced. Active runs
+        count toward the limits but are never returned.
+        """
+        finished = "status NOT IN ({})".format(", ".join("?" * len(ACTIVE_STATUSES)))
+        active = list(ACTIVE_STATUSES)
+        queries = []
+        if started_before:
+            queries.append(("age", f"SELECT test_id, started_at FROM runs WHERE {finished} AND started_at < ?", active + [started_before]))
+        if max_per_user:
+            queries.append((
+                "per_user",
+                f"""SELECT test_id, started_at FROM (
+                    SELECT test_id, status, started_at, ROW_NUMBER() OVER (
+                        PARTITION BY user_id ORDER BY started_at DESC, test_id DESC
+                    ) AS position FROM runs
+                ) WHERE position > ? AND {finished}""",
+                [max_per_user] + active
+            ))
+        if max_total:
+            queries.append((
+                "total",
+                f"""SELECT test_id, started_at FROM (
+                    SELECT test_id, status, started_at FROM runs
+                    ORDER BY started_at DESC, test_id DESC LIMIT -1 OFFSET ?
+                ) WHERE {finished}""",
+                [max_total] + active
+            ))
+        
+        found: Dict[str, Tuple[str, str]] = {}
+        with self._lock:
+            for reason, sql, params in queries:
+                for row in self._conn.execute(f"{sql} ORDER BY started_at ASC LIMIT ?", params + [limit]):
+                    found.setdefault(row["test_id"], (row["started_at"] or "", reason))
+        oldest = sorted(found.items(), key=lambda item: item[1][0])[:limit]
+        return {test_id: reason for test_id, (_, reason) in oldest}
+    
+    def rebuild(self, documents: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Replace the index contents with rows built from (test_id, document) pairs"""
+        count = 0
+        with self.transaction() as tx:
+            tx.execute("DELETE FROM runs")
+            for test_id, test_data in documents:
+                tx.upsert(test_id, test_data)
+                count += 1
+        return count
+
+    def _where(self, filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Cannot filter by {column}")
+            clauses.append(f"{column} = ?")
+            params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def _to_summary(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Shape an index row like the metadata/summary part of a result document"""
+        return {
+            "test_id": row["test_id"],
+            "test_metadata": {
+                "test_id": row["test_id"],
+                "user_id": row["user_id"],
+                "status": row["status"],
+                "scope": json.loads(row["scope"]) if row["scope"] else {},
+                "environments": {"target": row["target_env"], "baseline": row["baseline_env"]},
+                "started_at": row["started_at"],
+                "completed_at": row["completed_at"]
+            },
+            "execution_summary": {
+                "total_plans": row["total_plans"],
+                "completed_plans": row["completed_plans"],
+                "failed_plans": row["failed_plans"],
+                "total_api_calls": row["total_api_calls"]
+            }
+        }
+
+
+class IndexTransaction:
+    """Context manager wrapping one index write transaction"""
+
+    def __init__(self, index: ResultIndex):
+        self.index = index
+        self.conn = index._conn
+
+    def __enter__(self) -> "IndexTransaction":
+        self.index._lock.acquire()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.index._lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.index._lock.release()
+        return False
+
+    def execute(self, sql: str, params: Optional[List[Any]] = None):
+        return self.conn.execute(sql, params or [])
+
+    def upsert(self, test_id: str, test_data: Dict[str, Any]):
+        metadata = test_data.get("test_metadata", {})
+        summary = test_data.get("execution_summary", {})
+        scope = metadata.get("scope") or {}
+        environments = metadata.get("environments") or {}
+        self.conn.execute(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                test_id,
+                metadata.get("user_id"),
+                metadata.get("status"),
+                scope.get("type"),
+                json.dumps(scope, separators=(",", ":"), default=str),
+                environments.get("target"),
+                environments.get("baseline"),
+                metadata.get("started_at"),
+                metadata.get("completed_at"),
+                summary.get("total_plans", 0),
+                summary.get("completed_plans", 0),
+                summary.get("failed_plans", 0),
+                summary.get("total_api_calls", 0)
+            )
+        )
+
+    def delete(self, test_id: str):
+        self.conn.execute("DELETE FROM runs WHERE test_id = ?", (test_id,))
@@ -1,14 +1,29 @@
-import json
+import asyncio
+import glob
+import itertools
 import os
+import shutil
+import tarfile
+import time
 import aiofiles
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator, Tuple
 from datetime import datetime
 from pathlib import Path
+from app.core import codecs, ids, metrics
+from app.core.result_index import ResultIndex
+
+_READ_SECONDS = metrics.STORAGE_SECONDS.labels("read_document")
+_READ_BYTES = metrics.STORAGE_BYTES.labels("read_document")
+_WRITE_SECONDS = metrics.STORAGE_SECONDS.labels("write_document")
+_WRITE_BYTES = metrics.STORAGE_BYTES.labels("write_document")
+_APPEND_SECONDS = metrics.STORAGE_SECONDS.labels("append_plan")
+_APPEND_BYTES = metrics.STORAGE_BYTES.labels("append_plan")
 
 class JSONStorageService:
     def __init__(self, data_dir: str = "./data"):
         self.data_dir = Path(data_dir)
         self._ensure_directories()
+        self.index = ResultIndex(self.data_dir / "index" / "results.sqlite3")
     
     def _ensure_directories(self):
         """Create necessary directories if they don't exist"""
@@ -16,7 +31,11 @@ class JSONStorageService:
             "users",
             "configs", 
             "tests",
-            "cache"
+            "cache",
+            "cassettes",
+            "index",
+            "queue",
+            "archive"
         ]
         
         for directory in directories:
@@ -28,8 +47,8 @@ class JSONStorageService:
             file_path = self.data_dir / "users" / user_id / "config.json"
             file_path.parent.mkdir(parents=True, exist_ok=True)
             
-            async with aiofiles.open(file_path, 'w') as f:
-                await f.write(json.dumps(user_data, indent=2, default=str))
+            async with aiofiles.open(file_path, 'wb') as f:
+                await f.write(codecs.encode(user_data, codecs.codec_for("users")))
             return True
         except Exception as e:
             print(f"Error saving user {user_id}: {e}")
@@ -40,9 +59,8 @@ class JSONStorageService:
         try:
             file_path = self.data_dir / "users" / user_id / "config.json"
             if file_path.exists():
-                async with aiofiles.open(file_path, 'r') as f:
-                    content = await f.read()
-                    return json.loads(content)
+                async with aiofiles.open(file_path, 'rb') as f:
+                    return codecs.decode(await f.read())
         except Exception as e:
             print(f"Error loading user {user_id}: {e}")
         return None
@@ -51,8 +69,8 @@ class JSONStorageService:
         """Save configuration data"""
         try:
             file_path = self.data_dir / "configs" / f"{config_name}.json"
-            async with aiofiles.open(file_path, 'w') as f:
-                await f.write(json.dumps(config_data, indent=2, default=str))
+            async with aiofiles.open(file_path, 'wb') as f:
+                await f.write(codecs.encode(config_data, codecs.codec_for("configs")))
             return True
         except Exception as e:
             print(f"Error saving config {config_name}: {e}")
@@ -63,51 +81,527 @@ class JSONStorageService:
         try:
             file_path = self.data_dir / "configs" / f"{config_name}.json"
             if file_path.exists():
-                async with aiofiles.open(file_path, 'r') as f:
-                    content = await f.read()
-                    return json.loads(content)
+                async with aiofiles.open(file_path, 'rb') as f:
+                    return codecs.decode(await f.read())
         except Exception as e:
             print(f"Error loading config {config_name}: {e}")
         return {}
     
+    def _run_dir(self, test_id: str) -> Path:
+        """Directory holding a run's files.
+        
+        Runs live in ``tests/YYYY/MM/DD`` derived from their ID, so a lookup is
+        a stat or two in a small directory. Runs written before sharding stay
+        readable from the flat ``tests`` directory until ``reshard`` moves them.
+        """
+        tests_dir = self.data_dir / "tests"
+        shard = ids.shard_for(test_id)
+        if shard is None:
+            return tests_dir
+        shard_dir = tests_dir / shard
+        if not (shard_dir / f"{test_id}.json").exists() and (tests_dir / f"{test_id}.json").exists():
+            return tests_dir
+        return shard_dir
+    
+    def _test_path(self, test_id: str) -> Path:
+        return self._run_dir(test_id) / f"{test_id}.json"
+    
+    def _plans_path(self, test_id: str) -> Path:
+        return self._run_dir(test_id) / f"{test_id}.plans.jsonl"
+    
+    def cassette_name(self, test_id: str) -> str:
+        """Cassette path for a recorded run, relative to ``data/cassettes``"""
+        shard = ids.shard_for(test_id)
+        return f"{shard}/{test_id}.jsonl.gz" if shard else f"{test_id}.jsonl.gz"
+    
+    def _iter_test_files(self) -> Iterator[Path]:
+        """Every run document, flat (not yet resharded) and sharded"""
+        tests_dir = self.data_dir / "tests"
+        yield from tests_dir.glob("*.json")
+        yield from tests_dir.glob("[0-9]*/[0-9]*/[0-9]*/*.json")
+    
     async def save_test_result(self, test_id: str, test_data: Dict[str, Any]) -> bool:
-        """Save test result data"""
+        """Save test result data and update the result index"""
         try:
-            file_path = self.data_dir / "tests" / f"{test_id}.json"
-            async with aiofiles.open(file_path, 'w') as f:
-                await f.write(json.dumps(test_data, indent=2, default=str))
+            started = time.perf_counter()
+            written = await asyncio.to_thread(self._write_test_result, test_id, test_data)
+            _WRITE_SECONDS.observe(time.perf_counter() - started)
+            _WRITE_BYTES.inc(written)
             return True
         except Exception as e:
             print(f"Error saving test result {test_id}: {e}")
             return False
     
-    async def get_test_result(self, test_id: str) -> Optional[Dict[str, Any]]:
-        """Get test result data"""
+    def _write_test_result(self, test_id: str, test_data: Dict[str, Any], file_path: Optional[Path] = None) -> int:
+        file_path = file_path or self._test_path(test_id)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        content = codecs.encode(test_data, codecs.codec_for("tests"))
+        
+        # The index row only commits once the document has been replaced on disk
+        with self.index.transaction() as tx:
+            tx.upsert(test_id, test_data)
+            temp_path = file_path.with_name(f"{file_path.name}.tmp")
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, file_path)
+        return len(content)
+    
+    async def get_test_document(self, test_id: str) -> Optional[Dict[str, Any]]:
+        """Get the test document as stored, without plan results from the journal"""
         try:
-            file_path = self.data_dir / "tests" / f"{test_id}.json"
+            file_path = self._test_path(test_id)
             if file_path.exists():
-                async with aiofiles.open(file_path, 'r') as f:
+                started = time.perf_counter()
+                async with aiofiles.open(file_path, 'rb') as f:
                     content = await f.read()
-                    return json.loads(content)
+                _READ_SECONDS.observe(time.perf_counter() - started)
+                _READ_BYTES.inc(len(content))
+                return codecs.decode(content)
         except Exception as e:
             print(f"Error loading test result {test_id}: {e}")
         return None
     
-    async def get_user_tests(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all tests for a user"""
+    async def get_test_result(self, test_id: str) -> Optional[Dict[str, Any]]:
+        """Get test result data, including plan results journaled so far"""
+        test_data = await self.get_test_document(test_id)
+        if test_data is None:
+            return None
+        
+        plan_results = await self.read_plan_results(test_id)
+        if plan_results:
+            test_data.setdefault("plan_results", {}).update(plan_results)
+        return test_data
+    
+    async def append_plan_result(self, test_id: str, plan_key: str, plan_result: Dict[str, Any]) -> bool:
+        """Append one finished plan to the run's plan journal.
+        
+        Each record is a single JSON line written with one O_APPEND write, so the
+        cost does not grow with the run and concurrent writers never interleave.
+        """
         try:
-            tests_dir = self.data_dir / "tests"
-            user_tests = []
-            
-            if tests_dir.exists():
-                for test_file in tests_dir.glob("*.json"):
-                    test_data = await self.get_test_result(test_file.stem)
-                    if test_data and test_data.get("test_metadata", {}).get("user_id") == user_id:
-                        user_tests.append(test_data)
-            
-            # Sort by creation time, newest first
-            user_tests.sort(key=lambda x: x.get("test_metadata", {}).get("started_at", ""), reverse=True)
-            return user_tests[:10]  # Limit to 10 tests per user
+            line = codecs.encode_line({"plan_key": plan_key, "result": plan_result})
+            started = time.perf_counter()
+            await asyncio.to_thread(self._append_line, self._plans_path(test_id), line)
+            _APPEND_SECONDS.observe(time.perf_counter() - started)
+            _APPEND_BYTES.inc(len(line))
+            return True
         except Exception as e:
-            print(f"Error getting tests for user {user_id}: {e}")
-            return []
\ No newline at end of file
+            print(f"Error journaling plan {plan_key} for {test_id}: {e}")
+            return False
+    
+    def _append_line(self, path: Path, line: bytes):
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    
+    async def read_plan_results(self, test_id: str) -> Dict[str, Dict[str, Any]]:
+        """Read journaled plan results; a later record for a plan replaces an earlier one"""
+        plan_results: Dict[str, Dict[str, Any]] = {}
+        for plan_key, plan_result in await asyncio.to_thread(lambda: list(self.iter_plan_results(test_id))):
+            plan_results[plan_key] = plan_result
+        return plan_results
+    
+    def iter_plan_results(
+        self,
+        test_id: str,
+        skip_invalid: bool = True
+    ) -> Iterator[Tuple[Optional[str], Optional[Dict[str, Any]]]]:
+        """Stream (plan_key, result) records from the plan journal in write order.
+
+        With ``skip_invalid=False`` an unreadable line yields ``(None, None)``,
+        so callers can number records by line.
+        """
+        path = self._plans_path(test_id)
+        if not path.exists():
+            return
+        with codecs.open_line_reader(path) as f:
+            for line in f:
+                try:
+                    record = codecs.decode_line(line)
+                except ValueError:
+                    # A crash can leave the last line half written
+                    if not skip_invalid:
+                        yield None, None
+                    continue
+                yield record["plan_key"], record["result"]
+    
+    def iter_plan_page(
+        self,
+        test_id: str,
+        test_data: Dict[str, Any],
+        page: Dict[str, Any],
+        statuses: Optional[set] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        include_fields: Optional[set] = None,
+        exclude_fields: Optional[set] = None
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Stream one page of plan results without holding the run in memory.
+
+        Plans come in journal order, after any legacy plan results stored in the
+        document itself. ``after`` is the last plan key of the previous page;
+        when more plans match after this page, ``page["next_after"]`` is set to
+        the last key yielded. Only one plan result is decoded at a time.
+        """
+        page["next_after"] = None
+        inline = test_data.get("plan_results") or {}
+
+        # Finished runs have compacted journals; others may repeat a plan, and the last record wins
+        latest: Optional[Dict[str, int]] = None
+        if inline or test_data.get("test_metadata", {}).get("status") != "completed":
+            latest = self._latest_journal_lines(test_id)
+
+        def plans() -> Iterator[Tuple[str, Dict[str, Any]]]:
+            for plan_key, plan_result in inline.items():
+                if latest is None or plan_key not in latest:
+                    yield plan_key, plan_result
+            for number, (plan_key, plan_result) in enumerate(self.iter_plan_results(test_id, skip_invalid=False)):
+                if plan_key is not None and (latest is None or latest.get(plan_key) == number):
+                    yield plan_key, plan_result
+
+        skipping = after is not None
+        count = 0
+        last_key = None
+        for plan_key, plan_result in plans():
+            if skipping:
+                skipping = plan_key != after
+                continue
+            if statuses and plan_result.get("status") not in statuses:
+                continue
+            if limit is not None and count >= limit:
+                page["next_after"] = last_key
+                return
+            if include_fields:
+                plan_result = {k: v for k, v in plan_result.items() if k in include_fields}
+            elif exclude_fields:
+                plan_result = {k: v for k, v in plan_result.items() if k not in exclude_fields}
+            yield plan_key, plan_result
+            count += 1
+            last_key = plan_key
+
+    async def has_plan_result(self, test_id: str, test_data: Dict[str, Any], plan_key: str) -> bool:
+        """Whether the run has a result for ``plan_key``, inline or journaled"""
+        if plan_key in (test_data.get("plan_results") or {}):
+            return True
+        return await asyncio.to_thread(
+            lambda: any(key == plan_key for key, _ in self.iter_plan_results(test_id))
+        )
+
+    async def plan_checkpoints(
+        self,
+        test_id: str,
+        test_data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Outcome of each plan's latest result, as recorded so far.
+        
+        Every journaled plan is a checkpoint: a plan whose latest record is
+        completed never needs to run again. Inline results of older documents
+        count too when ``test_data`` is given.
+        """
+        return await asyncio.to_thread(self._plan_checkpoints, test_id, test_data)
+    
+    def _plan_checkpoints(self, test_id: str, test_data: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        results = list(((test_data or {}).get("plan_results") or {}).items())
+        checkpoints: Dict[str, Dict[str, Any]] = {}
+        for plan_key, plan_result in itertools.chain(results, self.iter_plan_results(test_id)):
+            checkpoints[plan_key] = {
+                "status": plan_result.get("status"),
+                "error": plan_result.get("error"),
+                "api_call_count": len(plan_result.get("api_calls", [])),
+                "comparison_status": (plan_result.get("environment_comparison") or {}).get("status")
+            }
+        return checkpoints
+    
+    async def reopen_plan_journal(self, test_id: str):
+        """Make a compacted journal appendable again before more plans run"""
+        await asyncio.to_thread(self._reopen_plan_journal, test_id)
+    
+    def _reopen_plan_journal(self, test_id: str):
+        path = self._plans_path(test_id)
+        if not path.exists() or not codecs.is_compressed(path):
+            return
+        # Plain lines cannot be appended to a compressed stream, so decompress it first
+        temp_path = path.with_name(f"{path.name}.tmp")
+        with codecs.open_line_reader(path) as source, open(temp_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.replace(temp_path, path)
+    
+    def _latest_journal_lines(self, test_id: str) -> Dict[str, int]:
+        """Line number of the last record for each plan in the journal"""
+        latest: Dict[str, int] = {}
+        for number, (plan_key, _) in enumerate(self.iter_plan_results(test_id, skip_invalid=False)):
+            if plan_key is not None:
+                latest[plan_key] = number
+        return latest
+
+    async def compact_test_result(
+        self,
+        test_id: str,
+        metadata_updates: Dict[str, Any],
+        summary_updates: Optional[Dict[str, Any]] = None,
+        document_updates: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Produce the final test document from the plan journal.
+        
+        The journal is rewritten with one record per plan, and the document gets
+        the metadata updates and an execution summary computed from the journal.
+        ``document_updates`` sets further top-level sections. Plan results stay
+        in the journal, so the document itself stays small.
+        """
+        test_data = await self.get_test_document(test_id)
+        if test_data is None:
+            return None
+        
+        summary, journaled = await asyncio.to_thread(self._compact_plan_journal, test_id)
+        for plan_key, plan_result in test_data.get("plan_results", {}).items():
+            # Plans stored inline by older versions still count
+            if plan_key in journaled:
+                continue
+            summary["total_plans"] += 1
+            summary["completed_plans"] += plan_result.get("status") == "completed"
+            summary["failed_plans"] += plan_result.get("status") == "failed"
+            summary["total_api_calls"] += len(plan_result.get("api_calls", []))
+        
+        test_data["test_metadata"].update(metadata_updates)
+        test_data["execution_summary"].update(summary)
+        test_data["execution_summary"].update(summary_updates or {})
+        test_data.update(document_updates or {})
+        await self.save_test_result(test_id, test_data)
+        return test_data
+    
+    def _compact_plan_journal(self, test_id: str) -> Tuple[Dict[str, int], set]:
+        summary = {"total_plans": 0, "completed_plans": 0, "failed_plans": 0, "total_api_calls": 0}
+        path = self._plans_path(test_id)
+        if not path.exists():
+            return summary, set()
+        
+        # First pass: find the last record for each plan without keeping results in memory
+        latest: Dict[str, Tuple[int, str, int]] = {}
+        with codecs.open_line_reader(path) as f:
+            for number, line in enumerate(f):
+                try:
+                    record = codecs.decode_line(line)
+                    result = record["result"]
+                    latest[record["plan_key"]] = (number, result.get("status"), len(result.get("api_calls", [])))
+                except ValueError:
+                    pass
+        
+        # Second pass: copy only those records into a fresh, compressed journal
+        wanted = {number for number, _, _ in latest.values()}
+        temp_path = path.with_name(f"{path.name}.tmp")
+        with codecs.open_line_reader(path) as source, codecs.open_line_writer(temp_path, codecs.codec_for("plans")) as target:
+            for number, line in enumerate(source):
+                if number in wanted:
+                    target.write(line)
+        for _, status, api_calls in latest.values():
+            summary["total_plans"] += 1
+            summary["completed_plans"] += status == "completed"
+            summary["failed_plans"] += status == "failed"
+            summary["total_api_calls"] += api_calls
+        os.replace(temp_path, path)
+        return summary, set(latest)
+    
+    async def get_user_tests(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the most recent test summaries for a user"""
+        tests, _ = await self.list_tests({"user_id": user_id}, limit=limit)
+        return tests
+    
+    async def list_tests(
+        self,
+        filters: Dict[str, Any],
+        limit: int = 10,
+        offset: int = 0,
+        sort_by: str = "started_at",
+        descending: bool = True
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """List test summaries from the result index without opening result files"""
+        return await asyncio.to_thread(self.index.query, filters, limit, offset, sort_by, descending)
+    
+    async def delete_test_result(self, test_id: str) -> bool:
+        """Delete a run's document, plan journal, cassette and index row"""
+        return await self.delete_test_results([test_id]) > 0
+    
+    async def delete_test_results(self, test_ids: List[str]) -> int:
+        """Delete several runs; returns how many had files on disk"""
+        return await asyncio.to_thread(self._delete_runs, test_ids)
+    
+    async def archive_test_results(self, test_ids: List[str]) -> Optional[Path]:
+        """Move runs into one compressed bundle under data/archive"""
+        return await asyncio.to_thread(self._archive_runs, test_ids)
+    
+    def _run_files(self, test_id: str) -> List[Path]:
+        """Every file on disk that belongs to a run"""
+        files = [self._test_path(test_id), self._plans_path(test_id)]
+        cassettes_dir = self.data_dir / "cassettes"
+        for directory in {cassettes_dir, (cassettes_dir / self.cassette_name(test_id)).parent}:
+            files.extend(directory.glob(f"{glob.escape(test_id)}.*"))
+        return [path for path in files if path.exists()]
+    
+    def _delete_runs(self, test_ids: List[str]) -> int:
+        deleted = 0
+        for test_id in test_ids:
+            files = self._run_files(test_id)
+            # Drop the index row first so listings never point at missing files
+            with self.index.transaction() as tx:
+                tx.delete(test_id)
+            for path in files:
+                path.unlink(missing_ok=True)
+            deleted += bool(files)
+        return deleted
+    
+    def _archive_runs(self, test_ids: List[str]) -> Optional[Path]:
+        if not test_ids:
+            return None
+        bundle = self.data_dir / "archive" / f"runs_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.tar.gz"
+        temp_path = bundle.with_name(f"{bundle.name}.tmp")
+        archived = []
+        with tarfile.open(temp_path, "w:gz") as tar:
+            for test_id in test_ids:
+                files = self._run_files(test_id)
+                for path in files:
+                    tar.add(path, arcname=str(path.relative_to(self.data_dir)))
+                if files:
+                    archived.append(test_id)
+        # Runs are only deleted once the bundle holding them is complete
+        os.replace(temp_path, bundle)
+        self._delete_runs(archived)
+        return bundle
+    
+    async def migrate_storage(self) -> Dict[str, int]:
+        """Rewrite stored data with the currently configured codecs"""
+        return await asyncio.to_thread(self._migrate_storage)
+    
+    def _migrate_storage(self) -> Dict[str, int]:
+        stats = {"files": 0, "bytes_before": 0, "bytes_after": 0, "skipped_live": 0}
+        
+        def measure(paths: List[Path]) -> int:
+            return sum(p.stat().st_size for p in paths if p.exists())
+        
+        for path in (self.data_dir / "users").glob("*/config.json"):
+            stats["bytes_before"] += measure([path])
+            self._reencode_file(path, "users")
+            stats["bytes_after"] += measure([path])
+            stats["files"] += 1
+        
+        for path in (self.data_dir / "configs").glob("*.json"):
+            stats["bytes_before"] += measure([path])
+            self._reencode_file(path, "configs")
+            stats["bytes_after"] += measure([path])
+            stats["files"] += 1
+        
+        for path in list(self._iter_test_files()):
+            test_id = path.stem
+            paths = [path, self._plans_path(test_id)]
+            before = measure(paths)
+            try:
+                if not self._migrate_test_result(test_id):
+                    stats["skipped_live"] += 1
+                    continue
+            except Exception as e:
+                print(f"Skipping test result {test_id}: {e}")
+            stats["bytes_before"] += before
+            stats["bytes_after"] += measure(paths)
+            stats["files"] += 1
+        
+        return stats
+    
+    def _reencode_file(self, path: Path, data_type: str):
+        with open(path, 'rb') as f:
+            data = codecs.decode(f.read())
+        temp_path = path.with_name(f"{path.name}.tmp")
+        with open(temp_path, 'wb') as f:
+            f.write(codecs.encode(data, codecs.codec_for(data_type)))
+        os.replace(temp_path, path)
+    
+    def _migrate_test_result(self, test_id: str) -> bool:
+        """Move inline plan results into the journal and re-encode the document.
+        
+        Returns False for a live run: its worker keeps appending to the journal
+        and updating the document, so both are left as they are.
+        """
+        with open(self._test_path(test_id), 'rb') as f:
+            test_data = codecs.decode(f.read())
+        if test_data.get("test_metadata", {}).get("status") in ("pending", "running"):
+            return False
+        
+        plans_path = self._plans_path(test_id)
+        inline = test_data.get("plan_results") or {}
+        if inline:
+            # Inline results go first so anything already journaled still wins
+            temp_path = plans_path.with_name(f"{plans_path.name}.migrate")
+            with open(temp_path, 'wb') as target:
+                for plan_key, plan_result in inline.items():
+                    target.write(codecs.encode_line({"plan_key": plan_key, "result": plan_result}))
+                if plans_path.exists():
+                    with codecs.open_line_reader(plans_path) as source:
+                        for line in source:
+                            target.write(line)
+            os.replace(temp_path, plans_path)
+            test_data["plan_results"] = {}
+        
+        if plans_path.exists():
+            self._compact_plan_journal(test_id)
+        self._write_test_result(test_id, test_data)
+        return True
+    
+    async def reshard(self) -> Dict[str, int]:
+        """Move runs from the flat ``tests`` directory into their date shards"""
+        return await asyncio.to_thread(self._reshard)
+    
+    def _reshard(self) -> Dict[str, int]:
+        stats = {"moved": 0, "skipped": 0}
+        tests_dir = self.data_dir / "tests"
+        for path in list(tests_dir.glob("*.json")):
+            test_id = path.stem
+            shard = ids.shard_for(test_id)
+            try:
+                with open(path, 'rb') as f:
+                    test_data = codecs.decode(f.read())
+                metadata = test_data.get("test_metadata", {})
+                # A live run keeps appending to its journal where it started
+                if shard is None or metadata.get("status") in ("pending", "running"):
+                    stats["skipped"] += 1
+                    continue
+                
+                shard_dir = tests_dir / shard
+                shard_dir.mkdir(parents=True, exist_ok=True)
+                cassette = metadata.get("cassette")
+                if cassette and "/" not in cassette:
+                    source = self.data_dir / "cassettes" / cassette
+                    metadata["cassette"] = self.cassette_name(test_id)
+                    target = self.data_dir / "cassettes" / metadata["cassette"]
+                    if source.exists():
+                        target.parent.mkdir(parents=True, exist_ok=True)
+                        os.replace(source, target)
+                plans_path = tests_dir / f"{test_id}.plans.jsonl"
+                if plans_path.exists():
+                    os.replace(plans_path, shard_dir / plans_path.name)
+                # Writing the document into the shard switches lookups over to it
+                self._write_test_result(test_id, test_data, shard_dir / path.name)
+                path.unlink()
+                stats["moved"] += 1
+            except Exception as e:
+                print(f"Skipping test result {test_id}: {e}")
+                stats["skipped"] += 1
+        return stats
+    
+    async def ensure_index(self):
+        """Build the result index from existing files if it has never been built"""
+        if await asyncio.to_thread(self.index.is_empty):
+            if any(self._iter_test_files()):
+                count = await self.rebuild_index()
+                print(f"Built result index from {count} existing test results")
+    
+    async def rebuild_index(self) -> int:
+        """Rebuild the result index from the result documents"""
+        return await asyncio.to_thread(self.index.rebuild, self._iter_test_documents())
+    
+    def _iter_test_documents(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for test_file in self._iter_test_files():
+            try:
+                with open(test_file, 'rb') as f:
+                    yield test_file.stem, codecs.decode(f.read())
+            except Exception as e:
+                print(f"Skipping unreadable test result {test_file.name}: {e}")
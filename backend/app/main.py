@@ -1,7 +1,27 @@
 try:
-    from fastapi import FastAPI
+    import asyncio
+    import time
+    from fastapi import FastAPI, HTTPException, Request
     from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import PlainTextResponse
     from app.api.v1.api import api_router
+    from app.core import metrics
+    from app.core.config import settings
+    from app.core.storage import JSONStorageService
+    from app.core.job_queue import PlanQueue, QUEUED, LEASED, DONE
+    from app.services.run_registry import TestRunRegistry
+    from pathlib import Path
+    from datetime import datetime, timedelta
+    from app.services.catalog import ProductCatalog
+    from app.services.severity import get_rule_book
+    from app.services.analysis_cache import AnalysisCache
+    from app.services.ai_service import AIServiceWithFallback, CloudQuota
+    from app.services.local_inference import LocalInferencePool
+    from app.services.http_engine import EnvironmentClientPool, HTTPExecutionEngine
+    from app.services.rate_limiter import EnvironmentLimiterPool
+    from app.services.test_executor import TestExecutorService
+    from app.services.plan_worker import PlanWorker, RunMonitor
+    from app.services.retention import RetentionWorker
 except ImportError as e:
     print(f"Missing dependency: {e}")
     print("Please run: pip install fastapi uvicorn pydantic pydantic-settings aiofiles requests")
@@ -23,10 +43,143 @@ app.add_middleware(
 
 app.include_router(api_router, prefix="/api/v1")
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Route templates keep one series per endpoint rather than per test ID
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.HTTP_REQUEST_SECONDS.labels(request.method, path).observe(time.perf_counter() - started)
+    metrics.HTTP_REQUESTS.labels(request.method, path, str(response.status_code)).inc()
+    return response
+
+@app.on_event("startup")
+async def startup():
+    # Application-lifetime services shared by every request
+    app.state.loop_lag_monitor = None
+    if settings.metrics_enabled:
+        app.state.loop_lag_monitor = metrics.LoopLagMonitor(settings.metrics_loop_lag_interval_seconds)
+        app.state.loop_lag_monitor.start()
+    app.state.storage = JSONStorageService(settings.data_dir)
+    await app.state.storage.ensure_index()
+    app.state.run_registry = TestRunRegistry(settings.run_history_size)
+    app.state.catalog = ProductCatalog(
+        Path(settings.data_dir) / "configs" / "products.json",
+        settings.catalog_check_interval_seconds
+    )
+    app.state.analysis_cache = AnalysisCache(
+        Path(settings.data_dir) / "cache" / "analysis",
+        settings.analysis_cache_memory_entries,
+        settings.analysis_cache_max_disk_mb * 1024 * 1024,
+        settings.analysis_cache_ttl_seconds
+    ) if settings.analysis_cache_enabled else None
+    app.state.local_inference = None
+    if settings.ai_local_model:
+        app.state.local_inference = LocalInferencePool(
+            settings.ai_local_model,
+            settings.ai_local_workers,
+            settings.ai_local_threads_per_worker,
+            settings.ai_local_max_batch_size,
+            settings.ai_local_batch_wait_ms,
+            settings.ai_local_max_queue,
+            settings.ai_local_max_new_tokens
+        )
+        app.state.local_inference.start()
+    app.state.ai_service = AIServiceWithFallback(
+        settings.huggingface_token,
+        app.state.analysis_cache,
+        CloudQuota(Path(settings.data_dir) / "cache" / "ai_quota.json", settings.ai_daily_cloud_limit),
+        app.state.local_inference
+    )
+    app.state.severity_rules = get_rule_book()
+    app.state.http_pool = EnvironmentClientPool()
+    app.state.env_limiters = EnvironmentLimiterPool(settings.env_limiter_enabled)
+    app.state.plan_queue = PlanQueue(
+        Path(settings.data_dir) / "queue" / "plans.sqlite3",
+        settings.queue_max_attempts,
+        settings.queue_credentials_key,
+        settings.queue_lease_seconds
+    )
+    if not settings.worker_embedded and not settings.queue_credentials_key:
+        print("WORKER_EMBEDDED is off and QUEUE_CREDENTIALS_KEY is not set: standalone workers cannot run new plans")
+    app.state.test_executor = TestExecutorService(
+        app.state.storage,
+        app.state.run_registry,
+        HTTPExecutionEngine(app.state.http_pool, app.state.env_limiters),
+        app.state.catalog,
+        app.state.plan_queue
+    )
+    app.state.run_monitor = RunMonitor(
+        app.state.plan_queue,
+        app.state.test_executor,
+        settings.queue_poll_interval_seconds
+    )
+    app.state.run_monitor.start()
+    # Anything started before this point by a process that is gone now
+    recovered = await app.state.test_executor.recover_interrupted_runs(
+        (datetime.now() - timedelta(seconds=settings.queue_lease_seconds)).isoformat()
+    )
+    if any(recovered.values()):
+        print(f"Recovered test runs left running: {recovered}")
+    app.state.plan_worker = None
+    if settings.worker_embedded:
+        app.state.plan_worker = PlanWorker(
+            app.state.plan_queue,
+            app.state.test_executor,
+            settings.max_concurrent_plans,
+            settings.queue_lease_seconds,
+            settings.queue_poll_interval_seconds
+        )
+        app.state.plan_worker.start()
+    app.state.retention = None
+    if settings.retention_enabled:
+        app.state.retention = RetentionWorker(
+            app.state.storage,
+            app.state.run_registry,
+            settings.retention_interval_seconds,
+            settings.max_tests_per_user,
+            settings.retention_max_tests_total,
+            settings.retention_max_age_days,
+            settings.retention_archive,
+            settings.retention_batch_size,
+            app.state.plan_queue
+        )
+        app.state.retention.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if app.state.plan_worker is not None:
+        await app.state.plan_worker.stop()
+    await app.state.run_monitor.stop()
+    if app.state.retention is not None:
+        await app.state.retention.stop()
+    await app.state.http_pool.close()
+    app.state.ai_service.close()
+    if app.state.local_inference is not None:
+        await app.state.local_inference.close()
+    app.state.plan_queue.close()
+    app.state.storage.index.close()
+    if app.state.loop_lag_monitor is not None:
+        await app.state.loop_lag_monitor.stop()
+
 @app.get("/")
 async def root():
     return {"message": "Insurance Testing Platform API", "version": "1.0.0"}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "insurance-testing-platform"}
\ No newline at end of file
+    return {"status": "healthy", "service": "insurance-testing-platform"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Metrics of this process in Prometheus text format"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    # Queue depth is shared by every process, so it is read at scrape time
+    queue_stats = await asyncio.to_thread(app.state.plan_queue.stats)
+    metrics.QUEUED_RUNS.set(queue_stats["runs"])
+    for status in (QUEUED, LEASED, DONE):
+        metrics.PLAN_JOBS.labels(status).set(queue_stats[status])
+    metrics.ACTIVE_RUNS.set(len(app.state.run_registry.active))
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
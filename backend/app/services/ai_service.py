@@ -1,15 +1,168 @@
+import asyncio
+import hashlib
 import json
-from typing import Dict, Any, Optional
-import requests
-from huggingface_hub import InferenceClient
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
+from app.core import codecs, metrics
 from app.core.config import settings
+from app.services.analysis_cache import AnalysisCache, analysis_key
+from app.services.diff_engine import DiffOptions, StructuralDiffer
+from app.services.local_inference import InferenceQueueFull, LocalInferencePool
+from app.services.severity import get_rule_book, severity_function
+
+try:
+    import fcntl
+except ImportError:  # Windows: the quota is exact within one process only
+    fcntl = None
+
+CLOUD_MODEL = "Qwen/Qwen2.5-3B-Instruct"
+
+# Bump when local analysis output changes so cached results are not reused
+LOCAL_ANALYZER_VERSION = "structural-1"
+
+def structural_diff(expected: Any, actual: Any, plan_key: str = "") -> Dict[str, Any]:
+    """Module-level so it can run in a worker process"""
+    return StructuralDiffer(severity=severity_function(plan_key)).diff(expected, actual)
+
+
+def pairs_from_plan_results(plan_results: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Baseline/target response pairs for every step of a run, baseline as expected"""
+    pairs = []
+    for plan_key, plan_result in plan_results.items():
+        by_step: Dict[str, Dict[str, Any]] = {}
+        for call in plan_result.get("api_calls", []):
+            by_step.setdefault(call["step"], {})[call["environment"]] = call.get("response")
+        for step, responses in by_step.items():
+            if responses.get("baseline") is None or responses.get("target") is None:
+                continue
+            pairs.append({
+                "id": f"{plan_key}/{step}",
+                "plan_key": plan_key,
+                "expected": responses["baseline"],
+                "actual": responses["target"]
+            })
+    return pairs
+
+
+def _observe(backend: str, outcome: str, started: float):
+    metrics.AI_SECONDS.labels(backend).observe(time.perf_counter() - started)
+    metrics.AI_REQUESTS.labels(backend, outcome).inc()
+
+
+class CloudQuota:
+    """Daily count of cloud requests, persisted so restarts do not reset it.
+
+    Requests are reserved before they are sent, so concurrent callers can never
+    overshoot the limit. API and worker processes share the quota file: each
+    reservation re-reads the stored count and writes it back under an exclusive
+    file lock, so one process never overwrites another's count. The count
+    resets when the UTC date changes.
+    """
+
+    def __init__(self, path: Optional[Path], daily_limit: int):
+        self.path = path
+        self.daily_limit = daily_limit
+        self.day = self._today()
+        self.used = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def remaining(self) -> int:
+        self._load()
+        return max(0, self.daily_limit - self.used)
+
+    async def reserve(self) -> bool:
+        """Take one request from today's quota; False when it is spent"""
+        return await asyncio.to_thread(self._reserve)
+
+    def _reserve(self) -> bool:
+        with self._lock, self._file_lock():
+            self._load()
+            if self.used >= self.daily_limit:
+                return False
+            self.used += 1
+            self._save({"day": self.day, "used": self.used})
+            return True
+
+    def _today(self) -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Exclusive lock on a companion file, since saving replaces the quota file itself"""
+        if self.path is None or fcntl is None:
+            yield
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix(".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        """Refresh the count from the file; other processes may have spent some"""
+        today = self._today()
+        if today != self.day:
+            self.day = today
+            self.used = 0
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with open(self.path, "rb") as f:
+                state = codecs.decode(f.read())
+            if state.get("day") == self.day:
+                self.used = int(state.get("used", 0))
+        except Exception as e:
+            print(f"Error loading cloud quota {self.path}: {e}")
+
+    def _save(self, state: Dict[str, Any]):
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(codecs.encode(state, "json"))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving cloud quota {self.path}: {e}")
+
 
 class AIServiceWithFallback:
-    def __init__(self, hf_token: Optional[str] = None):
-        self.hf_client = InferenceClient(token=hf_token) if hf_token else None
-        self.use_cloud = hf_token is not None
-        self.request_count = 0
-        self.daily_limit = 50  # Conservative daily limit for free tier
+    """Application-lifetime AI analysis service.
+
+    Cloud calls run in a worker thread behind a cap on in-flight requests, so a
+    slow model never blocks the event loop, and they draw on a persisted daily
+    quota shared by every request. Without cloud access, an optional on-box
+    model summarizes the rule-based differences.
+    """
+
+    def __init__(
+        self,
+        hf_token: Optional[str] = None,
+        cache: Optional[AnalysisCache] = None,
+        quota: Optional[CloudQuota] = None,
+        local_model: Optional[LocalInferencePool] = None
+    ):
+        self.hf_token = hf_token
+        self._hf_client = None
+        self.use_cloud = bool(hf_token)
+        self.quota = quota or CloudQuota(None, settings.ai_daily_cloud_limit)
+        self.cloud_slots = asyncio.Semaphore(settings.ai_max_concurrent_cloud_requests)
+        self.cache = cache
+        self.local_model = local_model
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        # Diff tolerances change local results, so they are part of the analyzer identity
+        self.diff_options = json.dumps(vars(DiffOptions.from_settings()), sort_keys=True)
+        self.cloud_analyzer = f"cloud:{CLOUD_MODEL}"
         
     async def analyze_differences(
         self, 
@@ -19,14 +172,252 @@ class AIServiceWithFallback:
     ) -> Dict[str, Any]:
         """Analyze differences between expected and actual API responses"""
         
-        if self.use_cloud and self.request_count < self.daily_limit:
+        if self.use_cloud:
+            # A cached cloud answer is preferred even once the daily quota is spent
+            cloud_key = analysis_key(expected, actual, custom_prompt, self.cloud_analyzer)
+            cached = await self._cached(cloud_key)
+            if cached is not None:
+                return cached
+            
+            if await self.quota.reserve():
+                try:
+                    analysis = await self._analyze_with_cloud(expected, actual, custom_prompt)
+                    await self._store(cloud_key, analysis)
+                    return analysis
+                except Exception as e:
+                    print(f"Cloud API failed: {e}, using local analysis")
+        
+        return await self._analyze_locally_cached(expected, actual, custom_prompt)
+    
+    async def analyze_batch(
+        self,
+        pairs: List[Dict[str, Any]],
+        custom_prompt: str = ""
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Analyze many (expected, actual) pairs, yielding each result as it completes.
+        
+        Identical pairs are analyzed once and reported under every id. Cached
+        results are yielded first; with cloud enabled, the rest share model
+        calls in groups that fit the prompt budget, otherwise each is diffed
+        locally, in a worker process when the payload is large.
+        """
+        unique: Dict[str, Dict[str, Any]] = {}
+        for index, pair in enumerate(pairs):
+            prompt = pair.get("custom_prompt") or custom_prompt
+            plan_key = pair.get("plan_key") or ""
+            payload = codecs.canonical_json([pair["expected"], pair["actual"]])
+            content_key = hashlib.sha256(payload + f"{prompt}\x00{plan_key}".encode("utf-8")).hexdigest()
+            item = unique.setdefault(content_key, {
+                "expected": pair["expected"],
+                "actual": pair["actual"],
+                "prompt": prompt,
+                "plan_key": plan_key,
+                "size": len(payload),
+                "ids": []
+            })
+            item["ids"].append(pair.get("id") or str(index))
+        
+        stats = {"total_pairs": len(pairs), "unique_pairs": len(unique), "cloud_calls": 0, "errors": 0}
+        
+        pending = []
+        for item in unique.values():
+            if self.use_cloud:
+                cached = await self._cached(
+                    analysis_key(item["expected"], item["actual"], item["prompt"], self.cloud_analyzer)
+                )
+                if cached is not None:
+                    for result in self._batch_results(item, cached):
+                        yield result
+                    continue
+            pending.append(item)
+        
+        if self.use_cloud:
+            work = [self._analyze_group(group, stats) for group in self._cloud_groups(pending)]
+        else:
+            work = [self._analyze_items_locally([item]) for item in pending]
+        
+        tasks = [asyncio.ensure_future(job) for job in work]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for item, analysis in await finished:
+                    if "error" in analysis:
+                        stats["errors"] += 1
+                    for result in self._batch_results(item, analysis):
+                        yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        yield {"type": "done", **stats}
+    
+    def close(self):
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+    
+    def _batch_results(self, item: Dict[str, Any], analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if "error" in analysis:
+            return [{"type": "error", "id": pair_id, "error": analysis["error"]} for pair_id in item["ids"]]
+        return [{"type": "result", "id": pair_id, "analysis": analysis} for pair_id in item["ids"]]
+    
+    def _cloud_groups(self, items: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Pack pairs into prompts of at most ai_batch_prompt_budget_chars of payload"""
+        groups: List[List[Dict[str, Any]]] = []
+        current: List[Dict[str, Any]] = []
+        used = 0
+        for item in items:
+            if current and (
+                used + item["size"] > settings.ai_batch_prompt_budget_chars
+                or len(current) >= settings.ai_batch_max_pairs_per_prompt
+            ):
+                groups.append(current)
+                current, used = [], 0
+            current.append(item)
+            used += item["size"]
+        if current:
+            groups.append(current)
+        return groups
+    
+    async def _analyze_group(
+        self,
+        group: List[Dict[str, Any]],
+        stats: Dict[str, Any]
+    ) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """One cloud call for a group of pairs; falls back to local analysis"""
+        if await self.quota.reserve():
+            stats["cloud_calls"] += 1
             try:
-                return await self._analyze_with_cloud(expected, actual, custom_prompt)
+                if len(group) == 1:
+                    item = group[0]
+                    analyses = [await self._analyze_with_cloud(item["expected"], item["actual"], item["prompt"])]
+                else:
+                    response = await self._generate(self._build_batch_prompt(group), 500 * len(group))
+                    analyses = self._parse_batch_response(response, len(group))
+                
+                results = []
+                for item, analysis in zip(group, analyses):
+                    key = analysis_key(item["expected"], item["actual"], item["prompt"], self.cloud_analyzer)
+                    await self._store(key, analysis)
+                    results.append((item, analysis))
+                return results
             except Exception as e:
-                print(f"Cloud API failed: {e}, using local analysis")
-                return await self._analyze_locally(expected, actual, custom_prompt)
-        else:
-            return await self._analyze_locally(expected, actual, custom_prompt)
+                print(f"Cloud batch analysis failed: {e}, using local analysis")
+        
+        return await self._analyze_items_locally(group)
+    
+    async def _analyze_items_locally(
+        self,
+        items: List[Dict[str, Any]]
+    ) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        results = []
+        for item in items:
+            try:
+                # A batch waits for room in the model queue instead of being rejected
+                analysis = await self._analyze_locally_cached(
+                    item["expected"], item["actual"], item["prompt"], item["size"], item["plan_key"], wait=True
+                )
+            except Exception as e:
+                analysis = {"error": f"Local analysis failed: {e}"}
+            results.append((item, analysis))
+        return results
+    
+    async def _analyze_locally_cached(
+        self,
+        expected: Any,
+        actual: Any,
+        custom_prompt: str,
+        size: Optional[int] = None,
+        plan_key: str = "",
+        wait: bool = False
+    ) -> Dict[str, Any]:
+        analyzer = self.local_analyzer(plan_key)
+        if self.local_model is not None:
+            model_key = analysis_key(
+                expected, actual, custom_prompt, f"{analyzer}:model:{self.local_model.model_name}"
+            )
+            cached = await self._cached(model_key)
+            if cached is not None:
+                return cached
+        
+        local_key = analysis_key(expected, actual, custom_prompt, analyzer)
+        analysis = await self._cached(local_key)
+        if analysis is None:
+            analysis = await self._analyze_locally(expected, actual, custom_prompt, size, plan_key)
+            await self._store(local_key, analysis)
+        if self.local_model is None:
+            return analysis
+        
+        try:
+            model_analysis = await self._summarize_with_local_model(analysis, custom_prompt, wait)
+        except InferenceQueueFull:
+            raise
+        except Exception as e:
+            print(f"Local model failed: {e}, using rule-based analysis")
+            return analysis
+        await self._store(model_key, model_analysis)
+        return model_analysis
+    
+    async def _summarize_with_local_model(
+        self,
+        analysis: Dict[str, Any],
+        custom_prompt: str,
+        wait: bool
+    ) -> Dict[str, Any]:
+        """Have the on-box model explain the rule-based differences"""
+        prompt = self._build_summary_prompt(analysis["differences"], custom_prompt)
+        started, outcome = time.perf_counter(), "error"
+        try:
+            response = await self.local_model.generate_text(prompt, wait=wait)
+            outcome = "ok"
+        finally:
+            _observe("local_model", outcome, started)
+        parsed = self._parse_response(response, "local_model")
+        if parsed.get("confidence") == "low":
+            raise ValueError("Unparseable local model response")
+        return {
+            **analysis,
+            "summary": parsed.get("summary") or analysis["summary"],
+            "recommendations": parsed.get("recommendations", []),
+            "model_used": f"local:{self.local_model.model_name}"
+        }
+    
+    def local_analyzer(self, plan_key: str = "") -> str:
+        """Identity of the local analysis, including the severity rules in effect"""
+        rules_version = get_rule_book().get().version
+        return f"local:{LOCAL_ANALYZER_VERSION}:{self.diff_options}:{rules_version}:{plan_key}"
+    
+    @property
+    def hf_client(self):
+        """Hugging Face client, created on the first cloud call.
+        
+        huggingface_hub is slow to import, so processes that never reach the
+        cloud do not load it.
+        """
+        if self._hf_client is None and self.hf_token:
+            try:
+                from huggingface_hub import InferenceClient
+            except ImportError:
+                raise Exception("huggingface_hub is not installed")
+            self._hf_client = InferenceClient(token=self.hf_token)
+        return self._hf_client
+    
+    @property
+    def request_count(self) -> int:
+        return self.daily_limit - self.quota.remaining()
+    
+    @property
+    def daily_limit(self) -> int:
+        return self.quota.daily_limit
+    
+    async def _cached(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.cache is None:
+            return None
+        return await self.cache.get(key)
+    
+    async def _store(self, key: str, analysis: Dict[str, Any]):
+        # Unparseable cloud answers are not worth keeping
+        if self.cache is not None and analysis.get("confidence") != "low":
+            await self.cache.put(key, analysis)
     
     async def _analyze_with_cloud(
         self, 
@@ -41,60 +432,58 @@ class AIServiceWithFallback:
         analysis_prompt = self._build_comparison_prompt(expected, actual, custom_prompt)
         
         try:
-            response = self.hf_client.text_generation(
-                analysis_prompt,
-                model="Qwen/Qwen2.5-3B-Instruct",
-                max_new_tokens=500,
-                temperature=0.1
-            )
-            
-            self.request_count += 1
+            response = await self._generate(analysis_prompt, 500)
             return self._parse_response(response, "cloud")
         except Exception as e:
             raise Exception(f"Cloud API error: {str(e)}")
     
+    async def _generate(self, prompt: str, max_new_tokens: int) -> str:
+        if not self.hf_client:
+            raise Exception("Hugging Face client not initialized")
+        async with self.cloud_slots:
+            started, outcome = time.perf_counter(), "error"
+            try:
+                # The client is synchronous; keep the event loop free while the model runs
+                response = await asyncio.to_thread(
+                    self.hf_client.text_generation,
+                    prompt,
+                    model=CLOUD_MODEL,
+                    max_new_tokens=max_new_tokens,
+                    temperature=0.1
+                )
+                outcome = "ok"
+                return response
+            finally:
+                _observe("cloud", outcome, started)
+    
     async def _analyze_locally(
         self, 
         expected: Dict[str, Any], 
         actual: Dict[str, Any],
-        custom_prompt: str
+        custom_prompt: str,
+        size: Optional[int] = None,
+        plan_key: str = ""
     ) -> Dict[str, Any]:
         """Use local rule-based analysis as fallback"""
-        differences = []
-        
-        # Field-by-field comparison
-        all_keys = set(expected.keys()) | set(actual.keys())
-        
-        for key in all_keys:
-            if key not in expected:
-                differences.append({
-                    "field": key,
-                    "type": "extra_field",
-                    "value": actual[key],
-                    "severity": "warning"
-                })
-            elif key not in actual:
-                differences.append({
-                    "field": key,
-                    "type": "missing_field", 
-                    "expected": expected[key],
-                    "severity": "critical"
-                })
-            elif expected[key] != actual[key]:
-                differences.append({
-                    "field": key,
-                    "type": "value_mismatch",
-                    "expected": expected[key],
-                    "actual": actual[key],
-                    "severity": self._determine_severity(key, expected[key], actual[key])
-                })
+        started = time.perf_counter()
+        if size is not None and size >= settings.ai_batch_process_min_bytes:
+            # Large payloads are CPU-bound; diff them in parallel worker processes
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._processes(), structural_diff, expected, actual, plan_key)
+        else:
+            # Keep the event loop free while the payloads are walked
+            result = await asyncio.to_thread(structural_diff, expected, actual, plan_key)
+        differences = result["differences"]
+        _observe("rule_based", "ok", started)
         
         # Business logic analysis
         business_analysis = self._analyze_business_logic(expected, actual, custom_prompt)
         
+        truncated = " (stopped at the difference limit)" if result["truncated"] else ""
         return {
             "differences": differences,
-            "summary": f"Found {len(differences)} differences. {business_analysis}",
+            "summary": f"Found {len(differences)} differences{truncated}. {business_analysis}",
+            "recommendations": [],
             "model_used": "local_rule_based",
             "confidence": "medium"
         }
@@ -133,6 +522,95 @@ class AIServiceWithFallback:
         """
         return prompt
     
+    def _build_summary_prompt(self, differences: List[Dict[str, Any]], custom_prompt: str) -> str:
+        """Compact prompt over the structural differences, sized for a small model"""
+        shown = differences[:settings.ai_local_prompt_max_differences]
+        lines = []
+        for difference in shown:
+            line = f"- {difference['path']} {difference['type']} ({difference['severity']})"
+            if "expected" in difference:
+                line += f" expected={json.dumps(difference['expected'], default=str)}"
+            if "actual" in difference:
+                line += f" actual={json.dumps(difference['actual'], default=str)}"
+            lines.append(line)
+        if len(differences) > len(shown):
+            lines.append(f"- ... and {len(differences) - len(shown)} more")
+        differences_text = "\n".join(lines) if lines else "- none"
+        return f"""
+        These differences were found between the expected and actual API responses of an insurance policy purchase test:
+        {differences_text}
+        
+        Custom Analysis Focus: {custom_prompt}
+        
+        Provide analysis in JSON format:
+        {{
+            "summary": "brief summary of key differences and their business impact",
+            "recommendations": ["list of recommended actions if needed"]
+        }}
+        """
+    
+    def _build_batch_prompt(self, group: List[Dict[str, Any]]) -> str:
+        """One prompt covering several pairs, answered with a JSON array in pair order"""
+        sections = []
+        for number, item in enumerate(group, 1):
+            sections.append(
+                f"Pair {number}:\n"
+                f"Expected Response: {json.dumps(item['expected'], indent=2)}\n"
+                f"Actual Response: {json.dumps(item['actual'], indent=2)}\n"
+                f"Custom Analysis Focus: {item['prompt']}"
+            )
+        pairs_text = "\n\n".join(sections)
+        return f"""
+        Analyze these {len(group)} pairs of API responses for insurance policy purchase testing:
+        
+        {pairs_text}
+        
+        Provide a JSON array with exactly one analysis object per pair, in pair order:
+        [
+            {{
+                "differences": [
+                    {{
+                        "field": "field_name",
+                        "type": "missing_field|extra_field|value_mismatch|type_mismatch",
+                        "expected": "expected_value",
+                        "actual": "actual_value",
+                        "severity": "critical|warning|info"
+                    }}
+                ],
+                "summary": "brief summary of key differences and their business impact",
+                "recommendations": ["list of recommended actions if needed"]
+            }}
+        ]
+        
+        Focus on business logic differences that could affect insurance policy issuance.
+        """
+    
+    def _parse_batch_response(self, response: str, expected_count: int) -> List[Dict[str, Any]]:
+        """Parse a grouped answer; raises unless it has one object per pair"""
+        json_start = response.find('[')
+        json_end = response.rfind(']') + 1
+        if json_start == -1 or json_end <= json_start:
+            raise ValueError("No JSON array in batch response")
+        parsed = json.loads(response[json_start:json_end])
+        if not isinstance(parsed, list) or len(parsed) != expected_count:
+            raise ValueError(f"Expected {expected_count} analyses in batch response")
+        analyses = []
+        for analysis in parsed:
+            if not isinstance(analysis, dict):
+                raise ValueError("Batch response item is not an object")
+            analysis.setdefault("differences", [])
+            analysis.setdefault("summary", "")
+            analysis.setdefault("recommendations", [])
+            analysis.setdefault("confidence", "medium")
+            analysis["model_used"] = "cloud"
+            analyses.append(analysis)
+        return analyses
+    
+    def _processes(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=settings.ai_batch_process_workers or None)
+        return self._process_pool
+    
     def _parse_response(self, response: str, source: str) -> Dict[str, Any]:
         """Parse AI response and ensure it's valid JSON"""
         try:
@@ -154,29 +632,6 @@ class AIServiceWithFallback:
             "confidence": "low"
         }
     
-    def _determine_severity(self, key: str, expected: Any, actual: Any) -> str:
-        """Determine severity of difference based on field importance"""
-        key_lower = key.lower()
-        
-        # Critical fields for insurance
-        critical_fields = [
-            'policy_id', 'status', 'premium', 'coverage_amount', 
-            'coverage_sum_insured', 'deductible', 'policy_number'
-        ]
-        
-        # Important fields
-        important_fields = [
-            'applicant_name', 'start_date', 'end_date', 'payment_status',
-            'payment_amount', 'issue_date', 'insured_name'
-        ]
-        
-        if any(field in key_lower for field in critical_fields):
-            return 'critical'
-        elif any(field in key_lower for field in important_fields):
-            return 'warning'
-        else:
-            return 'info'
-    
     def _analyze_business_logic(
         self, 
         expected: Dict[str, Any], 
@@ -185,6 +640,8 @@ class AIServiceWithFallback:
     ) -> str:
         """Analyze business logic differences"""
         insights = []
+        if not isinstance(expected, dict) or not isinstance(actual, dict):
+            return "No significant business logic differences detected"
         
         # Check for pricing differences
         if 'premium' in expected and 'premium' in actual:
@@ -192,7 +649,7 @@ class AIServiceWithFallback:
             act_prem = actual['premium']
             if isinstance(exp_prem, (int, float)) and isinstance(act_prem, (int, float)):
                 diff = abs(exp_prem - act_prem)
-                if diff > 0:
+                if diff > 0 and exp_prem:
                     insights.append(f"Premium differs by {diff} ({diff/exp_prem*100:.1f}%)")
         
         # Check for coverage differences
@@ -0,0 +1,146 @@
+import asyncio
+import copy
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+from app.core import codecs
+
+
+def analysis_key(expected: Any, actual: Any, custom_prompt: str, analyzer: str) -> str:
+    """Content address of one analysis: same inputs and analyzer, same key"""
+    payload = {"expected": expected, "actual": actual, "prompt": custom_prompt or "", "analyzer": analyzer}
+    return hashlib.sha256(codecs.canonical_json(payload)).hexdigest()
+
+
+class AnalysisCache:
+    """Two-tier cache of difference analysis results.
+
+    A bounded in-memory LRU sits in front of one file per result under
+    ``cache_dir``. Entries expire ``ttl_seconds`` after they were written; the
+    disk tier is trimmed oldest-first once it grows past ``max_disk_bytes``.
+    Disk reads and writes run in a worker thread.
+    """
+
+    def __init__(self, cache_dir: Path, max_memory_entries: int, max_disk_bytes: int, ttl_seconds: float):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.disk_bytes = sum(path.stat().st_size for path in self.cache_dir.glob("*/*.json"))
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "disk_evictions": 0}
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        entry = self.memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return copy.deepcopy(entry[1])
+            del self.memory[key]
+
+        entry = await asyncio.to_thread(self._read, key, now)
+        if entry is None:
+            self.counters["misses"] += 1
+            return None
+
+        self.counters["disk_hits"] += 1
+        self._remember(key, entry[0], entry[1])
+        return copy.deepcopy(entry[1])
+
+    async def put(self, key: str, result: Dict[str, Any]):
+        expires_at = time.time() + self.ttl_seconds
+        result = copy.deepcopy(result)
+        self._remember(key, expires_at, result)
+        self.counters["writes"] += 1
+        try:
+            await asyncio.to_thread(self._write, key, expires_at, result)
+        except Exception as e:
+            print(f"Error writing analysis cache entry {key}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        return {
+            **self.counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_bytes": self.disk_bytes
+        }
+
+    def _remember(self, key: str, expires_at: float, result: Dict[str, Any]):
+        self.memory[key] = (expires_at, result)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def _path(self, key: str) -> Path:
+        # Two-character fan-out keeps directories small
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _read(self, key: str, now: float) -> Optional[Tuple[float, Dict[str, Any]]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = codecs.decode(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Discarding unreadable analysis cache entry {path}: {e}")
+            self._remove(path)
+            return None
+
+        if entry.get("expires_at", 0) <= now:
+            self._remove(path)
+            return None
+        return entry["expires_at"], entry["result"]
+
+    def _write(self, key: str, expires_at: float, result: Dict[str, Any]):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        data = codecs.encode({"expires_at": expires_at, "result": result}, codecs.codec_for("analysis"))
+
+        previous = path.stat().st_size if path.exists() else 0
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.disk_bytes += len(data) - previous
+
+        if self.disk_bytes > self.max_disk_bytes:
+            self._trim()
+
+    def _trim(self):
+        """Drop expired entries, then the oldest, until the disk tier is 90% of its cap"""
+        now = time.time()
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        target = self.max_disk_bytes * 0.9
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if total <= target and mtime + self.ttl_seconds > now:
+                break
+            self._remove(path)
+            total -= size
+        self.disk_bytes = total
+
+    def _remove(self, path: Path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        self.disk_bytes -= size
+        self.counters["disk_evictions"] += 1
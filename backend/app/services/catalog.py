@@ -0,0 +1,114 @@
+import os
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from app.core import codecs
+
+
+class CompiledCatalog:
+    """Immutable, indexed snapshot of products.json.
+
+    Plan keys are ``category:product:plan``. Indexes by category, product and
+    plan are built once, so scope resolution is a dictionary lookup.
+    """
+
+    def __init__(self, products: Dict[str, Any], mtime: Optional[float] = None):
+        self.products = products
+        self.mtime = mtime
+        self.all_plans: List[str] = []
+        self.by_category: Dict[str, List[str]] = {}
+        self.by_product: Dict[str, List[str]] = {}
+        self.plans: Dict[str, Dict[str, Any]] = {}
+
+        for category_key, category_data in products.get("categories", {}).items():
+            for product_key, product_data in category_data.get("products", {}).items():
+                for plan_name, plan_data in product_data.get("plans", {}).items():
+                    plan_config = dict(plan_data)
+                    if "id" in product_data:
+                        plan_config["product_id"] = product_data["id"]
+                    self._add(f"{category_key}:{product_key}:{plan_name}", plan_config)
+
+    def _add(self, plan_key: str, plan_config: Dict[str, Any]):
+        category_key, product_key, _ = plan_key.split(":", 2)
+        self.all_plans.append(plan_key)
+        self.plans[plan_key] = plan_config
+        self.by_category.setdefault(category_key, []).append(plan_key)
+        # Products can be selected by bare key or qualified by category
+        self.by_product.setdefault(product_key, []).append(plan_key)
+        self.by_product.setdefault(f"{category_key}:{product_key}", []).append(plan_key)
+
+    def resolve_scope(self, scope: Dict[str, Any]) -> List[str]:
+        """Get list of plans to test based on scope"""
+        scope_type = scope.get("type", "all")
+        value = scope.get("value", "")
+
+        if scope_type == "all":
+            return list(self.all_plans)
+        elif scope_type == "category":
+            return list(self.by_category.get(value, []))
+        elif scope_type == "product":
+            return list(self.by_product.get(value, []))
+        elif scope_type == "plan":
+            return [value]
+
+        return []
+
+    def plan_config(self, plan_key: str) -> Dict[str, Any]:
+        return self.plans.get(plan_key, {})
+
+    def plan_keys(self) -> Dict[str, Any]:
+        return {"all_plans": self.all_plans, "by_category": self.by_category}
+
+
+class ProductCatalog:
+    """Holds the compiled catalog and swaps it when products.json changes.
+
+    The file's mtime is checked at most once per ``check_interval`` seconds;
+    ``reload()`` forces a rebuild. A new snapshot is compiled in full before it
+    replaces the old one, so readers always see a complete catalog and a broken
+    file leaves the previous catalog in place.
+    """
+
+    def __init__(self, path: Path, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._failed_mtime: Optional[float] = None
+        try:
+            self._current = self._compile()
+        except Exception as e:
+            print(f"Error loading product catalog {self.path}: {e}")
+            self._current = CompiledCatalog({})
+        self._checked_at = time.monotonic()
+
+    def get(self) -> CompiledCatalog:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            mtime = self._file_mtime()
+            if mtime != self._current.mtime and mtime != self._failed_mtime:
+                try:
+                    self._current = self._compile()
+                except Exception as e:
+                    self._failed_mtime = mtime
+                    print(f"Keeping previous product catalog, failed to load {self.path}: {e}")
+        return self._current
+
+    def reload(self) -> CompiledCatalog:
+        """Rebuild the catalog from disk; raises and keeps the old one on failure"""
+        self._current = self._compile()
+        self._checked_at = time.monotonic()
+        return self._current
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _compile(self) -> CompiledCatalog:
+        mtime = self._file_mtime()
+        if mtime is None:
+            # Nothing configured yet, so there is nothing to test
+            return CompiledCatalog({})
+        with open(self.path, "rb") as f:
+            return CompiledCatalog(codecs.decode(f.read()), mtime)
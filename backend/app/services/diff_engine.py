@@ -0,0 +1,261 @@
+"""Structural diff of JSON-like documents.
+
+Walks both documents with an explicit stack (no recursion limit on deep
+payloads) and reports each difference at its JSON pointer path. Identical
+subtrees are skipped as soon as they are reached. Arrays without an
+identifying key are aligned by content digest, so one inserted element does
+not turn every later element into a mismatch. Reported values are summarized
+so a mismatch deep in a large document never carries whole subtrees.
+"""
+import difflib
+import hashlib
+import re
+from collections.abc import Hashable
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.core.codecs import canonical_json
+
+SeverityFn = Callable[[str, str, str], str]
+
+ISO_DATE_PREFIX = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+class DiffOptions:
+    """Tolerances and limits for a structural diff"""
+
+    def __init__(
+        self,
+        numeric_abs_tolerance: float = 0.0,
+        numeric_rel_tolerance: float = 0.0,
+        date_tolerance_seconds: float = 0.0,
+        list_keys: Sequence[str] = ("id",),
+        max_differences: int = 1000,
+        max_value_chars: int = 200,
+        max_aligned_items: int = 2000
+    ):
+        self.numeric_abs_tolerance = numeric_abs_tolerance
+        self.numeric_rel_tolerance = numeric_rel_tolerance
+        self.date_tolerance_seconds = date_tolerance_seconds
+        self.list_keys = tuple(list_keys)
+        self.max_differences = max_differences
+        self.max_value_chars = max_value_chars
+        # Longer unkeyed arrays are compared by position; alignment is quadratic in the worst case
+        self.max_aligned_items = max_aligned_items
+
+    @classmethod
+    def from_settings(cls) -> "DiffOptions":
+        return cls(
+            numeric_abs_tolerance=settings.diff_numeric_abs_tolerance,
+            numeric_rel_tolerance=settings.diff_numeric_rel_tolerance,
+            date_tolerance_seconds=settings.diff_date_tolerance_seconds,
+            list_keys=settings.diff_list_keys,
+            max_differences=settings.diff_max_differences,
+            max_value_chars=settings.diff_max_value_chars
+        )
+
+
+def escape_pointer_token(token: Any) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def content_digest(value: Any) -> bytes:
+    """Stable digest of a subtree's content, independent of key order"""
+    return hashlib.blake2b(canonical_json(value), digest_size=16).digest()
+
+
+def _element_token(value: Any) -> Any:
+    # Scalars are tagged with their type so 1, 1.0, "1" and True stay distinct
+    if isinstance(value, (dict, list)):
+        return content_digest(value)
+    return (type(value).__name__, value if isinstance(value, Hashable) else repr(value))
+
+
+class StructuralDiffer:
+    """Iterative structural diff of two documents.
+
+    ``expected`` is the reference (baseline) and ``actual`` the candidate
+    (target). Objects are compared key by key; arrays of objects are aligned
+    by the first of ``list_keys`` that uniquely identifies every element on
+    both sides, otherwise by position. Numbers and ISO dates honour the
+    configured tolerances.
+    """
+
+    def __init__(self, options: Optional[DiffOptions] = None, severity: Optional[SeverityFn] = None):
+        self.options = options or DiffOptions.from_settings()
+        self.severity = severity or (lambda path, field, diff_type: "info")
+
+    def diff(self, expected: Any, actual: Any) -> Dict[str, Any]:
+        """Compare two documents.
+
+        Returns the differences, whether the difference limit cut the walk
+        short, and how many node pairs were visited.
+        """
+        differences: List[Dict[str, Any]] = []
+        visited = 0
+
+        stack: List[Tuple[str, Any, Any]] = [("", expected, actual)]
+        while stack:
+            if len(differences) >= self.options.max_differences:
+                return {"differences": differences, "truncated": True, "compared_nodes": visited}
+
+            path, exp, act = stack.pop()
+            visited += 1
+
+            # Equal subtrees end here; the comparison runs in C and stops at the first difference
+            if type(exp) is type(act) and exp == act:
+                continue
+
+            if isinstance(exp, dict) and isinstance(act, dict):
+                for key in reversed(list(exp)):
+                    child_path = f"{path}/{escape_pointer_token(key)}"
+                    if key not in act:
+                        differences.append(self._difference(child_path, "missing_field", exp[key], None))
+                    else:
+                        stack.append((child_path, exp[key], act[key]))
+                for key in act:
+                    if key not in exp:
+                        child_path = f"{path}/{escape_pointer_token(key)}"
+                        differences.append(self._difference(child_path, "extra_field", None, act[key]))
+
+            elif isinstance(exp, list) and isinstance(act, list):
+                self._diff_lists(path, exp, act, stack, differences)
+
+            elif self._is_container(exp) or self._is_container(act) or not self._same_kind(exp, act):
+                differences.append(self._difference(path, "type_mismatch", exp, act))
+
+            elif not self._scalars_equal(exp, act):
+                differences.append(self._difference(path, "value_mismatch", exp, act))
+
+        return {"differences": differences, "truncated": False, "compared_nodes": visited}
+
+    def _diff_lists(
+        self,
+        path: str,
+        exp: List[Any],
+        act: List[Any],
+        stack: List[Tuple[str, Any, Any]],
+        differences: List[Dict[str, Any]]
+    ):
+        key = self._alignment_key(exp, act)
+        pairs: List[Tuple[str, Any, Any]] = []
+
+        if key is None and len(exp) != len(act) and max(len(exp), len(act)) <= self.options.max_aligned_items:
+            # Align by content so an insertion or removal only reports that element
+            matcher = difflib.SequenceMatcher(
+                None, [_element_token(v) for v in exp], [_element_token(v) for v in act], autojunk=False
+            )
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag == "equal":
+                    continue
+                common = min(i2 - i1, j2 - j1)
+                for offset in range(common):
+                    pairs.append((f"{path}/{i1 + offset}", exp[i1 + offset], act[j1 + offset]))
+                for i in range(i1 + common, i2):
+                    differences.append(self._difference(f"{path}/{i}", "missing_item", exp[i], None))
+                for j in range(j1 + common, j2):
+                    differences.append(self._difference(f"{path}/{j}", "extra_item", None, act[j]))
+        elif key is None:
+            common = min(len(exp), len(act))
+            for i in range(common):
+                pairs.append((f"{path}/{i}", exp[i], act[i]))
+            for i in range(common, len(exp)):
+                differences.append(self._difference(f"{path}/{i}", "missing_item", exp[i], None))
+            for i in range(common, len(act)):
+                differences.append(self._difference(f"{path}/{i}", "extra_item", None, act[i]))
+        else:
+            # Paths use the element's index in the list it comes from
+            actual_by_key = {item[key]: (i, item) for i, item in enumerate(act)}
+            matched = set()
+            for i, item in enumerate(exp):
+                match = actual_by_key.get(item[key])
+                if match is None:
+                    differences.append(self._difference(f"{path}/{i}", "missing_item", item, None))
+                else:
+                    matched.add(item[key])
+                    pairs.append((f"{path}/{i}", item, match[1]))
+            for i, item in enumerate(act):
+                if item[key] not in matched:
+                    differences.append(self._difference(f"{path}/{i}", "extra_item", None, item))
+
+        stack.extend(reversed(pairs))
+
+    def _alignment_key(self, exp: List[Any], act: List[Any]) -> Optional[str]:
+        """First configured key that uniquely identifies every element on both sides"""
+        if not exp or not act:
+            return None
+        if not all(isinstance(item, dict) for item in exp) or not all(isinstance(item, dict) for item in act):
+            return None
+        for key in self.options.list_keys:
+            for items in (exp, act):
+                values = [item.get(key) for item in items]
+                if not all(isinstance(v, (str, int, float)) for v in values) or len(set(values)) != len(values):
+                    break
+            else:
+                return key
+        return None
+
+    def _is_container(self, value: Any) -> bool:
+        return isinstance(value, (dict, list))
+
+    def _same_kind(self, exp: Any, act: Any) -> bool:
+        if self._is_number(exp) and self._is_number(act):
+            return True
+        if exp is None or act is None:
+            return exp is None and act is None
+        return type(exp) is type(act)
+
+    def _is_number(self, value: Any) -> bool:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    def _scalars_equal(self, exp: Any, act: Any) -> bool:
+        if exp == act:
+            return True
+        if self._is_number(exp) and self._is_number(act):
+            delta = abs(exp - act)
+            return (
+                delta <= self.options.numeric_abs_tolerance
+                or delta <= self.options.numeric_rel_tolerance * max(abs(exp), abs(act))
+            )
+        if (
+            self.options.date_tolerance_seconds
+            and isinstance(exp, str)
+            and ISO_DATE_PREFIX.match(exp)
+            and ISO_DATE_PREFIX.match(act)
+        ):
+            try:
+                exp_time = datetime.fromisoformat(exp.replace("Z", "+00:00"))
+                act_time = datetime.fromisoformat(act.replace("Z", "+00:00"))
+                return abs((exp_time - act_time).total_seconds()) <= self.options.date_tolerance_seconds
+            except (ValueError, TypeError):
+                return False
+        return False
+
+    def _difference(self, path: str, diff_type: str, expected: Any, actual: Any) -> Dict[str, Any]:
+        field = path.rsplit("/", 1)[-1].replace("~1", "/").replace("~0", "~") if path else ""
+        difference = {
+            "path": path or "/",
+            "field": field,
+            "type": diff_type,
+            "severity": self.severity(path, field, diff_type)
+        }
+        if diff_type not in ("extra_field", "extra_item"):
+            difference["expected"] = self._summarize(expected)
+        if diff_type not in ("missing_field", "missing_item"):
+            difference["actual"] = self._summarize(actual)
+        return difference
+
+    def _summarize(self, value: Any) -> Any:
+        """Keep reported values small: containers become a shape summary"""
+        if isinstance(value, dict):
+            if len(value) <= 5 and not any(self._is_container(v) for v in value.values()):
+                return {k: self._summarize(v) for k, v in value.items()}
+            return f"<object with {len(value)} keys>"
+        if isinstance(value, list):
+            if len(value) <= 5 and not any(self._is_container(v) for v in value):
+                return [self._summarize(v) for v in value]
+            return f"<array of {len(value)} items>"
+        if isinstance(value, str) and len(value) > self.options.max_value_chars:
+            return value[:self.options.max_value_chars] + "..."
+        return value
+
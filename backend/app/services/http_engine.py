@@ -0,0 +1,331 @@
+import asyncio
+import base64
+import time
+from typing import Dict, Any, List, Optional, Tuple, Union
+from datetime import datetime
+import httpx
+from app.core import metrics
+from app.core.config import settings
+from app.services.diff_engine import StructuralDiffer
+from app.services.latency import LatencyThresholds, plan_latency
+from app.services.rate_limiter import EnvironmentLimiter, EnvironmentLimiterPool, parse_retry_after
+from app.services.severity import severity_function
+
+try:
+    import h2  # noqa: F401 - only needed to enable HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Used when a plan in products.json has no test_sequence of its own
+DEFAULT_TEST_SEQUENCE = ["application", "payment", "policy", "verification"]
+
+# Steps that create state are sent as POST, everything else as GET
+WRITE_STEPS = {"application", "payment"}
+
+# Failures where the request never reached the environment, so any step may be retried
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class EnvironmentClientPool:
+    """One long-lived async HTTP client per environment.
+
+    Each client keeps its own keep-alive connection pool, so repeated calls to
+    the same environment reuse connections instead of opening a new socket per
+    request. Clients are created lazily and closed on application shutdown.
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str], httpx.AsyncClient] = {}
+        self._timeout = httpx.Timeout(
+            settings.http_timeout_seconds,
+            connect=settings.http_connect_timeout_seconds
+        )
+        self._limits = httpx.Limits(
+            max_connections=settings.http_max_connections_per_env,
+            max_keepalive_connections=settings.http_max_keepalive_per_env,
+            keepalive_expiry=settings.http_keepalive_expiry_seconds
+        )
+        self._http2 = settings.http2_enabled and HTTP2_AVAILABLE
+
+    def get_client(self, env_name: str, base_url: str) -> httpx.AsyncClient:
+        """Get the shared client for an environment, creating it on first use"""
+        key = (env_name, base_url)
+        client = self._clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=base_url,
+                timeout=self._timeout,
+                limits=self._limits,
+                http2=self._http2
+            )
+            self._clients[key] = client
+        return client
+
+    async def close(self):
+        """Close every client and its pooled connections"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+
+class HTTPExecutionEngine:
+    """Sends plan test steps to the target and baseline environments"""
+
+    def __init__(self, client_pool: EnvironmentClientPool, limiters: Optional[EnvironmentLimiterPool] = None):
+        self.client_pool = client_pool
+        self.limiters = limiters or EnvironmentLimiterPool(settings.env_limiter_enabled)
+
+    def build_step_request(
+        self,
+        step: Union[str, Dict[str, Any]],
+        plan_key: str,
+        plan_config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Turn a test_sequence entry into a request description.
+
+        Steps may be plain names ("payment") or objects with explicit
+        "name", "method", "path", "body" and "auth" fields.
+        """
+        if isinstance(step, str):
+            step = {"name": step}
+
+        name = step["name"]
+        method = step.get("method", "POST" if name in WRITE_STEPS else "GET").upper()
+        _, product, plan = (plan_key.split(":") + ["", "", ""])[:3]
+        identity = {
+            "plan_key": plan_key,
+            "product_id": plan_config.get("product_id", product),
+            "plan_id": plan_config.get("id", plan)
+        }
+
+        request = {
+            "plan_key": plan_key,
+            "step": name,
+            "method": method,
+            "path": step.get("path", f"/{name}"),
+            "auth": step.get("auth", "customer"),
+            "json": None,
+            "params": None
+        }
+        if method in ("POST", "PUT", "PATCH"):
+            request["json"] = {**identity, **step.get("body", {})}
+        else:
+            request["params"] = {"plan_id": identity["plan_id"]}
+        return request
+
+    def _auth_headers(
+        self,
+        env_config: Dict[str, Any],
+        request: Dict[str, Any],
+        config: Dict[str, Any]
+    ) -> Dict[str, str]:
+        auth = env_config.get("auth", {})
+        auth_type = auth.get("type")
+        if auth_type == "custom":
+            return dict(auth.get("custom_headers", {}))
+        if auth_type == "basic":
+            username = config.get(auth.get("username_field", ""), "")
+            password = config.get(auth.get("password_field", ""), "")
+            credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
+            return {"Authorization": f"Basic {credentials}"}
+        if auth_type != "bearer":
+            return {}
+
+        # An environment-specific token wins over the tokens from the start request
+        token = config.get(auth.get("token_field", "")) or config.get(f"{request['auth']}_token")
+        return {"Authorization": f"Bearer {token}"} if token else {}
+
+    async def send(
+        self,
+        env_role: str,
+        env_name: str,
+        env_config: Dict[str, Any],
+        request: Dict[str, Any],
+        config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Send one step to one environment and record the call.
+
+        Calls wait for the environment's limiter. A 429/503, or a failure
+        before the request was sent, is retried after the server's
+        Retry-After or a jittered backoff; the call records the last attempt.
+        """
+        client = self.client_pool.get_client(env_name, env_config["base_url"])
+        limiter = self.limiters.get(env_name, env_config)
+        headers = self._auth_headers(env_config, request, config)
+        headers["X-Test-Plan"] = request["plan_key"]
+
+        api_call = {
+            "environment": env_role,
+            "step": request["step"],
+            "endpoint": request["path"],
+            "method": request["method"],
+            "status_code": None,
+            "response_time_ms": None,
+            "response": None,
+            "error": None,
+            "attempts": 0,
+            "timestamp": datetime.now().isoformat()
+        }
+
+        max_attempts = 1 + (limiter.options.max_retries if limiter else 0)
+        while True:
+            api_call["attempts"] += 1
+            response, error, elapsed, retry_after = await self._attempt(client, limiter, request, headers)
+            metrics.OUTBOUND_SECONDS.labels(env_name).observe(elapsed)
+            status_code = response.status_code if response is not None else None
+            metrics.OUTBOUND_REQUESTS.labels(env_name, metrics.status_class(status_code)).inc()
+            reason = self._retry_reason(limiter, request, response, error)
+            if reason is None or api_call["attempts"] >= max_attempts:
+                break
+            metrics.OUTBOUND_RETRIES.labels(env_name, reason).inc()
+            await asyncio.sleep(limiter.retry_delay(api_call["attempts"], retry_after))
+
+        api_call["response_time_ms"] = int(elapsed * 1000)
+        if response is not None:
+            api_call["status_code"] = response.status_code
+            api_call["response"] = self._parse_body(response)
+        else:
+            api_call["error"] = f"{type(error).__name__}: {error}"
+        return api_call
+
+    async def _attempt(
+        self,
+        client: httpx.AsyncClient,
+        limiter: Optional[EnvironmentLimiter],
+        request: Dict[str, Any],
+        headers: Dict[str, str]
+    ) -> Tuple[Optional[httpx.Response], Optional[httpx.HTTPError], float, Optional[float]]:
+        """(response, error, seconds, Retry-After seconds) of one call made within the limiter"""
+        if limiter:
+            await limiter.acquire()
+        response = error = retry_after = None
+        started = time.perf_counter()
+        try:
+            response = await client.request(
+                request["method"],
+                request["path"],
+                json=request["json"],
+                params=request["params"],
+                headers=headers
+            )
+            retry_after = parse_retry_after(response.headers.get("retry-after"))
+        except httpx.HTTPError as e:
+            error = e
+        finally:
+            elapsed = time.perf_counter() - started
+            if limiter and response is None and error is None:
+                limiter.release()  # Cancelled
+            elif limiter:
+                limiter.release(
+                    response.status_code if response is not None else None,
+                    elapsed,
+                    timed_out=isinstance(error, httpx.TimeoutException),
+                    retry_after=retry_after
+                )
+        return response, error, elapsed, retry_after
+
+    def _retry_reason(
+        self,
+        limiter: Optional[EnvironmentLimiter],
+        request: Dict[str, Any],
+        response: Optional[httpx.Response],
+        error: Optional[httpx.HTTPError]
+    ) -> Optional[str]:
+        """Why the call should be retried, or None"""
+        if limiter is None:
+            return None
+        if response is not None:
+            return str(response.status_code) if response.status_code in limiter.options.retry_statuses else None
+        # A request that may have reached the environment is only resent when repeating it is harmless
+        if isinstance(error, UNSENT_ERRORS) or (
+            isinstance(error, httpx.TransportError) and request["method"] in IDEMPOTENT_METHODS
+        ):
+            return type(error).__name__
+        return None
+
+    async def send_pair(
+        self,
+        target: Tuple[str, Dict[str, Any]],
+        baseline: Tuple[str, Dict[str, Any]],
+        request: Dict[str, Any],
+        config: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Send the same step to target and baseline at the same time"""
+        target_call, baseline_call = await asyncio.gather(
+            self.send("target", target[0], target[1], request, config),
+            self.send("baseline", baseline[0], baseline[1], request, config)
+        )
+        return target_call, baseline_call
+
+    def _parse_body(self, response: httpx.Response) -> Any:
+        try:
+            return response.json()
+        except ValueError:
+            return {"text": response.text[:settings.http_max_text_body_chars]}
+
+    def compare_calls(self, api_calls: List[Dict[str, Any]], plan_key: str = "") -> Dict[str, Any]:
+        """Build the environment comparison for a plan from its recorded calls"""
+        differ = StructuralDiffer(severity=severity_function(plan_key))
+        by_step: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for call in api_calls:
+            by_step.setdefault(call["step"], {})[call["environment"]] = call
+
+        differences = []
+        for step, calls in by_step.items():
+            target_call = calls.get("target", {})
+            baseline_call = calls.get("baseline", {})
+            if target_call.get("status_code") != baseline_call.get("status_code"):
+                differences.append({
+                    "step": step,
+                    "field": "status_code",
+                    "type": "value_mismatch",
+                    "severity": "critical",
+                    "target": target_call.get("status_code"),
+                    "baseline": baseline_call.get("status_code")
+                })
+            differences.extend(
+                self._compare_bodies(differ, step, target_call.get("response"), baseline_call.get("response"))
+            )
+
+        return {
+            "status": "diff" if differences else "match",
+            "differences": differences,
+            "target_summary": self._summarize(api_calls, "target"),
+            "baseline_summary": self._summarize(api_calls, "baseline"),
+            "latency": plan_latency(api_calls, LatencyThresholds.from_settings())
+        }
+
+    def _compare_bodies(
+        self,
+        differ: StructuralDiffer,
+        step: str,
+        target: Any,
+        baseline: Any
+    ) -> List[Dict[str, Any]]:
+        """Structural diff of one step's responses, with baseline as the reference"""
+        result = differ.diff(baseline, target)
+        differences = []
+        for difference in result["differences"]:
+            entry = {
+                "step": step,
+                "path": difference["path"],
+                "field": difference["field"],
+                "type": difference["type"],
+                "severity": difference["severity"]
+            }
+            if "expected" in difference:
+                entry["baseline"] = difference["expected"]
+            if "actual" in difference:
+                entry["target"] = difference["actual"]
+            differences.append(entry)
+        return differences
+
+    def _summarize(self, api_calls: List[Dict[str, Any]], env_role: str) -> Dict[str, Any]:
+        calls = [c for c in api_calls if c["environment"] == env_role]
+        return {
+            "api_calls": len(calls),
+            "total_response_time": sum(c["response_time_ms"] or 0 for c in calls),
+            "errors": sum(1 for c in calls if c["error"] or (c["status_code"] or 0) >= 400)
+        }
@@ -0,0 +1,297 @@
+"""Latency distributions of test runs and slowdown verdicts.
+
+LatencySketch is a log-bucketed quantile sketch in the manner of DDSketch:
+a value v lands in bucket ceil(log(v) / log(gamma)) with
+gamma = (1 + a) / (1 - a), so any quantile it reports is within relative
+error a of the true one, whatever the distribution. Sketches only hold
+bucket counts, merge by adding them, and serialize to a few hundred numbers,
+so a run keeps its distributions without keeping every sample.
+
+A LatencyProfile holds one sketch per step and per endpoint for each
+environment role. Finished runs store theirs, so the next run against the
+same target environment can be compared with its recent history as well as
+with its own baseline.
+"""
+import math
+from typing import Dict, Any, Iterable, List, Optional
+from app.core.config import settings
+
+ENV_ROLES = ("target", "baseline")
+
+# Groupings of calls a profile keeps sketches for
+DIMENSIONS = ("steps", "endpoints")
+
+QUANTILES = (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+
+# Quantiles compared when looking for a slowdown: the typical call and the tail
+VERDICT_QUANTILES = ("p50", "p95")
+
+
+class LatencySketch:
+    """Mergeable quantile sketch with bounded relative error"""
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 0:
+            # Sub-millisecond calls are recorded as 0 ms
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other: "LatencySketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        # Fold the lowest buckets together; the tail keeps its accuracy
+        keys = sorted(self.buckets)
+        excess = keys[:len(keys) - self.max_buckets + 1]
+        self.buckets[excess[-1]] += sum(self.buckets.pop(key) for key in excess[:-1])
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(key-1), gamma^key] in relative terms
+                estimate = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def stats(self) -> Dict[str, Any]:
+        if self.count == 0:
+            return {"count": 0}
+        stats = {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 1),
+            "min": self.min,
+            "max": self.max
+        }
+        for name, q in QUANTILES:
+            stats[name] = round(self.quantile(q), 1)
+        return stats
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact form: counts of the bucket range between the lowest and highest key"""
+        low = min(self.buckets) if self.buckets else 0
+        high = max(self.buckets) if self.buckets else -1
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "zeros": self.zeros,
+            "offset": low,
+            "counts": [self.buckets.get(key, 0) for key in range(low, high + 1)]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencySketch":
+        sketch = cls(data["relative_accuracy"])
+        sketch.buckets = {data["offset"] + i: count for i, count in enumerate(data["counts"]) if count}
+        sketch.zeros = data["zeros"]
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+
+class LatencyThresholds:
+    """When a target counts as significantly slower than its reference"""
+
+    def __init__(self, ratio: float = 0.25, min_delta_ms: float = 50, min_samples: int = 5):
+        # Both must be exceeded: relative slowdown and absolute milliseconds
+        self.ratio = ratio
+        self.min_delta_ms = min_delta_ms
+        # Distributions with fewer calls on either side get no verdict
+        self.min_samples = min_samples
+
+    @classmethod
+    def from_settings(cls) -> "LatencyThresholds":
+        return cls(
+            ratio=settings.latency_regression_ratio,
+            min_delta_ms=settings.latency_regression_min_ms,
+            min_samples=settings.latency_min_samples
+        )
+
+    def slower(self, candidate: float, reference: float) -> bool:
+        return candidate > reference * (1 + self.ratio) and candidate - reference >= self.min_delta_ms
+
+
+class LatencyProfile:
+    """Latency sketches by step and by endpoint, for each environment role"""
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.sketches: Dict[str, Dict[str, Dict[str, LatencySketch]]] = {dimension: {} for dimension in DIMENSIONS}
+
+    def sketch(self, dimension: str, name: str, env_role: str) -> LatencySketch:
+        roles = self.sketches[dimension].setdefault(name, {})
+        if env_role not in roles:
+            roles[env_role] = LatencySketch(self.relative_accuracy)
+        return roles[env_role]
+
+    def add_calls(self, api_calls: Iterable[Dict[str, Any]]):
+        """Record the calls that got a response; transport failures have no latency to speak of"""
+        for call in api_calls:
+            if call.get("error") or call.get("response_time_ms") is None:
+                continue
+            if call.get("environment") not in ENV_ROLES:
+                continue
+            value = call["response_time_ms"]
+            self.sketch("steps", call["step"], call["environment"]).add(value)
+            self.sketch("endpoints", f"{call['method']} {call['endpoint']}", call["environment"]).add(value)
+
+    def merge(self, other: "LatencyProfile", roles: Iterable[str] = ENV_ROLES):
+        for dimension in DIMENSIONS:
+            for name, sketches in other.sketches[dimension].items():
+                for env_role, sketch in sketches.items():
+                    if env_role in roles:
+                        self.sketch(dimension, name, env_role).merge(sketch)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            dimension: {
+                name: {env_role: sketch.to_dict() for env_role, sketch in sketches.items()}
+                for name, sketches in self.sketches[dimension].items()
+            }
+            for dimension in DIMENSIONS
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], relative_accuracy: float = 0.01) -> "LatencyProfile":
+        profile = cls(relative_accuracy)
+        for dimension in DIMENSIONS:
+            for name, sketches in data.get(dimension, {}).items():
+                for env_role, sketch in sketches.items():
+                    profile.sketches[dimension].setdefault(name, {})[env_role] = LatencySketch.from_dict(sketch)
+        return profile
+
+
+def plan_latency(api_calls: List[Dict[str, Any]], thresholds: LatencyThresholds) -> Dict[str, Any]:
+    """Compare one plan's target and baseline calls step by step.
+
+    A plan has a single sample per step and environment, so the verdict uses
+    the plan total over the steps that got a response on both sides.
+    """
+    by_step: Dict[str, Dict[str, float]] = {}
+    for call in api_calls:
+        if call.get("error") or call.get("response_time_ms") is None:
+            continue
+        by_step.setdefault(call["step"], {})[call["environment"]] = call["response_time_ms"]
+
+    target_ms = baseline_ms = 0
+    slow_steps = []
+    for step, times in by_step.items():
+        if "target" not in times or "baseline" not in times:
+            continue
+        target_ms += times["target"]
+        baseline_ms += times["baseline"]
+        if thresholds.slower(times["target"], times["baseline"]):
+            slow_steps.append(step)
+
+    return {
+        "target_ms": target_ms,
+        "baseline_ms": baseline_ms,
+        "ratio": round(target_ms / baseline_ms, 3) if baseline_ms else None,
+        "slow_steps": slow_steps,
+        "regression": thresholds.slower(target_ms, baseline_ms)
+    }
+
+
+def compare_sketches(
+    candidate: Optional[LatencySketch],
+    reference: Optional[LatencySketch],
+    thresholds: LatencyThresholds
+) -> Optional[Dict[str, Any]]:
+    """Verdict on candidate against reference, or None without enough samples"""
+    if candidate is None or reference is None:
+        return None
+    if min(candidate.count, reference.count) < thresholds.min_samples:
+        return None
+    verdict: Dict[str, Any] = {}
+    slower = []
+    for name, q in QUANTILES:
+        if name not in VERDICT_QUANTILES:
+            continue
+        value, base = candidate.quantile(q), reference.quantile(q)
+        verdict[f"{name}_ratio"] = round(value / base, 3) if base else None
+        if thresholds.slower(value, base):
+            slower.append(name)
+    verdict["regression"] = bool(slower)
+    verdict["quantiles"] = slower
+    return verdict
+
+
+def latency_report(
+    profile: LatencyProfile,
+    history: Optional[LatencyProfile],
+    history_runs: List[str],
+    thresholds: LatencyThresholds
+) -> Dict[str, Any]:
+    """Distributions of a run, compared with its baseline and the target's recent runs"""
+    report: Dict[str, Any] = {
+        "relative_accuracy": profile.relative_accuracy,
+        "history_runs": history_runs,
+        "regressions": []
+    }
+    for dimension in DIMENSIONS:
+        entries = {}
+        for name, sketches in sorted(profile.sketches[dimension].items()):
+            target = sketches.get("target")
+            past = history.sketches[dimension].get(name, {}).get("target") if history else None
+            entry = {
+                env_role: sketches[env_role].stats() for env_role in ENV_ROLES if env_role in sketches
+            }
+            entry["vs_baseline"] = compare_sketches(target, sketches.get("baseline"), thresholds)
+            entry["vs_history"] = compare_sketches(target, past, thresholds)
+            for against in ("baseline", "history"):
+                verdict = entry[f"vs_{against}"]
+                if verdict and verdict["regression"]:
+                    report["regressions"].append({
+                        "dimension": dimension,
+                        "name": name,
+                        "against": against,
+                        "quantiles": verdict["quantiles"]
+                    })
+            entries[name] = entry
+        report[dimension] = entries
+    report["sketches"] = profile.to_dict()
+    return report
@@ -0,0 +1,202 @@
+"""On-box model inference for AI analysis.
+
+The model runs in a pool of worker processes started with ``spawn``. Each
+worker loads the model once in its initializer, and only the workers import
+torch and transformers. In the API process, prompts wait in a bounded queue.
+One batcher per worker drains the queue into batches: it takes whatever is
+queued, up to ``max_batch_size``, waiting at most ``batch_wait_ms`` for more,
+so a busy queue fills batches and an idle one adds little latency. When the
+queue is full, new requests are rejected instead of piling up. If a worker
+dies, the pool is rebuilt, at most once per ``restart_backoff_seconds``.
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the local inference queue cannot take another prompt"""
+
+
+# Worker process state, set once by the initializer
+_tokenizer = None
+_model = None
+
+
+def load_model(model_name: str, threads: int):
+    """Worker initializer: load the model once per process"""
+    global _tokenizer, _model
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    if threads:
+        torch.set_num_threads(threads)
+    _tokenizer = AutoTokenizer.from_pretrained(model_name, padding_side="left")
+    if _tokenizer.pad_token is None:
+        _tokenizer.pad_token = _tokenizer.eos_token
+    _model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32)
+    _model.eval()
+
+
+def generate_batch(prompts: List[str], max_new_tokens: int) -> List[str]:
+    """Greedy generation for a batch of prompts in one forward pass per token"""
+    import torch
+
+    if getattr(_tokenizer, "chat_template", None):
+        texts = [
+            _tokenizer.apply_chat_template(
+                [{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True
+            )
+            for prompt in prompts
+        ]
+    else:
+        texts = prompts
+    inputs = _tokenizer(texts, return_tensors="pt", padding=True)
+    with torch.inference_mode():
+        output = _model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=_tokenizer.pad_token_id
+        )
+    # Left padding puts every prompt's end at the same offset
+    new_tokens = output[:, inputs["input_ids"].shape[1]:]
+    return _tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+
+
+class LocalInferencePool:
+    """Dynamic batching front end for a pool of model worker processes"""
+
+    # Module-level callables so they can be sent to spawned workers
+    initializer = staticmethod(load_model)
+    generate = staticmethod(generate_batch)
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int = 1,
+        threads_per_worker: int = 0,
+        max_batch_size: int = 8,
+        batch_wait_ms: float = 20,
+        max_queue: int = 64,
+        max_new_tokens: int = 400,
+        restart_backoff_seconds: float = 30
+    ):
+        self.model_name = model_name
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.max_batch_size = max_batch_size
+        self.batch_wait_seconds = batch_wait_ms / 1000
+        self.max_new_tokens = max_new_tokens
+        self.restart_backoff_seconds = restart_backoff_seconds
+        self._broken_at: Optional[float] = None
+        self.queue: "asyncio.Queue[Tuple[str, asyncio.Future]]" = asyncio.Queue(maxsize=max_queue)
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.batchers: List[asyncio.Task] = []
+        self.counters = {"requests": 0, "rejected": 0, "batches": 0, "batched_prompts": 0, "failures": 0}
+
+    def start(self):
+        self.executor = self._new_executor()
+        self.batchers = [asyncio.create_task(self._batcher()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self.batchers:
+            task.cancel()
+        await asyncio.gather(*self.batchers, return_exceptions=True)
+        self.batchers = []
+        while not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Local inference pool is shutting down"))
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def generate_text(self, prompt: str, wait: bool = False) -> str:
+        """Queue a prompt and wait for its completion.
+
+        Raises InferenceQueueFull when the queue is full, unless ``wait`` is
+        set, in which case the caller waits for room instead.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if wait:
+            await self.queue.put((prompt, future))
+        else:
+            try:
+                self.queue.put_nowait((prompt, future))
+            except asyncio.QueueFull:
+                self.counters["rejected"] += 1
+                raise InferenceQueueFull(f"Local inference queue is full ({self.queue.maxsize} prompts)")
+        self.counters["requests"] += 1
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self.counters["batches"]
+        return {
+            "model": self.model_name,
+            "workers": self.workers,
+            "queued": self.queue.qsize(),
+            "max_queue": self.queue.maxsize,
+            **self.counters,
+            "average_batch_size": round(self.counters["batched_prompts"] / batches, 2) if batches else 0.0
+        }
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer,
+            initargs=(self.model_name, self.threads_per_worker)
+        )
+
+    def _usable_executor(self) -> ProcessPoolExecutor:
+        """The worker pool, rebuilt after a crash once the backoff has passed"""
+        if self._broken_at is not None:
+            if time.monotonic() - self._broken_at < self.restart_backoff_seconds:
+                raise RuntimeError("Local inference workers crashed; waiting before restarting them")
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._new_executor()
+            self._broken_at = None
+        return self.executor
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.batch_wait_seconds
+            while len(batch) < self.max_batch_size:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Callers that gave up are not worth a slot in the batch
+            batch = [(prompt, future) for prompt, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            self.counters["batches"] += 1
+            self.counters["batched_prompts"] += len(batch)
+            try:
+                outputs = await loop.run_in_executor(
+                    self._usable_executor(), self.generate, [prompt for prompt, _ in batch], self.max_new_tokens
+                )
+                for (_, future), output in zip(batch, outputs):
+                    if not future.done():
+                        future.set_result(output)
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool) and self._broken_at is None:
+                    self._broken_at = time.monotonic()
+                self.counters["failures"] += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
@@ -0,0 +1,245 @@
+"""Workers that execute queued plans, and the API-side monitor that follows them.
+
+A PlanWorker claims jobs from the PlanQueue, up to ``concurrency`` at a time,
+and keeps their leases alive with heartbeats. One runs inside the API unless
+disabled; ``python -m app.worker`` starts more as separate processes.
+
+The RunMonitor runs in each API process. It reads job changes from the queue
+into the run registry, so status polling and event streams cover plans run
+by any worker. Runs queued before a restart or by another API process are
+adopted from their stored document. When a run's plans have all finished,
+exactly one monitor compacts and completes it. The monitor also keeps the
+hold on the credentials of runs this process queued, and interrupts queued
+runs whose credentials are gone.
+"""
+import asyncio
+import os
+import socket
+import uuid
+from typing import Dict, Any, List, Optional, Set
+from app.core import metrics
+from app.core.job_queue import PlanQueue, QUEUED, LEASED, DONE
+from app.services.test_executor import TestExecutorService, new_plan_progress
+
+# Job changes read from the queue per query
+CHANGE_BATCH = 5000
+
+
+class PlanWorker:
+    """Claims plan jobs and runs them until stopped"""
+
+    def __init__(
+        self,
+        queue: PlanQueue,
+        executor: TestExecutorService,
+        concurrency: int,
+        lease_seconds: float = 60,
+        poll_interval: float = 0.5,
+        worker_id: Optional[str] = None
+    ):
+        self.queue = queue
+        self.executor = executor
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs: Dict[int, asyncio.Task] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._claim_loop()), asyncio.create_task(self._heartbeat_loop())]
+
+    async def stop(self):
+        """Stop claiming and hand unfinished jobs back to the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        unfinished = list(self.jobs)
+        for task in list(self.jobs.values()):
+            task.cancel()
+        await asyncio.gather(*self.jobs.values(), return_exceptions=True)
+        if unfinished:
+            await asyncio.to_thread(self.queue.release, self.worker_id, unfinished)
+
+    async def _claim_loop(self):
+        while True:
+            claimed = []
+            free = self.concurrency - len(self.jobs)
+            if free > 0:
+                try:
+                    claimed = await asyncio.to_thread(self.queue.claim, self.worker_id, free, self.lease_seconds)
+                except Exception as e:
+                    print(f"Error claiming plan jobs: {e}")
+            for job in claimed:
+                self.jobs[job["job_id"]] = asyncio.create_task(self._execute(job))
+
+            if not claimed or len(self.jobs) >= self.concurrency:
+                # Sleep until a slot frees up or it is time to look for new work
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _execute(self, job: Dict[str, Any]):
+        metrics.ACTIVE_PLANS.inc()
+        try:
+            result = await self.executor.execute_job(job)
+            if not await asyncio.to_thread(self.queue.complete, job["job_id"], self.worker_id, result):
+                print(f"Plan {job['plan_key']} of {job['test_id']} was taken over by another worker")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The lease runs out and another worker retries the plan
+            print(f"Error running plan {job['plan_key']} of {job['test_id']}: {e}")
+        finally:
+            self.jobs.pop(job["job_id"], None)
+            metrics.ACTIVE_PLANS.dec()
+            self._wake.set()
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not self.jobs:
+                continue
+            try:
+                held = set(await asyncio.to_thread(
+                    self.queue.heartbeat, self.worker_id, list(self.jobs), self.lease_seconds
+                ))
+            except Exception as e:
+                print(f"Error renewing plan leases: {e}")
+                continue
+            for job_id, task in list(self.jobs.items()):
+                if job_id not in held:
+                    # Our lease lapsed and another worker owns the plan now
+                    task.cancel()
+
+
+class RunMonitor:
+    """Mirrors queue progress into the run registry and finalizes drained runs"""
+
+    def __init__(self, queue: PlanQueue, executor: TestExecutorService, poll_interval: float = 0.5):
+        self.queue = queue
+        self.executor = executor
+        self.poll_interval = poll_interval
+        self.last_rev = 0
+        # Plans already reported finished, per run
+        self.finished: Dict[str, Set[str]] = {}
+        # Runs seen in the queue, so their disappearance means another process finalized them
+        self.tracked: Set[str] = set()
+        # Queued runs without a readable document
+        self.orphaned: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run_once(self):
+        while True:
+            changes, self.last_rev = await asyncio.to_thread(self.queue.changes, self.last_rev, CHANGE_BATCH)
+            for change in changes:
+                await self._apply(change)
+            if len(changes) < CHANGE_BATCH:
+                break
+
+        for test_id in await asyncio.to_thread(self.queue.drained_runs):
+            if not await asyncio.to_thread(self.queue.claim_finalization, test_id):
+                continue
+            try:
+                await self.executor.finish_run(test_id)
+            except Exception as e:
+                print(f"Error finalizing test {test_id}: {e}")
+            await asyncio.to_thread(self.queue.remove_run, test_id)
+            self.finished.pop(test_id, None)
+
+        await asyncio.to_thread(self.queue.renew_credentials)
+        stranded = await self.executor.interrupt_stranded_runs()
+        if any(stranded.values()):
+            print(f"Settled queued runs whose credentials were lost: {stranded}")
+
+        queued = set(await asyncio.to_thread(self.queue.runs))
+        for test_id in self.tracked - queued:
+            self.executor.mark_finished(test_id)
+            self.finished.pop(test_id, None)
+            self.orphaned.discard(test_id)
+        self.tracked = queued
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Error following the plan queue: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _apply(self, change: Dict[str, Any]):
+        test_id, plan_key = change["test_id"], change["plan_key"]
+        progress = self.executor.running_tests.get(test_id)
+        if progress is None:
+            if test_id in self.orphaned:
+                return
+            progress = await self._adopt(test_id)
+            if progress is None:
+                self.orphaned.add(test_id)
+                return
+
+        plan = progress["plans"].setdefault(plan_key, new_plan_progress())
+        finished = self.finished.setdefault(test_id, set())
+        if change["status"] == DONE:
+            if plan_key in finished:
+                return
+            finished.add(plan_key)
+            result = change["result"] or {}
+            plan.update({
+                "status": result.get("status", "failed"),
+                "progress": 100 if result.get("status") == "completed" else plan.get("progress", 0),
+                "error": result.get("error"),
+                "api_calls": [],
+                "api_call_count": result.get("api_call_count", 0),
+                "comparison_status": result.get("comparison_status"),
+                "latency_regression": result.get("latency_regression", False)
+            })
+            # Plans finish out of order, so progress counts finished plans
+            progress["progress"] = int(len(finished) / max(len(progress["plans"]), 1) * 100)
+            self.executor.registry.publish(test_id, {
+                "type": "plan_finished",
+                "plan": plan_key,
+                "status": plan["status"],
+                "error": plan["error"],
+                "comparison": plan["comparison_status"],
+                "run_progress": progress["progress"]
+            })
+        elif change["status"] == LEASED and plan["status"] == "pending":
+            # Workers in this process report their own plans as they start
+            plan["status"] = "running"
+            progress["current_step"] = f"Testing {plan_key}"
+            self.executor.registry.publish(test_id, {"type": "plan_started", "plan": plan_key})
+        elif change["status"] == QUEUED and plan_key not in finished and plan["status"] != "pending":
+            # Handed back after its worker was lost
+            progress["plans"][plan_key] = new_plan_progress()
+
+    async def _adopt(self, test_id: str) -> Optional[Dict[str, Any]]:
+        """Register a queued run that this process did not start"""
+        test_data = await self.executor.storage.get_test_document(test_id)
+        if not test_data:
+            return None
+        metadata = test_data.get("test_metadata", {})
+        environments = metadata.get("environments", {})
+        plan_keys = await asyncio.to_thread(self.queue.run_plans, test_id)
+        progress = self.executor.new_run_progress(
+            test_id,
+            metadata.get("started_at", ""),
+            environments.get("target", ""),
+            environments.get("baseline", ""),
+            plan_keys
+        )
+        self.executor.registry.register(test_id, progress)
+        return progress
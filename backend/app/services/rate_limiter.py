@@ -0,0 +1,293 @@
+"""Outbound limits per tested environment.
+
+Each environment gets a token bucket, which caps the request rate when
+configured, and an adaptive concurrency limit. The limit follows AIMD: it
+grows by about one slot per window of successful calls, and halves when the
+environment pushes back. Pushback is a 429/503, a timeout, or latency well
+above the recent minimum. A ``Retry-After`` header on a 429/503 pauses
+every call to the environment, for at most the longest retry backoff. Calls
+rejected with a retryable status are retried with jittered exponential
+backoff.
+
+Settings give the defaults. An entry in environments.json can override them
+under ``"rate_limit"``. Limiters live per process: a rate applies to each
+API or worker process on its own.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+from app.core import metrics
+from app.core.config import settings
+
+# Recent calls whose fastest response is the latency reference
+LATENCY_WINDOW = 50
+
+# Keys of an environment's "rate_limit" entry; "enabled": false turns the limiter off
+CONFIG_KEYS = (
+    "requests_per_second", "burst", "initial_concurrency", "min_concurrency", "max_concurrency",
+    "latency_tolerance", "latency_min_delta_ms", "decrease_factor", "max_retries",
+    "retry_backoff_seconds", "retry_backoff_max_seconds", "retry_statuses"
+)
+
+
+class LimiterOptions:
+    """Rate, concurrency and retry settings of one environment"""
+
+    def __init__(
+        self,
+        requests_per_second: float = 0,
+        burst: int = 0,
+        initial_concurrency: int = 16,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        latency_tolerance: float = 2.0,
+        latency_min_delta_ms: float = 50,
+        decrease_factor: float = 0.5,
+        max_retries: int = 3,
+        retry_backoff_seconds: float = 0.5,
+        retry_backoff_max_seconds: float = 30,
+        retry_statuses: Sequence[int] = (429, 503)
+    ):
+        self.requests_per_second = requests_per_second
+        # A full bucket allows this many calls at once; one second's worth by default
+        self.burst = burst or max(1, int(requests_per_second))
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.initial_concurrency = min(max(initial_concurrency, self.min_concurrency), self.max_concurrency)
+        # Slower than both this multiple of the recent minimum and this many ms counts as overload
+        self.latency_tolerance = latency_tolerance
+        self.latency_min_delta_ms = latency_min_delta_ms
+        self.decrease_factor = decrease_factor
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.retry_backoff_max_seconds = retry_backoff_max_seconds
+        self.retry_statuses = tuple(retry_statuses)
+
+    @classmethod
+    def from_config(cls, rate_limit: Dict[str, Any]) -> "LimiterOptions":
+        """Settings defaults, overridden by an environment's "rate_limit" entry"""
+        options = {
+            "requests_per_second": settings.env_requests_per_second,
+            "burst": settings.env_burst,
+            "initial_concurrency": settings.env_initial_concurrency,
+            "min_concurrency": settings.env_min_concurrency,
+            "max_concurrency": settings.env_max_concurrency,
+            "latency_tolerance": settings.env_latency_tolerance,
+            "max_retries": settings.env_max_retries,
+            "retry_backoff_seconds": settings.env_retry_backoff_seconds,
+            "retry_backoff_max_seconds": settings.env_retry_backoff_max_seconds
+        }
+        options.update({key: value for key, value in rate_limit.items() if key in CONFIG_KEYS})
+        return cls(**options)
+
+
+class TokenBucket:
+    """Caps the call rate; ``pause`` holds every caller until a moment has passed"""
+
+    def __init__(self, rate: float, burst: int, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.clock = clock
+        self.updated = clock()
+        self.paused_until = 0.0
+
+    async def acquire(self):
+        while True:
+            now = self.clock()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            if self.rate <= 0:
+                return
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+    def paused_for(self) -> float:
+        return max(0.0, self.paused_until - self.clock())
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on calls in flight"""
+
+    def __init__(self, options: LimiterOptions, clock=time.monotonic):
+        self.options = options
+        self.clock = clock
+        self.limit = float(options.initial_concurrency)
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        # Fastest call of the last full window, and of the window being filled
+        self._reference: Optional[float] = None
+        self._window_min: Optional[float] = None
+        self._window_count = 0
+
+    async def acquire(self):
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                else:
+                    # Woken just before being cancelled; hand the slot on
+                    self._wake()
+                raise
+        self.in_flight += 1
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False):
+        """Free a slot and adapt the limit; without a latency the call says nothing about load"""
+        self.in_flight -= 1
+        if overloaded:
+            self._decrease(latency or 0.0)
+        elif latency is not None:
+            if self._slow(latency):
+                self._decrease(latency)
+            else:
+                self.limit = min(float(self.options.max_concurrency), self.limit + 1 / self.limit)
+        self._wake()
+
+    def _slow(self, latency: float) -> bool:
+        if self._window_min is None or latency < self._window_min:
+            self._window_min = latency
+        self._window_count += 1
+        if self._window_count >= LATENCY_WINDOW:
+            # A new reference every window, so a lasting slowdown becomes the new normal
+            self._reference, self._window_min, self._window_count = self._window_min, None, 0
+        reference = self._reference if self._reference is not None else self._window_min
+        return (
+            latency > reference * self.options.latency_tolerance
+            and (latency - reference) * 1000 >= self.options.latency_min_delta_ms
+        )
+
+    def _decrease(self, latency: float):
+        # Calls already in flight report the same overload; back off once per round trip
+        now = self.clock()
+        if now - self._last_decrease < latency:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.options.min_concurrency), self.limit * self.options.decrease_factor)
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+
+class EnvironmentLimiter:
+    """Token bucket and adaptive concurrency for one environment"""
+
+    def __init__(self, env_name: str, options: LimiterOptions):
+        self.env_name = env_name
+        self.options = options
+        self.bucket = TokenBucket(options.requests_per_second, options.burst)
+        self.concurrency = AdaptiveConcurrency(options)
+        self.throttled = 0
+        self.retries = 0
+        self._limit_gauge = metrics.OUTBOUND_CONCURRENCY_LIMIT.labels(env_name)
+        self._limit_gauge.set(options.initial_concurrency)
+
+    async def acquire(self):
+        await self.concurrency.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self.concurrency.release()
+            raise
+
+    def release(
+        self,
+        status_code: Optional[int] = None,
+        latency: Optional[float] = None,
+        timed_out: bool = False,
+        retry_after: Optional[float] = None
+    ):
+        """Report how a call went; call with no arguments when it never completed"""
+        throttled = status_code in self.options.retry_statuses
+        if throttled:
+            self.throttled += 1
+            if retry_after:
+                # Retry-After on other responses is ignored, and no hint stalls the environment for long
+                self.bucket.pause(min(retry_after, self.options.retry_backoff_max_seconds))
+        overloaded = timed_out or throttled
+        self.concurrency.release(latency, overloaded)
+        self._limit_gauge.set(int(self.concurrency.limit))
+
+    def retry_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Seconds to wait before retry number ``attempt``"""
+        self.retries += 1
+        ceiling = self.options.retry_backoff_max_seconds
+        if retry_after is not None:
+            # The server's hint, spread a little so callers do not return in lockstep
+            return min(ceiling, retry_after * random.uniform(1.0, 1.1))
+        # Full jitter over an exponentially growing window
+        return random.uniform(0, min(ceiling, self.options.retry_backoff_seconds * 2 ** (attempt - 1)))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight,
+            "waiting": self.concurrency.waiting,
+            "requests_per_second": self.options.requests_per_second or None,
+            "paused_seconds": round(self.bucket.paused_for(), 3),
+            "throttled": self.throttled,
+            "retries": self.retries
+        }
+
+
+class EnvironmentLimiterPool:
+    """One limiter per environment, created on first use and replaced when its config changes"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._limiters: Dict[str, Tuple[Dict[str, Any], EnvironmentLimiter]] = {}
+
+    def get(self, env_name: str, env_config: Dict[str, Any]) -> Optional[EnvironmentLimiter]:
+        rate_limit = env_config.get("rate_limit") or {}
+        if not self.enabled or rate_limit.get("enabled", True) is False:
+            return None
+        entry = self._limiters.get(env_name)
+        if entry is None or entry[0] != rate_limit:
+            entry = self._limiters[env_name] = (rate_limit, EnvironmentLimiter(env_name, LimiterOptions.from_config(rate_limit)))
+        return entry[1]
+
+    def snapshot(self, env_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Live limits of the given environments that have been called in this process"""
+        return {name: self._limiters[name][1].snapshot() for name in env_names if name in self._limiters}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header, given as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,178 @@
+"""Record/replay stand-in for target and baseline environments.
+
+Recording: when a test is started with ``record`` set, each plan's target
+and baseline exchanges are appended to a gzip-compressed JSON Lines cassette
+under ``data/cassettes`` when the plan finishes.
+
+Replay: ``python -m app.services.replay --cassette <file> --port 9100`` serves
+those exchanges back. Point an environment's ``base_url`` at
+``http://127.0.0.1:9100/<env_name>`` and runs hit the replay server instead
+of a shared QA/stage environment.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import math
+import os
+import random
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+# (environment, method, path, plan_key)
+ExchangeKey = Tuple[str, str, str, Optional[str]]
+
+
+class CassetteRecorder:
+    """Collects one plan's exchanges and appends them to a cassette file.
+
+    ``close`` writes everything as one gzip member in a single O_APPEND
+    write, so workers in several processes can record into the same
+    cassette; gzip readers treat concatenated members as one stream.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lines: List[str] = []
+
+    def record(self, env_name: str, plan_key: str, api_call: Dict[str, Any]):
+        record = {
+            "env": env_name,
+            "plan": plan_key,
+            "step": api_call["step"],
+            "method": api_call["method"],
+            "path": api_call["endpoint"],
+            "status": api_call["status_code"],
+            "ms": api_call["response_time_ms"],
+            "body": api_call["response"]
+        }
+        self._lines.append(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+
+    def close(self):
+        if not self._lines:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        member = gzip.compress("".join(self._lines).encode("utf-8"))
+        self._lines = []
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, member)
+        finally:
+            os.close(fd)
+
+
+def load_cassettes(paths: List[Path]) -> Dict[ExchangeKey, List[Dict[str, Any]]]:
+    """Index recorded exchanges by environment, method, path and plan"""
+    exchanges: Dict[ExchangeKey, List[Dict[str, Any]]] = {}
+    for path in paths:
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("status") is None:
+                    continue  # Transport failures have nothing to replay
+                key = (record["env"], record["method"], record["path"], record["plan"])
+                exchanges.setdefault(key, []).append(record)
+                # Plan-agnostic fallback for requests without a known plan
+                exchanges.setdefault(key[:3] + (None,), []).append(record)
+    return exchanges
+
+
+class LatencyModel:
+    """Response delay distribution for the replay server.
+
+    Specs: ``recorded[:scale]``, ``fixed:<ms>``, ``uniform:<lo>:<hi>``,
+    ``normal:<mean>:<stddev>``, ``lognormal:<median>:<sigma>``.
+    """
+
+    def __init__(self, spec: str = "recorded", rng: Optional[random.Random] = None):
+        parts = spec.split(":")
+        self.kind = parts[0]
+        self.params = [float(p) for p in parts[1:]]
+        self.rng = rng or random.Random()
+        if self.kind not in ("recorded", "fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {self.kind}")
+
+    def sample_ms(self, recorded_ms: Optional[int]) -> float:
+        if self.kind == "recorded":
+            scale = self.params[0] if self.params else 1.0
+            return (recorded_ms or 0) * scale
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(self.params[0], self.params[1])
+        if self.kind == "normal":
+            return max(0.0, self.rng.gauss(self.params[0], self.params[1]))
+        return self.rng.lognormvariate(math.log(self.params[0]), self.params[1])
+
+
+def create_replay_app(
+    cassette_paths: List[Path],
+    latency: str = "recorded",
+    error_rate: float = 0.0,
+    error_status: int = 503,
+    seed: Optional[int] = None
+):
+    """Build an ASGI app that serves recorded exchanges"""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    rng = random.Random(seed)
+    latency_model = LatencyModel(latency, rng)
+    exchanges = load_cassettes(cassette_paths)
+    # Round-robin through repeated recordings of the same exchange
+    cursors: Dict[ExchangeKey, int] = {}
+
+    app = FastAPI(title="Environment Replay Server")
+
+    @app.get("/__replay__/stats")
+    async def replay_stats():
+        return {"exchanges": len(exchanges), "latency": latency, "error_rate": error_rate}
+
+    @app.api_route("/{env_name}/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    async def replay(env_name: str, path: str, request: Request):
+        base = (env_name, request.method, f"/{path}")
+        key = base + (request.headers.get("x-test-plan"),)
+        records = exchanges.get(key) or exchanges.get(base + (None,))
+        if not records:
+            return JSONResponse({"error": "No recorded exchange", "key": list(base)}, status_code=404)
+
+        index = cursors.get(key, 0)
+        cursors[key] = index + 1
+        record = records[index % len(records)]
+
+        await asyncio.sleep(latency_model.sample_ms(record.get("ms")) / 1000)
+
+        if error_rate and rng.random() < error_rate:
+            return JSONResponse({"error": "Injected replay error"}, status_code=error_status)
+        return JSONResponse(record.get("body"), status_code=record["status"])
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded environment exchanges")
+    parser.add_argument("--cassette", action="append", required=True, help="Cassette file (repeatable)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="recorded", help="Latency distribution spec")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=None, help="Seed for repeatable latency and errors")
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_replay_app(
+        [Path(p) for p in args.cassette],
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Retention for stored test results.
+
+A background task periodically asks the result index which finished runs
+exceed the configured limits (runs per user, runs in total, age) and deletes
+them, or moves them into a compressed bundle under ``data/archive`` first.
+Each pass handles at most ``batch_size`` runs, oldest first, so one pass
+never stalls on a large backlog.
+"""
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from app.core.job_queue import PlanQueue
+from app.core.storage import JSONStorageService
+from app.services.run_registry import TestRunRegistry
+
+
+class RetentionWorker:
+    """Enforces retention limits on stored runs"""
+
+    def __init__(
+        self,
+        storage: JSONStorageService,
+        registry: Optional[TestRunRegistry] = None,
+        interval_seconds: float = 3600,
+        max_per_user: int = 0,
+        max_total: int = 0,
+        max_age_days: int = 0,
+        archive: bool = False,
+        batch_size: int = 500,
+        queue: Optional[PlanQueue] = None
+    ):
+        self.storage = storage
+        self.queue = queue
+        self.registry = registry
+        self.interval_seconds = interval_seconds
+        self.max_per_user = max_per_user
+        self.max_total = max_total
+        self.max_age_days = max_age_days
+        self.archive = archive
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Apply the limits once; returns what was removed and why"""
+        started_before = None
+        if self.max_age_days:
+            started_before = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+        candidates = await asyncio.to_thread(
+            self.storage.index.retention_candidates,
+            self.max_per_user,
+            self.max_total,
+            started_before,
+            self.batch_size
+        )
+        # The index can lag a run that has just been restarted, and workers in
+        # other processes may still be writing to a queued one
+        queued = set(await asyncio.to_thread(self.queue.runs)) if self.queue is not None else set()
+        candidates = {
+            test_id: reason for test_id, reason in candidates.items()
+            if test_id not in queued and not (self.registry is not None and self.registry.is_active(test_id))
+        }
+
+        test_ids = list(candidates)
+        bundle = None
+        if self.archive:
+            bundle = await self.storage.archive_test_results(test_ids)
+        else:
+            await self.storage.delete_test_results(test_ids)
+        if self.registry is not None:
+            for test_id in test_ids:
+                self.registry.forget(test_id)
+
+        return {
+            "removed": len(test_ids),
+            "reasons": dict(Counter(candidates.values())),
+            "archive": str(bundle) if bundle else None
+        }
+
+    async def _loop(self):
+        while True:
+            try:
+                stats = await self.run_once()
+                if stats["removed"]:
+                    print(f"Retention removed {stats['removed']} test results: {stats['reasons']}")
+            except Exception as e:
+                print(f"Error applying retention: {e}")
+            await asyncio.sleep(self.interval_seconds)
@@ -0,0 +1,141 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+
+class RunSubscription:
+    """A viewer's queue of pending progress events for one run.
+
+    Events carry a coalescing key (one per plan, one for the run), and a newer
+    event replaces a pending one with the same key. A slow consumer therefore
+    holds at most one event per plan, no matter how far behind it is. If even
+    that bound is exceeded, the queue is dropped and the consumer is told to
+    resync from a fresh snapshot.
+    """
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.pending: "OrderedDict[Tuple[str, ...], Dict[str, Any]]" = OrderedDict()
+        self.needs_resync = False
+        self._wake = asyncio.Event()
+
+    def push(self, key: Tuple[str, ...], event: Dict[str, Any]):
+        if key in self.pending:
+            self.pending[key] = event
+        elif len(self.pending) >= self.max_pending:
+            self.pending.clear()
+            self.needs_resync = True
+        else:
+            self.pending[key] = event
+        self._wake.set()
+
+    async def next_events(self, timeout: float) -> List[Dict[str, Any]]:
+        """Wait for pending events; returns an empty list on timeout"""
+        if not self.pending and not self.needs_resync:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._wake.clear()
+        events = list(self.pending.values())
+        self.pending.clear()
+        return events
+
+
+class TestRunRegistry:
+    """Application-lifetime registry of test runs.
+
+    Active runs are kept in a plain dict so status lookups are O(1) and never
+    touch disk. When a run finishes it moves into a bounded history of recent
+    runs; only runs that have aged out of that history are read from storage.
+    """
+
+    def __init__(self, history_size: int = 100):
+        self.history_size = history_size
+        self.active: Dict[str, Dict[str, Any]] = {}
+        self.finished: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.subscribers: Dict[str, Set[RunSubscription]] = {}
+
+    def register(self, test_id: str, progress: Dict[str, Any]):
+        """Track a newly started run"""
+        self.active[test_id] = progress
+
+    def get(self, test_id: str) -> Optional[Dict[str, Any]]:
+        """Get the live progress for a run, or None if it is not held in memory"""
+        progress = self.active.get(test_id)
+        if progress is not None:
+            return progress
+
+        progress = self.finished.get(test_id)
+        if progress is not None:
+            self.finished.move_to_end(test_id)
+        return progress
+
+    def is_active(self, test_id: str) -> bool:
+        return test_id in self.active
+
+    def finish(self, test_id: str):
+        """Move a run from the active set into the bounded history"""
+        progress = self.active.pop(test_id, None)
+        if progress is None:
+            return
+
+        self.finished[test_id] = progress
+        self.finished.move_to_end(test_id)
+        while len(self.finished) > self.history_size:
+            self.finished.popitem(last=False)
+
+    def subscribe(self, test_id: str, max_pending: int) -> RunSubscription:
+        subscription = RunSubscription(max_pending)
+        self.subscribers.setdefault(test_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, test_id: str, subscription: RunSubscription):
+        subscriptions = self.subscribers.get(test_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscribers[test_id]
+
+    def publish(self, test_id: str, event: Dict[str, Any]):
+        """Push a delta event to every viewer of a run"""
+        subscriptions = self.subscribers.get(test_id)
+        if not subscriptions:
+            return
+
+        plan_key = event.get("plan")
+        key = ("plan", plan_key) if plan_key else ("run",)
+        for subscription in subscriptions:
+            subscription.push(key, event)
+
+    def snapshot(self, test_id: str) -> Optional[Dict[str, Any]]:
+        """Compact view of a run without recorded API calls"""
+        progress = self.get(test_id)
+        if progress is None:
+            return None
+        return compact_status(progress)
+
+    def forget(self, test_id: str):
+        """Drop a run from memory entirely"""
+        self.active.pop(test_id, None)
+        self.finished.pop(test_id, None)
+
+
+def compact_status(progress: Dict[str, Any]) -> Dict[str, Any]:
+    """Status payload with per-plan progress only"""
+    return {
+        "type": "snapshot",
+        "test_id": progress.get("test_id"),
+        "status": progress.get("status"),
+        "progress": progress.get("progress", 0),
+        "current_step": progress.get("current_step"),
+        "plans": {
+            plan_key: {
+                "status": plan.get("status"),
+                "progress": plan.get("progress", 0),
+                "current_step": plan.get("current_step"),
+                "error": plan.get("error")
+            }
+            for plan_key, plan in progress.get("plans", {}).items()
+        }
+    }
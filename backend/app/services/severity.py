@@ -0,0 +1,258 @@
+"""Severity rules for response differences.
+
+Rules live in ``data/configs/severity_rules.json``:
+
+    {
+      "default": "info",
+      "rules": [
+        {"severity": "critical", "fields": ["policy_id"], "contains": ["premium"]},
+        {"severity": "warning", "paths": ["/policy/*/start_date"], "regex": ["_date$"]}
+      ],
+      "products": {
+        "travel": {"rules": [{"severity": "info", "fields": ["status"]}]}
+      }
+    }
+
+``fields`` match a field name exactly, ``contains`` match part of it and
+``regex`` are searched in it, all case-insensitively. ``paths`` are globs over
+the JSON pointer path, where ``*`` matches one segment and ``**`` any number;
+array indices are matched as ``*``. When several severities match, the highest
+wins. ``products`` overrides are keyed by plan key, ``category:product``,
+product or category; the most specific override with a matching rule decides
+before the global rules are consulted.
+
+Each rule set compiles its exact names into one dictionary and its patterns
+into at most one field regex and one path regex per severity, so a field is
+classified with a handful of lookups whatever the rule count. Results are
+cached per plan and array-normalized path.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+from app.core import codecs
+from app.core.config import settings
+
+SEVERITIES = ("critical", "warning", "info")
+
+# Rules used when no severity_rules.json has been configured yet
+DEFAULT_RULES = {
+    "default": "info",
+    "rules": [
+        {
+            "severity": "critical",
+            "contains": [
+                "policy_id", "status", "premium", "coverage_amount",
+                "coverage_sum_insured", "deductible", "policy_number"
+            ]
+        },
+        {
+            "severity": "warning",
+            "contains": [
+                "applicant_name", "start_date", "end_date", "payment_status",
+                "payment_amount", "issue_date", "insured_name"
+            ]
+        }
+    ]
+}
+
+ARRAY_INDEX = re.compile(r"/\d+(?=/|$)")
+
+# Cached classifications before the cache is cleared
+MAX_CACHED_PATHS = 100000
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translate a JSON pointer glob into a regex body"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts)
+
+
+class RuleSet:
+    """Rules of one scope: exact names in one dict, patterns in one field and one path regex per severity"""
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        field_parts: Dict[str, List[str]] = {severity: [] for severity in SEVERITIES}
+        path_parts: Dict[str, List[str]] = {severity: [] for severity in SEVERITIES}
+        # Lower-cased exact field name -> highest severity naming it
+        self.exact: Dict[str, str] = {}
+
+        for rule in rules:
+            severity = rule.get("severity")
+            if severity not in SEVERITIES:
+                raise ValueError(f"Unknown severity {severity!r} in rule {rule}")
+            for field in rule.get("fields", []):
+                current = self.exact.get(field.lower())
+                if current is None or SEVERITIES.index(severity) < SEVERITIES.index(current):
+                    self.exact[field.lower()] = severity
+            field_parts[severity].extend(re.escape(c) for c in rule.get("contains", []))
+            for pattern in rule.get("regex", []):
+                re.compile(pattern)  # Report the offending pattern on its own
+                field_parts[severity].append(f"(?:{pattern})")
+            path_parts[severity].extend(glob_to_regex(p) for p in rule.get("paths", []))
+
+        # Every severity, highest first, including those with exact names only
+        self.matchers: List[Tuple[str, Optional[Pattern], Optional[Pattern]]] = []
+        for severity in SEVERITIES:
+            field_re = re.compile("|".join(field_parts[severity]), re.IGNORECASE) if field_parts[severity] else None
+            path_re = re.compile("^(?:" + "|".join(path_parts[severity]) + ")$") if path_parts[severity] else None
+            self.matchers.append((severity, field_re, path_re))
+
+    def classify(self, field: str, path: str) -> Optional[str]:
+        """Highest matching severity, or None when no rule matches"""
+        exact = self.exact.get(field.lower())
+        for severity, field_re, path_re in self.matchers:
+            if severity == exact:
+                return severity
+            if (field_re and field_re.search(field)) or (path_re and path_re.match(path)):
+                return severity
+        return None
+
+
+class SeverityRules:
+    """Compiled snapshot of severity_rules.json"""
+
+    def __init__(self, config: Dict[str, Any], mtime: Optional[float] = None):
+        self.mtime = mtime
+        self.default = config.get("default", "info")
+        if self.default not in SEVERITIES:
+            raise ValueError(f"Unknown default severity {self.default!r}")
+        self.rules = RuleSet(config.get("rules", []))
+        self.overrides = {
+            scope: RuleSet(override.get("rules", []))
+            for scope, override in config.get("products", {}).items()
+        }
+        # Identifies this rule set in analysis cache keys
+        self.version = hashlib.sha256(codecs.canonical_json(config)).hexdigest()[:16]
+        self._cache: Dict[Tuple[str, str], str] = {}
+        self._chains: Dict[str, List[RuleSet]] = {}
+
+    def classify(self, field: str, path: str, plan_key: str = "") -> str:
+        shape = ARRAY_INDEX.sub("/*", path)
+        cache_key = (plan_key, shape)
+        severity = self._cache.get(cache_key)
+        if severity is None:
+            severity = self.default
+            for rule_set in self._chain(plan_key):
+                matched = rule_set.classify(field, shape)
+                if matched is not None:
+                    severity = matched
+                    break
+            if len(self._cache) >= MAX_CACHED_PATHS:
+                self._cache.clear()
+            self._cache[cache_key] = severity
+        return severity
+
+    def _chain(self, plan_key: str) -> List[RuleSet]:
+        """Rule sets to consult for a plan, most specific first"""
+        chain = self._chains.get(plan_key)
+        if chain is None:
+            parts = plan_key.split(":") if plan_key else []
+            scopes = [plan_key, ":".join(parts[:2])] + parts[1:2] + parts[:1] if parts else []
+            chain = []
+            for scope in scopes:
+                rule_set = self.overrides.get(scope)
+                if rule_set is not None and rule_set not in chain:
+                    chain.append(rule_set)
+            chain.append(self.rules)
+            self._chains[plan_key] = chain
+        return chain
+
+
+class SeverityRuleBook:
+    """Holds the compiled severity rules and swaps them when the file changes.
+
+    Like the product catalog, the file's mtime is checked at most once per
+    ``check_interval`` seconds, and a broken file keeps the previous rules.
+    """
+
+    def __init__(self, path: Path, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._failed_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+        try:
+            self._current = self._compile()
+        except Exception as e:
+            print(f"Error loading severity rules {self.path}: {e}")
+            self._current = SeverityRules(DEFAULT_RULES)
+        self._checked_at = time.monotonic()
+
+    def get(self) -> SeverityRules:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                self._checked_at = now
+                mtime = self._file_mtime()
+                if mtime != self._current.mtime and mtime != self._failed_mtime:
+                    try:
+                        self._current = self._compile()
+                    except Exception as e:
+                        self._failed_mtime = mtime
+                        print(f"Keeping previous severity rules, failed to load {self.path}: {e}")
+        return self._current
+
+    def reload(self) -> SeverityRules:
+        """Recompile the rules from disk; raises and keeps the old ones on failure"""
+        with self._lock:
+            self._current = self._compile()
+            self._checked_at = time.monotonic()
+        return self._current
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _compile(self) -> SeverityRules:
+        mtime = self._file_mtime()
+        if mtime is None:
+            return SeverityRules(DEFAULT_RULES)
+        with open(self.path, "rb") as f:
+            return SeverityRules(codecs.decode(f.read()), mtime)
+
+
+_rule_book: Optional[SeverityRuleBook] = None
+
+
+def get_rule_book() -> SeverityRuleBook:
+    """The process's rule book; worker processes build their own on first use"""
+    global _rule_book
+    if _rule_book is None:
+        _rule_book = SeverityRuleBook(
+            Path(settings.data_dir) / "configs" / "severity_rules.json",
+            settings.catalog_check_interval_seconds
+        )
+    return _rule_book
+
+
+def severity_function(plan_key: str = "") -> Callable[[str, str, str], str]:
+    """Severity callback for StructuralDiffer, bound to one rules snapshot"""
+    rules = get_rule_book().get()
+
+    def severity(path: str, field: str, diff_type: str) -> str:
+        if diff_type in ("missing_field", "missing_item"):
+            return "critical"
+        if diff_type in ("extra_field", "extra_item"):
+            return "warning"
+        return rules.classify(field, path, plan_key)
+
+    return severity
@@ -1,56 +1,75 @@
 import asyncio
-import random
-from typing import Dict, Any, List
+import itertools
+import time
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
+from app.core import ids, metrics
+from app.core.job_queue import PlanQueue
 from app.core.storage import JSONStorageService
 from app.core.config import settings
+from app.services.run_registry import TestRunRegistry
+from app.services.http_engine import HTTPExecutionEngine, DEFAULT_TEST_SEQUENCE
+from app.services.replay import CassetteRecorder
+from app.services.catalog import ProductCatalog
+from app.services.latency import LatencyProfile, LatencyThresholds, latency_report
+
+def new_plan_progress() -> Dict[str, Any]:
+    return {
+        "status": "pending",
+        "progress": 0,
+        "current_step": None,
+        "api_calls": [],
+        "error": None
+    }
 
 class TestExecutorService:
-    def __init__(self, storage_service: JSONStorageService):
+    """Starts runs by queueing their plans, and runs plans claimed by a worker.
+    
+    Plans execute wherever a PlanWorker claims them: in the API process or in
+    separate worker processes. Runs registered in this process get live
+    progress from the workers here and from the RunMonitor for the rest.
+    """
+    
+    def __init__(
+        self,
+        storage_service: JSONStorageService,
+        registry: TestRunRegistry,
+        http_engine: HTTPExecutionEngine,
+        catalog: ProductCatalog,
+        queue: PlanQueue
+    ):
         self.storage = storage_service
-        self.running_tests = {}
+        self.registry = registry
+        self.http_engine = http_engine
+        self.catalog = catalog
+        self.queue = queue
+        # Live progress of in-flight runs, shared with the registry
+        self.running_tests = registry.active
     
     async def start_test(self, test_config: Dict[str, Any]) -> str:
-        """Start a new test execution"""
-        test_id = f"test_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        
-        # Initialize test progress
+        """Save a new test run and queue its plans for the workers"""
+        test_id = ids.new_test_id()
         plans_to_test = self._get_plans_to_test(test_config['scope'])
+        started_at = datetime.now().isoformat()
         
-        test_progress = {
-            "test_id": test_id,
-            "status": "running",
-            "progress": 0,
-            "current_step": "initializing",
-            "started_at": datetime.now().isoformat(),
-            "plans": {}
-        }
-        
-        # Initialize plan progress
-        for plan_key in plans_to_test:
-            test_progress["plans"][plan_key] = {
-                "status": "pending",
-                "progress": 0,
-                "current_step": None,
-                "api_calls": [],
-                "error": None
-            }
-        
-        self.running_tests[test_id] = test_progress
+        self.registry.register(test_id, self.new_run_progress(
+            test_id, started_at, test_config["target_env"], test_config["baseline_env"], plans_to_test
+        ))
         
         # Save initial test data
         test_data = {
             "test_metadata": {
                 "test_id": test_id,
                 "user_id": test_config["user_id"],
-                "started_at": datetime.now().isoformat(),
+                "started_at": started_at,
                 "status": "running",
                 "scope": test_config["scope"],
                 "environments": {
                     "target": test_config["target_env"],
                     "baseline": test_config["baseline_env"]
                 },
-                "ai_prompt": test_config.get("ai_prompt", "")
+                "ai_prompt": test_config.get("ai_prompt", ""),
+                "cassette": self.storage.cassette_name(test_id) if test_config.get("record") else None
             },
             "execution_summary": {
                 "total_plans": len(plans_to_test),
@@ -63,165 +82,430 @@ class TestExecutorService:
         }
         
         await self.storage.save_test_result(test_id, test_data)
-        
-        # Start async execution
-        asyncio.create_task(self._execute_test(test_id, test_config))
+        await asyncio.to_thread(
+            self.queue.enqueue_run, test_id, test_config, plans_to_test, self._run_concurrency(test_config)
+        )
         
         return test_id
     
+    async def resume_test(
+        self,
+        test_id: str,
+        test_data: Dict[str, Any],
+        credentials: Dict[str, Any]
+    ) -> List[str]:
+        """Queue again every plan of a stopped run that has not completed.
+        
+        Completed plans keep their journaled results and are never rerun.
+        Returns the queued plans; an empty list means there was nothing to do.
+        """
+        metadata = test_data["test_metadata"]
+        environments = metadata.get("environments", {})
+        checkpoints = await self.storage.plan_checkpoints(test_id, test_data)
+        try:
+            planned = self._get_plans_to_test(metadata.get("scope", {}))
+        except Exception:
+            # The scope no longer resolves; retry the plans that ran before
+            planned = []
+        plan_keys = list(dict.fromkeys(planned + list(checkpoints)))
+        remaining = [
+            plan_key for plan_key in plan_keys
+            if checkpoints.get(plan_key, {}).get("status") != "completed"
+        ]
+        if not remaining:
+            return []
+        
+        config = {
+            "user_id": metadata.get("user_id"),
+            "target_env": environments.get("target"),
+            "baseline_env": environments.get("baseline"),
+            "scope": metadata.get("scope", {}),
+            "ai_prompt": metadata.get("ai_prompt", ""),
+            "record": bool(metadata.get("cassette")),
+            "admin_token": credentials["admin_token"],
+            "customer_token": credentials["customer_token"],
+            "max_concurrency": credentials.get("max_concurrency")
+        }
+        await self.storage.reopen_plan_journal(test_id)
+        metadata.update({
+            "status": "running",
+            "completed_at": None,
+            "current_step": f"Resuming {len(remaining)} plans",
+            "resumed_at": datetime.now().isoformat(),
+            "resume_count": metadata.get("resume_count", 0) + 1
+        })
+        await self.storage.save_test_result(test_id, test_data)
+        
+        self.registry.forget(test_id)
+        self.registry.register(test_id, self.new_run_progress(
+            test_id, metadata["started_at"], config["target_env"], config["baseline_env"], remaining
+        ))
+        await asyncio.to_thread(
+            self.queue.enqueue_run, test_id, config, remaining, self._run_concurrency(config)
+        )
+        return remaining
+    
+    async def recover_interrupted_runs(self, started_before: str) -> Dict[str, int]:
+        """Settle runs a crash left running that no worker can continue.
+        
+        Runs in the queue pick up where they stopped on their own, unless
+        their credentials went with the process that held them. The rest
+        were started before the queue existed or lost their queue entry, and
+        their credentials with it: runs whose plans have all finished are
+        completed, the others are marked interrupted for POST /tests/{id}/resume.
+        """
+        stats = await self.interrupt_stranded_runs()
+        queued = set(await asyncio.to_thread(self.queue.runs))
+        runs, _ = await self.storage.list_tests({"status": "running"}, limit=100000)
+        for run in runs:
+            test_id = run["test_id"]
+            # Runs started just now may not be queued yet
+            if test_id in queued or (run["test_metadata"]["started_at"] or "") >= started_before:
+                continue
+            outcome = await self._settle_stopped_run(test_id)
+            if outcome:
+                stats[outcome] += 1
+        return stats
+    
+    async def interrupt_stranded_runs(self) -> Dict[str, int]:
+        """Settle queued runs whose credentials no live process holds any more"""
+        stats = {"completed": 0, "interrupted": 0}
+        for test_id in await asyncio.to_thread(self.queue.stranded_runs):
+            # Also drops the credentials, and keeps other API processes away
+            if not await asyncio.to_thread(self.queue.claim_finalization, test_id):
+                continue
+            try:
+                outcome = await self._settle_stopped_run(test_id)
+            finally:
+                await asyncio.to_thread(self.queue.remove_run, test_id)
+            if outcome:
+                stats[outcome] += 1
+                self.mark_finished(test_id, outcome)
+        return stats
+    
+    async def _settle_stopped_run(self, test_id: str) -> Optional[str]:
+        """Complete a run nobody is executing, or mark it interrupted; returns the new status"""
+        test_data = await self.storage.get_test_document(test_id)
+        if test_data is None:
+            return None
+        checkpoints = await self.storage.plan_checkpoints(test_id, test_data)
+        try:
+            planned = self._get_plans_to_test(test_data["test_metadata"].get("scope", {}))
+        except Exception:
+            planned = []
+        unfinished = [plan_key for plan_key in planned if plan_key not in checkpoints]
+        if not unfinished:
+            await self.finish_run(test_id)
+            return "completed"
+        
+        test_data["test_metadata"].update({
+            "status": "interrupted",
+            "current_step": f"Interrupted with {len(unfinished)} of {len(planned)} plans unfinished"
+        })
+        await self.storage.save_test_result(test_id, test_data)
+        return "interrupted"
+    
+    def new_run_progress(
+        self,
+        test_id: str,
+        started_at: str,
+        target_env: str,
+        baseline_env: str,
+        plan_keys: List[str]
+    ) -> Dict[str, Any]:
+        """Live status of a run whose plans have not started yet"""
+        return {
+            "test_id": test_id,
+            "status": "running",
+            "progress": 0,
+            "current_step": "initializing",
+            "started_at": started_at,
+            "target_env": target_env,
+            "baseline_env": baseline_env,
+            "plans": {plan_key: new_plan_progress() for plan_key in plan_keys}
+        }
+    
     async def get_test_status(self, test_id: str) -> Dict[str, Any]:
         """Get current test status"""
-        if test_id in self.running_tests:
-            return self.running_tests[test_id]
+        progress = self.registry.get(test_id)
+        if progress is not None and progress["status"] == "running":
+            # Limits of the environments as this process's plan worker sees them
+            limits = self.http_engine.limiters.snapshot([progress["target_env"], progress["baseline_env"]])
+            return dict(progress, environment_limits=limits)
+        if progress is not None:
+            return progress
         
-        # If not in memory, load from storage
+        # Only runs that have aged out of the registry are loaded from storage
         test_data = await self.storage.get_test_result(test_id)
         if test_data:
+            environments = test_data["test_metadata"].get("environments", {})
             return {
                 "test_id": test_id,
                 "status": test_data["test_metadata"]["status"],
                 "progress": self._calculate_progress(test_data),
                 "current_step": test_data["test_metadata"].get("current_step"),
                 "started_at": test_data["test_metadata"]["started_at"],
+                "target_env": environments.get("target", ""),
+                "baseline_env": environments.get("baseline", ""),
                 "plans": test_data.get("plan_results", {})
             }
         
         return {"error": "Test not found"}
     
-    async def _execute_test(self, test_id: str, config: Dict[str, Any]):
-        """Execute test across all plans"""
-        plans_to_test = self._get_plans_to_test(config['scope'])
-        total_plans = len(plans_to_test)
+    async def execute_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one queued plan and journal its result.
         
-        for i, plan_key in enumerate(plans_to_test):
-            try:
-                # Update current step
-                self.running_tests[test_id]["current_step"] = f"Testing {plan_key}"
-                self.running_tests[test_id]["progress"] = int((i / total_plans) * 100)
-                
-                # Execute plan
-                await self._test_plan(test_id, plan_key, config)
-                
-                # Update progress
-                self.running_tests[test_id]["plans"][plan_key]["status"] = "completed"
-                self.running_tests[test_id]["plans"][plan_key]["progress"] = 100
-                
-            except Exception as e:
-                self.running_tests[test_id]["plans"][plan_key]["status"] = "failed"
-                self.running_tests[test_id]["plans"][plan_key]["error"] = str(e)
-        
-        # Finalize test
-        self.running_tests[test_id]["status"] = "completed"
-        self.running_tests[test_id]["progress"] = 100
-        self.running_tests[test_id]["current_step"] = "Test completed"
-        
-        # Save final results
-        await self._save_final_results(test_id, config)
-    
-    async def _test_plan(self, test_id: str, plan_key: str, config: Dict[str, Any]):
-        """Test a single plan"""
-        # Simulate API calls for demonstration
-        # In real implementation, this would make actual API calls
-        
-        self.running_tests[test_id]["plans"][plan_key]["status"] = "running"
-        self.running_tests[test_id]["plans"][plan_key]["progress"] = 0
-        
-        # Simulate test sequence
-        test_sequence = ["application", "payment", "policy", "verification"]
-        
-        for i, step in enumerate(test_sequence):
-            # Update step progress
-            step_progress = int((i + 1) / len(test_sequence) * 100)
-            self.running_tests[test_id]["plans"][plan_key]["progress"] = step_progress
-            self.running_tests[test_id]["plans"][plan_key]["current_step"] = f"Processing {step}"
-            
-            # Simulate API call with random response time
-            await asyncio.sleep(random.uniform(0.5, 2.0))
-            
-            # Generate mock API call result
-            api_call = {
-                "endpoint": f"/{step}",
-                "method": "POST" if step in ["application", "payment"] else "GET",
-                "status_code": 200,
-                "response_time_ms": int(random.uniform(100, 500)),
-                "response": {
-                    "status": "success",
-                    "data": f"Mock {step} response for {plan_key}",
-                    "timestamp": datetime.now().isoformat()
-                }
-            }
-            
-            self.running_tests[test_id]["plans"][plan_key]["api_calls"].append(api_call)
+        Returns the summary the worker reports to the queue. When the run is
+        registered in this process, progress goes straight into its live
+        status, so viewers see step events as they happen.
+        """
+        test_id, plan_key, config = job["test_id"], job["plan_key"], job["config"]
+        plan_progress = new_plan_progress()
+        run = self.running_tests.get(test_id)
+        
+        if job["attempt"] > 1:
+            # An earlier worker may have journaled the plan before it was lost
+            checkpoint = (await self.storage.plan_checkpoints(test_id)).get(plan_key)
+            if checkpoint and checkpoint["status"] == "completed":
+                if run is not None:
+                    run["plans"][plan_key] = dict(plan_progress, **checkpoint, progress=100)
+                return checkpoint
+        
+        if run is not None:
+            # A plan handed over from a lost worker starts from scratch
+            run["plans"][plan_key] = plan_progress
+            run["current_step"] = f"Testing {plan_key}"
+        
+        run_context = {
+            "catalog": self.catalog.get(),
+            "environments": (await self.storage.load_config("environments")).get("environments", {}),
+            "recorder": None
+        }
+        if config.get("record"):
+            run_context["recorder"] = CassetteRecorder(
+                self.storage.data_dir / "cassettes" / self.storage.cassette_name(test_id)
+            )
+        
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                self._test_plan(test_id, plan_key, plan_progress, config, run_context),
+                timeout=settings.plan_timeout_seconds
+            )
+            plan_progress["status"] = "completed"
+            plan_progress["progress"] = 100
+        except asyncio.TimeoutError:
+            plan_progress["status"] = "failed"
+            plan_progress["error"] = f"Plan timed out after {settings.plan_timeout_seconds}s"
+        except Exception as e:
+            plan_progress["status"] = "failed"
+            plan_progress["error"] = str(e)
+        finally:
+            if run_context["recorder"]:
+                run_context["recorder"].close()
+        metrics.PLAN_SECONDS.labels(plan_progress["status"]).observe(time.perf_counter() - started)
+        metrics.PLANS_FINISHED.labels(plan_progress["status"]).inc()
+        
+        return await self._journal_plan(test_id, plan_key, plan_progress)
+    
+    async def finish_run(self, test_id: str):
+        """Analyze and compact a run whose plans have all finished, and mark it completed"""
+        test_data = await self.storage.get_test_document(test_id) or {}
+        metadata = test_data.get("test_metadata", {})
+        try:
+            latency = await self._analyze_latency(test_id, test_data)
+        except Exception as e:
+            # The run still completes, only without its latency verdict
+            print(f"Error analyzing latency of test {test_id}: {e}")
+            latency = None
+        await self._save_final_results(test_id, metadata.get("started_at"), latency)
+        self.mark_finished(test_id)
     
-    async def _save_final_results(self, test_id: str, config: Dict[str, Any]):
-        """Save final test results to storage"""
-        current_data = await self.storage.get_test_result(test_id)
-        if not current_data:
+    def mark_finished(self, test_id: str, status: str = "completed"):
+        """Move a completed or interrupted run into the registry history and tell its viewers"""
+        progress = self.running_tests.get(test_id)
+        if progress is None:
             return
+        progress["status"] = status
+        if status == "completed":
+            progress["progress"] = 100
+            progress["current_step"] = "Test completed"
+        else:
+            progress["current_step"] = "Test interrupted"
         
-        # Update with running test data
-        current_data["test_metadata"]["status"] = "completed"
-        current_data["test_metadata"]["completed_at"] = datetime.now().isoformat()
-        current_data["test_metadata"]["current_step"] = "Test completed"
-        
-        # Convert running test data to plan results
-        running_test = self.running_tests.get(test_id, {})
-        for plan_key, plan_data in running_test.get("plans", {}).items():
-            current_data["plan_results"][plan_key] = {
-                "status": plan_data["status"],
-                "api_calls": plan_data.get("api_calls", []),
-                "error": plan_data.get("error"),
-                "environment_comparison": self._mock_environment_comparison(plan_key)
-            }
+        # Keep the finished run in the bounded history for status polling
+        self.registry.finish(test_id)
+        self.registry.publish(test_id, {"type": "run_finished", "status": status, "progress": progress["progress"]})
+    
+    async def _test_plan(
+        self,
+        test_id: str,
+        plan_key: str,
+        plan_progress: Dict[str, Any],
+        config: Dict[str, Any],
+        run_context: Dict[str, Any]
+    ):
+        """Test a single plan by sending each step to target and baseline"""
+        plan_progress["status"] = "running"
+        plan_progress["progress"] = 0
+        self.registry.publish(test_id, {"type": "plan_started", "plan": plan_key})
         
-        # Update execution summary
-        total_plans = len(current_data["plan_results"])
-        completed_plans = sum(1 for p in current_data["plan_results"].values() if p["status"] == "completed")
-        failed_plans = sum(1 for p in current_data["plan_results"].values() if p["status"] == "failed")
-        total_api_calls = sum(len(p["api_calls"]) for p in current_data["plan_results"].values())
-        
-        current_data["execution_summary"] = {
-            "total_plans": total_plans,
-            "completed_plans": completed_plans,
-            "failed_plans": failed_plans,
-            "total_api_calls": total_api_calls,
-            "execution_time_minutes": 5  # Mock value
+        plan_config = run_context["catalog"].plan_config(plan_key)
+        test_sequence = plan_config.get("test_sequence") or DEFAULT_TEST_SEQUENCE
+        target = self._resolve_environment(run_context["environments"], config["target_env"])
+        baseline = self._resolve_environment(run_context["environments"], config["baseline_env"])
+        
+        try:
+            for i, step in enumerate(test_sequence):
+                request = self.http_engine.build_step_request(step, plan_key, plan_config)
+                plan_progress["current_step"] = f"Processing {request['step']}"
+                
+                # Target and baseline receive the same step concurrently
+                target_call, baseline_call = await self.http_engine.send_pair(
+                    target, baseline, request, config
+                )
+                plan_progress["api_calls"].extend([target_call, baseline_call])
+                if run_context["recorder"]:
+                    run_context["recorder"].record(target[0], plan_key, target_call)
+                    run_context["recorder"].record(baseline[0], plan_key, baseline_call)
+                plan_progress["progress"] = int((i + 1) / len(test_sequence) * 100)
+                self.registry.publish(test_id, {
+                    "type": "step_progress",
+                    "plan": plan_key,
+                    "step": request["step"],
+                    "progress": plan_progress["progress"]
+                })
+                
+                # Later steps depend on earlier ones, so stop at the first transport failure
+                failed = [c for c in (target_call, baseline_call) if c["error"]]
+                if failed:
+                    raise Exception(f"{request['step']} failed on {failed[0]['environment']}: {failed[0]['error']}")
+        finally:
+            # The structural diff is CPU-bound; keep the event loop free for other plans and viewers
+            plan_progress["environment_comparison"] = await asyncio.to_thread(
+                self.http_engine.compare_calls, plan_progress["api_calls"], plan_key
+            )
+    
+    def _resolve_environment(self, environments: Dict[str, Any], env_name: str) -> Tuple[str, Dict[str, Any]]:
+        """Get the (name, config) pair for an environment from environments.json"""
+        env_config = environments.get(env_name)
+        if not env_config or not env_config.get("base_url"):
+            raise Exception(f"Environment '{env_name}' is not configured")
+        return env_name, env_config
+    
+    async def _journal_plan(self, test_id: str, plan_key: str, plan_progress: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist a finished plan right away and release its response bodies"""
+        comparison = plan_progress.pop("environment_comparison", None)
+        await self.storage.append_plan_result(test_id, plan_key, {
+            "status": plan_progress["status"],
+            "api_calls": plan_progress.get("api_calls", []),
+            "error": plan_progress.get("error"),
+            "environment_comparison": comparison
+        })
+        
+        # The journal holds the calls now; keep only what status polling needs
+        plan_progress["api_call_count"] = len(plan_progress.get("api_calls", []))
+        plan_progress["api_calls"] = []
+        plan_progress["comparison_status"] = (comparison or {}).get("status")
+        plan_progress["latency_regression"] = bool((comparison or {}).get("latency", {}).get("regression"))
+        return {
+            "status": plan_progress["status"],
+            "error": plan_progress.get("error"),
+            "api_call_count": plan_progress["api_call_count"],
+            "comparison_status": plan_progress["comparison_status"],
+            "latency_regression": plan_progress["latency_regression"]
         }
+    
+    async def _save_final_results(
+        self,
+        test_id: str,
+        started_at: Optional[str],
+        latency: Optional[Dict[str, Any]] = None
+    ):
+        """Compact the plan journal into the final test document"""
+        completed_at = datetime.now()
+        execution_time = 0
+        if started_at:
+            execution_time = round((completed_at - datetime.fromisoformat(started_at)).total_seconds() / 60, 2)
         
-        await self.storage.save_test_result(test_id, current_data)
+        summary = {"execution_time_minutes": execution_time}
+        if latency is not None:
+            summary["slow_plans"] = latency.pop("slow_plans")
+            summary["latency_regressions"] = len(latency["regressions"])
+        await self.storage.compact_test_result(
+            test_id,
+            {
+                "status": "completed",
+                "completed_at": completed_at.isoformat(),
+                "current_step": "Test completed"
+            },
+            summary,
+            {"latency_analysis": latency} if latency is not None else None
+        )
+    
+    async def _analyze_latency(self, test_id: str, test_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Latency report of a finished run against its baseline and the target's recent runs"""
+        profile, slow_plans = await asyncio.to_thread(self._latency_profile, test_id, test_data)
+        metadata = test_data.get("test_metadata", {})
+        
+        # Earlier completed runs against the same target; their stored sketches merge into one history
+        history: Optional[LatencyProfile] = None
+        history_runs: List[str] = []
+        target_env = metadata.get("environments", {}).get("target")
+        if target_env and settings.latency_history_runs > 0:
+            candidates, _ = await self.storage.list_tests(
+                {"target_env": target_env, "status": "completed"},
+                limit=settings.latency_history_runs + 1
+            )
+            for summary in candidates:
+                past_id = summary["test_id"]
+                if past_id == test_id or summary["test_metadata"]["started_at"] >= metadata.get("started_at", ""):
+                    continue
+                past = await self.storage.get_test_document(past_id)
+                sketches = ((past or {}).get("latency_analysis") or {}).get("sketches")
+                if not sketches:
+                    continue
+                if history is None:
+                    history = LatencyProfile(profile.relative_accuracy)
+                try:
+                    history.merge(LatencyProfile.from_dict(sketches), roles=("target",))
+                except ValueError:
+                    # Measured with a different sketch accuracy
+                    continue
+                history_runs.append(past_id)
+                if len(history_runs) >= settings.latency_history_runs:
+                    break
+        
+        report = latency_report(profile, history, history_runs, LatencyThresholds.from_settings())
+        report["slow_plans"] = slow_plans
+        return report
+    
+    def _latency_profile(self, test_id: str, test_data: Dict[str, Any]) -> Tuple[LatencyProfile, int]:
+        """Sketch the calls of each plan's latest result; runs in a worker thread"""
+        latest: Dict[str, Tuple[List[Dict[str, Any]], bool]] = {}
+        plans = itertools.chain(test_data.get("plan_results", {}).items(), self.storage.iter_plan_results(test_id))
+        for plan_key, plan_result in plans:
+            # Keep only what the sketches need; a retried plan's later record replaces the earlier one
+            calls = [
+                {key: call.get(key) for key in ("environment", "step", "endpoint", "method", "response_time_ms", "error")}
+                for call in plan_result.get("api_calls", [])
+            ]
+            comparison = plan_result.get("environment_comparison") or {}
+            latest[plan_key] = (calls, bool(comparison.get("latency", {}).get("regression")))
         
-        # Clean up from memory
-        if test_id in self.running_tests:
-            del self.running_tests[test_id]
+        profile = LatencyProfile(settings.latency_sketch_accuracy)
+        for calls, _ in latest.values():
+            profile.add_calls(calls)
+        return profile, sum(slow for _, slow in latest.values())
+    
+    def _run_concurrency(self, config: Dict[str, Any]) -> int:
+        """Number of plans a single run may execute at once"""
+        requested = config.get("max_concurrency") or settings.max_concurrent_plans_per_run
+        return max(1, min(requested, settings.max_concurrent_plans_per_run))
     
     def _get_plans_to_test(self, scope: Dict[str, Any]) -> List[str]:
         """Get list of plans to test based on scope"""
-        scope_type = scope.get("type", "all")
-        
-        # Mock data - in real implementation, this would come from config
-        all_plans = [
-            "car:zurich_autocillin_mv4:tlo",
-            "car:zurich_autocillin_mv4:comprehensive",
-            "car:oona_mv4:basic",
-            "car:oona_mv4:premium",
-            "travel:international:single_trip",
-            "travel:international:annual",
-            "health:family:hmo",
-            "health:family:ppo"
-        ]
-        
-        if scope_type == "all":
-            return all_plans
-        elif scope_type == "category":
-            category = scope.get("value", "")
-            return [p for p in all_plans if p.startswith(f"{category}:")]
-        elif scope_type == "product":
-            product = scope.get("value", "")
-            return [p for p in all_plans if f":{product}:" in p]
-        elif scope_type == "plan":
-            return [scope.get("value", "")]
-        
-        return []
+        return self.catalog.get().resolve_scope(scope)
     
     def _calculate_progress(self, test_data: Dict[str, Any]) -> int:
         """Calculate overall test progress"""
@@ -233,18 +517,3 @@ class TestExecutorService:
         completed_plans = sum(1 for p in plan_results.values() if p.get("status") == "completed")
         
         return int((completed_plans / total_plans) * 100) if total_plans > 0 else 0
-    
-    def _mock_environment_comparison(self, plan_key: str) -> Dict[str, Any]:
-        """Generate mock environment comparison"""
-        return {
-            "status": "match" if random.random() > 0.3 else "diff",
-            "differences": [],
-            "target_summary": {
-                "api_calls": random.randint(3, 6),
-                "total_response_time": random.randint(500, 2000)
-            },
-            "baseline_summary": {
-                "api_calls": random.randint(3, 6),
-                "total_response_time": random.randint(500, 2000)
-            }
-        }
\ No newline at end of file
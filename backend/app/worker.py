@@ -0,0 +1,74 @@
+"""Plan worker process.
+
+Usage: python -m app.worker [--concurrency N]
+
+Claims plan jobs from the queue in the configured data directory and runs
+them against the target and baseline environments. Start as many as the
+environments can take, on this box or on others that share the data
+directory. SIGINT or SIGTERM hands unfinished plans back to the queue.
+Workers read run credentials sealed with QUEUE_CREDENTIALS_KEY, so it must
+be set to the same value as in the API.
+"""
+import argparse
+import asyncio
+import signal
+from pathlib import Path
+from app.core.config import settings
+from app.core.job_queue import PlanQueue
+from app.core.storage import JSONStorageService
+from app.services.catalog import ProductCatalog
+from app.services.http_engine import EnvironmentClientPool, HTTPExecutionEngine
+from app.services.plan_worker import PlanWorker
+from app.services.run_registry import TestRunRegistry
+from app.services.test_executor import TestExecutorService
+
+
+async def run(args: argparse.Namespace):
+    storage = JSONStorageService(settings.data_dir)
+    if not settings.queue_credentials_key:
+        raise SystemExit("Set QUEUE_CREDENTIALS_KEY to the API's value; workers need it to read run credentials")
+    queue = PlanQueue(
+        Path(settings.data_dir) / "queue" / "plans.sqlite3",
+        settings.queue_max_attempts,
+        settings.queue_credentials_key,
+        settings.queue_lease_seconds
+    )
+    http_pool = EnvironmentClientPool()
+    catalog = ProductCatalog(
+        Path(settings.data_dir) / "configs" / "products.json",
+        settings.catalog_check_interval_seconds
+    )
+    # Nothing watches runs from a worker process, so its registry stays empty
+    executor = TestExecutorService(storage, TestRunRegistry(0), HTTPExecutionEngine(http_pool), catalog, queue)
+    worker = PlanWorker(
+        queue,
+        executor,
+        args.concurrency,
+        settings.queue_lease_seconds,
+        settings.queue_poll_interval_seconds
+    )
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    worker.start()
+    print(f"Worker {worker.worker_id} running up to {args.concurrency} plans at once")
+    try:
+        await stopping.wait()
+    finally:
+        await worker.stop()
+        await http_pool.close()
+        queue.close()
+        storage.index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued test plans")
+    parser.add_argument("--concurrency", type=int, default=settings.max_concurrent_plans)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
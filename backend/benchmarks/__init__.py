@@ -0,0 +1,6 @@
+"""Load benchmarks for the API.
+
+``python -m benchmarks.run`` starts the API and a replay stand-in for the
+tested environments, then drives request mixes against them and writes the
+results as JSON. ``python -m benchmarks.compare`` compares two result files.
+"""
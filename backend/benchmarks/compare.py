@@ -0,0 +1,88 @@
+"""Compare two benchmark result files.
+
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.1]
+
+Prints the relative change of each tracked metric and exits with status 1
+when any of them got worse by more than the threshold.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+LATENCIES = (("latency_ms", "p50"), ("latency_ms", "p95"), ("latency_ms", "p99"))
+
+# (path within the report, True when higher is better). Status polling is
+# paced at a fixed rate, so only its latency says anything.
+TRACKED: List[Tuple[Tuple[str, ...], bool]] = [
+    (("scenarios", scenario, "throughput_rps"), True)
+    for scenario in ("user_listing", "ai_analyze", "start_tests")
+] + [
+    (("scenarios", scenario) + path, False)
+    for scenario in ("user_listing", "ai_analyze", "start_tests", "status_polling")
+    for path in LATENCIES
+] + [
+    (("scenarios", "run_drain", "plans_per_second"), True),
+    (("server", "peak_rss_mb"), False)
+]
+
+
+def lookup(report: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    value: Any = report
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float) -> Tuple[List[Dict[str, Any]], bool]:
+    """One row per metric present in both reports; the flag is set if any got worse than the threshold"""
+    rows = []
+    for path, higher in TRACKED:
+        before, after = lookup(baseline, path), lookup(candidate, path)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        worse = -change if higher else change
+        rows.append({
+            "metric": ".".join(path[1:] if path[0] == "scenarios" else path),
+            "baseline": before,
+            "candidate": after,
+            "change": round(change, 4),
+            "regression": worse > threshold
+        })
+    return rows, any(row["regression"] for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change that counts as a regression")
+    parser.add_argument("--json", action="store_true", help="Print the comparison as JSON")
+    args = parser.parse_args()
+
+    baseline = json.loads(Path(args.baseline).read_text())
+    candidate = json.loads(Path(args.candidate).read_text())
+    rows, regressed = compare(baseline, candidate, args.threshold)
+
+    if args.json:
+        print(json.dumps({
+            "baseline_commit": baseline.get("git_commit"),
+            "candidate_commit": candidate.get("git_commit"),
+            "threshold": args.threshold,
+            "metrics": rows,
+            "regressed": regressed
+        }, indent=2))
+    else:
+        print(f"{'metric':40} {'baseline':>12} {'candidate':>12} {'change':>8}")
+        for row in rows:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"{row['metric']:40} {row['baseline']:>12} {row['candidate']:>12} {row['change']:>+8.1%}{flag}")
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Benchmark data: configs, a stand-in cassette, a result corpus and AI payloads"""
+import asyncio
+import copy
+import gzip
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+from app.core import ids
+from app.core.storage import JSONStorageService
+from app.services.catalog import CompiledCatalog
+from app.services.http_engine import DEFAULT_TEST_SEQUENCE, EnvironmentClientPool, HTTPExecutionEngine
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+PRODUCTS_EXAMPLE = REPO_ROOT / "config" / "products.json.example"
+
+# Environments of the stand-in; target and baseline answer with slightly different premiums
+ENVIRONMENTS = ("qa", "stage")
+
+CORPUS_STATUSES = ("completed",) * 18 + ("interrupted",)
+
+
+def write_configs(data_dir: Path, replay_url: str) -> CompiledCatalog:
+    """Write products.json and an environments.json pointing at the replay server"""
+    configs = data_dir / "configs"
+    configs.mkdir(parents=True, exist_ok=True)
+    products = json.loads(PRODUCTS_EXAMPLE.read_text())
+    (configs / "products.json").write_text(json.dumps(products, indent=2))
+    environments = {
+        "environments": {
+            name: {"name": name.upper(), "base_url": f"{replay_url}/{name}", "auth": {"type": "bearer"}}
+            for name in ENVIRONMENTS
+        }
+    }
+    (configs / "environments.json").write_text(json.dumps(environments, indent=2))
+    return CompiledCatalog(products)
+
+
+def write_cassette(path: Path, catalog: CompiledCatalog):
+    """Record one exchange per plan, step and environment for the replay server"""
+    engine = HTTPExecutionEngine(EnvironmentClientPool())
+    lines = []
+    for plan_key in catalog.all_plans:
+        plan_config = catalog.plan_config(plan_key)
+        for step in plan_config.get("test_sequence") or DEFAULT_TEST_SEQUENCE:
+            request = engine.build_step_request(step, plan_key, plan_config)
+            for env_name in ENVIRONMENTS:
+                body = {
+                    "status": "success",
+                    "plan_key": plan_key,
+                    "step": request["step"],
+                    "premium": 1200.0 if env_name == "qa" else 1210.0,
+                    "reference": f"{env_name}-{plan_key}-{request['step']}"
+                }
+                lines.append(json.dumps({
+                    "env": env_name,
+                    "plan": plan_key,
+                    "step": request["step"],
+                    "method": request["method"],
+                    "path": request["path"],
+                    "status": 200,
+                    "ms": 10,
+                    "body": body
+                }) + "\n")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(gzip.compress("".join(lines).encode("utf-8")))
+
+
+def user_ids(users: int) -> List[str]:
+    return [f"bench_user_{i:04d}" for i in range(users)]
+
+
+async def generate_corpus(data_dir: Path, runs: int, users: int, plan_keys: List[str], seed: int = 1) -> float:
+    """Write ``runs`` finished result documents through the storage service; returns seconds taken"""
+    rng = random.Random(seed)
+    storage = JSONStorageService(str(data_dir))
+    owners = user_ids(users)
+    now = datetime.now()
+    started = time.perf_counter()
+    try:
+        for _ in range(runs):
+            test_id = ids.new_test_id()
+            started_at = now - timedelta(minutes=rng.randint(10, 60 * 24 * 90))
+            total = rng.randint(1, len(plan_keys))
+            failed = rng.randint(0, total // 4)
+            target, baseline = rng.sample(ENVIRONMENTS, 2)
+            await storage.save_test_result(test_id, {
+                "test_metadata": {
+                    "test_id": test_id,
+                    "user_id": rng.choice(owners),
+                    "started_at": started_at.isoformat(),
+                    "completed_at": (started_at + timedelta(minutes=rng.randint(1, 30))).isoformat(),
+                    "status": rng.choice(CORPUS_STATUSES),
+                    "scope": {"type": "all"},
+                    "environments": {"target": target, "baseline": baseline},
+                    "ai_prompt": "",
+                    "cassette": None
+                },
+                "execution_summary": {
+                    "total_plans": total,
+                    "completed_plans": total - failed,
+                    "failed_plans": failed,
+                    "total_api_calls": total * 8,
+                    "execution_time_minutes": round(rng.uniform(0.5, 30), 2)
+                },
+                "plan_results": {}
+            })
+    finally:
+        storage.index.close()
+    return time.perf_counter() - started
+
+
+def payload_pair(size_kb: int, seed: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """A quote-like response of about ``size_kb`` and a copy with a few changed fields"""
+    rng = random.Random(seed)
+    expected: Dict[str, Any] = {"quote_id": f"Q{seed}", "currency": "USD", "items": []}
+    size = 0
+    while size < size_kb * 1024:
+        item = {
+            "id": len(expected["items"]),
+            "plan_id": f"plan_{rng.randint(1, 500)}",
+            "premium": round(rng.uniform(100, 5000), 2),
+            "coverage": {"limit": rng.randint(10, 1000) * 1000, "deductible": rng.choice([0, 250, 500, 1000])},
+            "riders": [{"code": f"R{rng.randint(1, 40)}", "price": round(rng.uniform(1, 90), 2)} for _ in range(3)],
+            "effective_date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        }
+        expected["items"].append(item)
+        size += len(json.dumps(item))
+
+    actual = copy.deepcopy(expected)
+    for item in rng.sample(actual["items"], max(1, len(actual["items"]) // 100)):
+        item["premium"] = round(item["premium"] * 1.05, 2)
+        item["coverage"]["deductible"] += 250
+    return expected, actual
+
+
+def run_corpus(data_dir: Path, runs: int, users: int, plan_keys: List[str], seed: int = 1) -> float:
+    return asyncio.run(generate_corpus(data_dir, runs, users, plan_keys, seed))
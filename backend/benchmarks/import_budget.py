@@ -0,0 +1,88 @@
+"""Check what importing the API costs.
+
+    cd backend
+    python -m benchmarks.import_budget [--budget-ms 1500] [--json]
+
+Imports ``app.main`` in fresh interpreters with ``-X importtime`` and fails
+(exit status 1) when a heavy module is loaded at startup or the import takes
+longer than the budget. AI backends are meant to load on first use.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Packages that must not be loaded just by starting the API
+FORBIDDEN = ("huggingface_hub", "transformers", "torch", "tokenizers", "safetensors", "numpy")
+
+PROBE = "import json, sys; import {module}; print(json.dumps(sorted(sys.modules)))"
+
+
+def measure(module: str) -> Tuple[float, List[Tuple[str, float, float]], List[str]]:
+    """(total ms, [(module, self ms, cumulative ms)], loaded modules) for one cold import"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    timings = []
+    total = 0.0
+    for line in result.stderr.splitlines():
+        # "import time:   self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        timings.append((name.strip(), int(own) / 1000, int(cumulative) / 1000))
+        if name.strip() == module:
+            total = int(cumulative) / 1000
+    return total, timings, json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget of the API")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Allowed cumulative import time")
+    parser.add_argument("--repeat", type=int, default=3, help="Cold imports measured; the fastest counts")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules listed")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    total, timings, loaded = min(runs, key=lambda run: run[0])
+    forbidden = [name for name in FORBIDDEN if name in loaded]
+    app_ms = sum(own for name, own, _ in timings if name == "app" or name.startswith("app."))
+    report: Dict[str, Any] = {
+        "module": args.module,
+        "import_ms": round(total, 1),
+        "app_modules_ms": round(app_ms, 1),
+        "budget_ms": args.budget_ms,
+        "modules_loaded": len(loaded),
+        "forbidden_loaded": forbidden,
+        "slowest": [
+            {"module": name, "self_ms": round(own, 1), "cumulative_ms": round(cumulative, 1)}
+            for name, own, cumulative in sorted(timings, key=lambda t: t[1], reverse=True)[:args.top]
+        ]
+    }
+    failures = []
+    if forbidden:
+        failures.append(f"heavy modules imported at startup: {', '.join(forbidden)}")
+    if total > args.budget_ms:
+        failures.append(f"import took {total:.0f} ms, budget is {args.budget_ms:.0f} ms")
+    report["failures"] = failures
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{args.module}: {total:.0f} ms (app modules {app_ms:.0f} ms), {len(loaded)} modules, budget {args.budget_ms:.0f} ms")
+        for entry in report["slowest"]:
+            print(f"  {entry['self_ms']:>8.1f} ms  {entry['module']}")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Load generation and result aggregation for the benchmarks"""
+import asyncio
+import math
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+import httpx
+
+# (client) -> response; raising counts as an error
+RequestFn = Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class LoadResult:
+    """Latencies and errors of one scenario"""
+
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.errors = 0
+        self.statuses: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    async def measure(self, client: httpx.AsyncClient, request: RequestFn):
+        started = time.perf_counter()
+        try:
+            response = await request(client)
+            status = str(response.status_code)
+            if response.status_code >= 400:
+                self.errors += 1
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+            self.errors += 1
+        self.latencies_ms.append((time.perf_counter() - started) * 1000)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        duration = (self.finished or time.perf_counter()) - self.started
+        ordered = sorted(self.latencies_ms)
+        latency = {"mean": round(sum(ordered) / len(ordered), 2) if ordered else None}
+        for name, q in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99), ("max", 1.0)):
+            value = percentile(ordered, q)
+            latency[name] = round(value, 2) if value is not None else None
+        return {
+            "requests": len(ordered),
+            "errors": self.errors,
+            "statuses": self.statuses,
+            "duration_seconds": round(duration, 3),
+            "throughput_rps": round(len(ordered) / duration, 2) if duration > 0 else None,
+            "latency_ms": latency
+        }
+
+
+async def closed_loop(
+    client: httpx.AsyncClient,
+    request: RequestFn,
+    concurrency: int,
+    duration: Optional[float] = None,
+    total: Optional[int] = None
+) -> LoadResult:
+    """Keep ``concurrency`` requests in flight until ``duration`` passes or ``total`` are sent"""
+    result = LoadResult()
+    deadline = result.started + duration if duration else None
+    remaining = [total] if total is not None else None
+
+    async def user():
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if remaining is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            await result.measure(client, request)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    result.finish()
+    return result
+
+
+async def paced(
+    client: httpx.AsyncClient,
+    request: RequestFn,
+    viewers: int,
+    interval: float,
+    until: Callable[[], bool]
+) -> LoadResult:
+    """Each viewer sends one request per ``interval`` seconds, like a dashboard, until ``until()``"""
+    result = LoadResult()
+
+    async def viewer(offset: float):
+        await asyncio.sleep(offset)
+        while not until():
+            started = time.perf_counter()
+            await result.measure(client, request)
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+    # Spread viewers over the interval instead of polling in lockstep
+    await asyncio.gather(*(viewer(interval * i / viewers) for i in range(viewers)))
+    result.finish()
+    return result
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """High-water RSS of a process and its children, from /proc (Linux only)"""
+    total_kb = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            for line in Path(f"/proc/{current}/status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    total_kb += int(line.split()[1])
+            for task in Path(f"/proc/{current}/task").iterdir():
+                children = (task / "children").read_text().split()
+                pending.extend(int(child) for child in children)
+    except (OSError, ValueError):
+        if not total_kb:
+            return None
+    return round(total_kb / 1024, 1)
@@ -0,0 +1,93 @@
+"""Check paging through a result with cursors.
+
+    cd backend
+    python -m benchmarks.results_check
+
+Writes a finished run with three journaled plans into a temporary data
+directory and pages through ``GET /results/{test_id}`` one plan at a time.
+Every plan must come back exactly once, and a cursor that cannot be decoded
+or names no plan of the run must give 400 rather than an empty last page.
+Exits with status 1 on any failure.
+"""
+import asyncio
+import base64
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import List
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.v1.endpoints import results
+from app.core.storage import JSONStorageService
+
+PLAN_KEYS = ["car:basic:plan_a", "car:basic:plan_b", "car:basic:plan_c"]
+
+
+async def write_run(storage: JSONStorageService, test_id: str):
+    await storage.save_test_result(test_id, {
+        "test_metadata": {
+            "test_id": test_id,
+            "user_id": "results_check",
+            "started_at": "2026-01-01T10:00:00",
+            "status": "completed",
+            "environments": {"target": "qa", "baseline": "stage"}
+        },
+        "execution_summary": {"total_plans": len(PLAN_KEYS), "completed_plans": len(PLAN_KEYS), "failed_plans": 0}
+    })
+    for plan_key in PLAN_KEYS:
+        await storage.append_plan_result(test_id, plan_key, {"status": "completed", "api_calls": []})
+
+
+def check(data_dir: Path) -> List[str]:
+    storage = JSONStorageService(str(data_dir))
+    test_id = "test_results_check"
+    asyncio.run(write_run(storage, test_id))
+
+    app = FastAPI()
+    app.state.storage = storage
+    app.include_router(results.router, prefix="/results")
+    client = TestClient(app)
+    url = f"/results/{test_id}"
+
+    failures = []
+    seen, cursor = [], None
+    for _ in range(len(PLAN_KEYS) + 1):
+        params = {"sections": "plan_results", "limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(url, params=params)
+        if response.status_code != 200:
+            failures.append(f"page after {seen[-1:]} gave {response.status_code}")
+            break
+        body = response.json()
+        seen.extend(body["plan_results"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    if seen != PLAN_KEYS:
+        failures.append(f"paging returned {seen}, expected {PLAN_KEYS}")
+
+    stale = base64.urlsafe_b64encode(b"car:basic:plan_gone").decode("ascii")
+    for label, bad in (("undecodable", "not*base64"), ("unknown plan", stale)):
+        response = client.get(url, params={"limit": 1, "cursor": bad})
+        if response.status_code != 400:
+            failures.append(f"{label} cursor gave {response.status_code}, expected 400")
+    storage.index.close()
+    return failures
+
+
+def main():
+    data_dir = Path(tempfile.mkdtemp(prefix="results_check_"))
+    try:
+        failures = check(data_dir)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    print(f"result paging: {len(failures)} failures")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""Run the API benchmarks and write the results as JSON.
+
+    cd backend
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.compare baseline.json bench.json
+
+A fresh data directory gets the example product catalog, a corpus of
+finished runs for the listings, and a cassette for the replay server that
+stands in for the qa and stage environments. The API then runs under
+uvicorn in a separate process, with its usual embedded plan worker.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import httpx
+from benchmarks import corpus
+from benchmarks.load import closed_loop, paced, peak_rss_mb
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+SCENARIOS = ("listing", "ai", "runs")
+
+# Owner of the runs the benchmark starts, kept apart from the corpus users
+RUNNER_USER = "bench_runner"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_process(args: List[str], env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen(args, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def stop_process(process: subprocess.Popen):
+    if process.poll() is not None:
+        return
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def user_listing(client: httpx.AsyncClient, args: argparse.Namespace, rng: random.Random) -> Dict[str, Any]:
+    """Dashboard listings with a mix of filters over the corpus"""
+    users = corpus.user_ids(args.users)
+
+    async def request(c: httpx.AsyncClient) -> httpx.Response:
+        params: Dict[str, Any] = {"limit": 20}
+        status = rng.choice((None, None, "completed", "interrupted"))
+        if status:
+            params["status"] = status
+        if rng.random() < 0.3:
+            params["target_env"] = rng.choice(corpus.ENVIRONMENTS)
+        if rng.random() < 0.2:
+            params["sort_by"] = "failed_plans"
+        return await c.get(f"/api/v1/results/user/{rng.choice(users)}", params=params)
+
+    result = await closed_loop(client, request, args.listing_concurrency, duration=args.duration)
+    return {"user_listing": result.to_dict()}
+
+
+async def ai_analyze(client: httpx.AsyncClient, args: argparse.Namespace, rng: random.Random) -> Dict[str, Any]:
+    """Large analyze-differences payloads; bodies are encoded up front so the client stays cheap"""
+    bodies = [
+        json.dumps({"expected": expected, "actual": actual}).encode("utf-8")
+        for expected, actual in (corpus.payload_pair(args.ai_payload_kb, seed) for seed in range(4))
+    ]
+
+    async def request(c: httpx.AsyncClient) -> httpx.Response:
+        return await c.post(
+            "/api/v1/ai/analyze-differences",
+            content=rng.choice(bodies),
+            headers={"Content-Type": "application/json"}
+        )
+
+    result = await closed_loop(client, request, args.ai_concurrency, duration=args.duration)
+    return {"ai_analyze": dict(result.to_dict(), payload_kb=args.ai_payload_kb)}
+
+
+async def test_runs(
+    client: httpx.AsyncClient,
+    args: argparse.Namespace,
+    rng: random.Random,
+    plans_per_run: int
+) -> Dict[str, Any]:
+    """Concurrent starts, then dashboard polling while the workers drain the runs"""
+    test_ids: List[str] = []
+    body = {
+        "user_id": RUNNER_USER,
+        "target_env": "qa",
+        "baseline_env": "stage",
+        "scope": {"type": "all"},
+        "admin_token": "bench",
+        "customer_token": "bench",
+        "ai_prompt": ""
+    }
+
+    async def start(c: httpx.AsyncClient) -> httpx.Response:
+        response = await c.post("/api/v1/tests/start", json=body)
+        if response.status_code == 200:
+            test_ids.append(response.json()["test_id"])
+        return response
+
+    started = time.perf_counter()
+    starts = await closed_loop(client, start, args.start_concurrency, total=args.runs)
+    if not test_ids:
+        return {"start_tests": starts.to_dict()}
+
+    drained = asyncio.Event()
+
+    async def watch():
+        # One listing per tick tells how many runs have completed
+        deadline = time.perf_counter() + args.run_timeout
+        while time.perf_counter() < deadline:
+            response = await client.get(
+                f"/api/v1/results/user/{RUNNER_USER}", params={"status": "completed", "limit": 1}
+            )
+            if response.status_code == 200 and response.json()["total_tests"] >= len(test_ids):
+                break
+            await asyncio.sleep(0.5)
+        drained.set()
+
+    async def poll(c: httpx.AsyncClient) -> httpx.Response:
+        return await c.get(f"/api/v1/tests/{rng.choice(test_ids)}/status")
+
+    watcher = asyncio.create_task(watch())
+    polling = await paced(client, poll, args.viewers, args.poll_interval, drained.is_set)
+    await watcher
+    seconds = time.perf_counter() - started
+
+    completed = (await client.get(
+        f"/api/v1/results/user/{RUNNER_USER}", params={"status": "completed", "limit": 1}
+    )).json()["total_tests"]
+    return {
+        "start_tests": starts.to_dict(),
+        "status_polling": dict(polling.to_dict(), viewers=args.viewers, poll_interval=args.poll_interval),
+        "run_drain": {
+            "runs": len(test_ids),
+            "completed": completed,
+            "plans": len(test_ids) * plans_per_run,
+            "duration_seconds": round(seconds, 3),
+            "plans_per_second": round(len(test_ids) * plans_per_run / seconds, 2)
+        }
+    }
+
+
+async def run_scenarios(base_url: str, args: argparse.Namespace, plans_per_run: int) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    results: Dict[str, Any] = {}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        # Listings first, so the corpus is all they see
+        if "listing" in args.scenarios:
+            results.update(await user_listing(client, args, rng))
+        if "ai" in args.scenarios:
+            results.update(await ai_analyze(client, args, rng))
+        if "runs" in args.scenarios:
+            results.update(await test_runs(client, args, rng, plans_per_run))
+    return results
+
+
+def print_summary(report: Dict[str, Any]):
+    for name, result in report["scenarios"].items():
+        if "latency_ms" in result:
+            latency = result["latency_ms"]
+            print(
+                f"{name:16} {result['throughput_rps']:>9} req/s  p50 {latency['p50']} ms  "
+                f"p99 {latency['p99']} ms  errors {result['errors']}/{result['requests']}",
+                file=sys.stderr
+            )
+        else:
+            print(f"{name:16} {json.dumps(result)}", file=sys.stderr)
+    print(f"{'peak_rss_mb':16} {report['server']['peak_rss_mb']}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API against a replay stand-in")
+    parser.add_argument("--output", help="Write results here instead of stdout")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated subset of {SCENARIOS}")
+    parser.add_argument("--corpus-runs", type=int, default=20000, help="Finished runs generated for the listings")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per closed-loop scenario")
+    parser.add_argument("--listing-concurrency", type=int, default=16)
+    parser.add_argument("--ai-concurrency", type=int, default=4)
+    parser.add_argument("--ai-payload-kb", type=int, default=512)
+    parser.add_argument("--runs", type=int, default=50, help="Test runs started")
+    parser.add_argument("--start-concurrency", type=int, default=25)
+    parser.add_argument("--viewers", type=int, default=50, help="Dashboards polling run status")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--run-timeout", type=float, default=600)
+    parser.add_argument("--latency", default="uniform:5:20", help="Replay latency spec for the environments")
+    parser.add_argument("--api-workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep-data", action="store_true", help="Keep the data directory and server logs")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    data_dir = Path(tempfile.mkdtemp(prefix="insurance_bench_"))
+    replay_port, api_port = free_port(), free_port()
+    catalog = corpus.write_configs(data_dir, f"http://127.0.0.1:{replay_port}")
+    cassette = data_dir / "bench_cassette.jsonl.gz"
+    corpus.write_cassette(cassette, catalog)
+    corpus_seconds = 0.0
+    if "listing" in args.scenarios:
+        print(f"Generating {args.corpus_runs} runs in {data_dir}", file=sys.stderr)
+        corpus_seconds = corpus.run_corpus(data_dir, args.corpus_runs, args.users, catalog.all_plans, args.seed)
+
+    env = dict(
+        os.environ,
+        DATA_DIR=str(data_dir),
+        PYTHONPATH=str(BACKEND_DIR),
+        ANALYSIS_CACHE_ENABLED="false",  # Every request does the work
+        HUGGINGFACE_TOKEN="",
+        AI_LOCAL_MODEL="",
+        RETENTION_ENABLED="false",
+        WORKER_EMBEDDED="true"
+    )
+    replay = start_process(
+        [sys.executable, "-m", "app.services.replay", "--cassette", str(cassette),
+         "--port", str(replay_port), "--latency", args.latency, "--seed", str(args.seed)],
+        env, data_dir / "replay.log"
+    )
+    api = start_process(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(api_port),
+         "--workers", str(args.api_workers), "--log-level", "warning", "--no-access-log"],
+        env, data_dir / "api.log"
+    )
+    base_url = f"http://127.0.0.1:{api_port}"
+    try:
+        asyncio.run(wait_ready(f"http://127.0.0.1:{replay_port}/__replay__/stats", replay))
+        asyncio.run(wait_ready(f"{base_url}/health", api))
+        scenarios = asyncio.run(run_scenarios(base_url, args, len(catalog.all_plans)))
+        rss = peak_rss_mb(api.pid)
+    finally:
+        stop_process(api)
+        stop_process(replay)
+        if args.keep_data:
+            print(f"Data and server logs kept in {data_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "schema": 1,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "keep_data")},
+        "corpus": {"runs": args.corpus_runs if "listing" in args.scenarios else 0, "generate_seconds": round(corpus_seconds, 2)},
+        "scenarios": scenarios,
+        "server": {"peak_rss_mb": rss}
+    }
+    print_summary(report)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
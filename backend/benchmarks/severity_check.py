@@ -0,0 +1,105 @@
+"""Check the compiled severity rules against a plain reading of the rules.
+
+    cd backend
+    python -m benchmarks.severity_check [--cases 20000] [--seed 1]
+
+``RuleSet`` folds every rule into one dictionary and a few regexes per
+severity. This script classifies fixed cases and random rule sets both ways:
+with ``RuleSet`` and by trying every rule in turn and keeping the highest
+severity that matches. It exits with status 1 when the two disagree.
+"""
+import argparse
+import random
+import re
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+from app.services.severity import SEVERITIES, RuleSet, glob_to_regex
+
+# (rules, field, path, expected severity)
+CASES: List[Tuple[List[Dict[str, Any]], str, str, Optional[str]]] = [
+    # An exact name beats a weaker pattern on the same field
+    (
+        [{"severity": "critical", "fields": ["premium_total"]}, {"severity": "warning", "contains": ["premium"]}],
+        "premium_total", "/premium_total", "critical"
+    ),
+    (
+        [{"severity": "warning", "fields": ["status"]}, {"severity": "info", "regex": ["stat"]}],
+        "status", "/policy/status", "warning"
+    ),
+    (
+        [{"severity": "warning", "fields": ["start_date"]}, {"severity": "info", "paths": ["/policy/*"]}],
+        "start_date", "/policy/start_date", "warning"
+    ),
+    # A stronger pattern beats a weaker exact name
+    (
+        [{"severity": "info", "fields": ["premium"]}, {"severity": "critical", "contains": ["prem"]}],
+        "premium", "/premium", "critical"
+    ),
+    ([{"severity": "info", "fields": ["note"]}], "Note", "/note", "info"),
+    ([{"severity": "warning", "contains": ["date"]}], "amount", "/amount", None),
+]
+
+NAMES = ["premium", "status", "policy_id", "start_date", "amount", "note", "coverage", "payment_status"]
+SEGMENTS = ["policy", "payment", "items", "*", "**"]
+
+
+def reference(rules: List[Dict[str, Any]], field: str, path: str) -> Optional[str]:
+    """Highest severity of any rule that matches, one rule at a time"""
+    matched = []
+    for rule in rules:
+        hit = (
+            any(field.lower() == name.lower() for name in rule.get("fields", []))
+            or any(part.lower() in field.lower() for part in rule.get("contains", []))
+            or any(re.search(pattern, field, re.IGNORECASE) for pattern in rule.get("regex", []))
+            or any(re.match("^(?:" + glob_to_regex(glob) + ")$", path) for glob in rule.get("paths", []))
+        )
+        if hit:
+            matched.append(rule["severity"])
+    return min(matched, key=SEVERITIES.index) if matched else None
+
+
+def random_rules(rng: random.Random) -> List[Dict[str, Any]]:
+    rules = []
+    for _ in range(rng.randint(1, 5)):
+        rule: Dict[str, Any] = {"severity": rng.choice(SEVERITIES)}
+        if rng.random() < 0.6:
+            rule["fields"] = rng.sample(NAMES, rng.randint(1, 2))
+        if rng.random() < 0.5:
+            rule["contains"] = [rng.choice(NAMES)[:rng.randint(3, 6)]]
+        if rng.random() < 0.3:
+            rule["regex"] = [rng.choice(["_id$", "^pay", "date", "stat"])]
+        if rng.random() < 0.3:
+            rule["paths"] = ["/" + "/".join(rng.sample(SEGMENTS, rng.randint(1, 2)))]
+        rules.append(rule)
+    return rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare compiled severity rules with a plain reading")
+    parser.add_argument("--cases", type=int, default=20000, help="Random rule sets checked")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    failures = []
+    for rules, field, path, expected in CASES:
+        actual = RuleSet(rules).classify(field, path)
+        if actual != expected:
+            failures.append(f"{field} {path}: got {actual}, expected {expected} with {rules}")
+
+    rng = random.Random(args.seed)
+    for _ in range(args.cases):
+        rules = random_rules(rng)
+        field = rng.choice(NAMES)
+        path = "/" + "/".join([rng.choice(["policy", "payment", "items"]), field])
+        actual, expected = RuleSet(rules).classify(field, path), reference(rules, field, path)
+        if actual != expected:
+            failures.append(f"{field} {path}: got {actual}, expected {expected} with {rules}")
+
+    print(f"{len(CASES)} fixed and {args.cases} random cases, {len(failures)} mismatches")
+    for failure in failures[:20]:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Check that storage migration leaves live runs alone.
+
+    cd backend
+    python -m benchmarks.storage_check
+
+Writes a finished and a running run into a temporary data directory, both
+with inline plan results and a plan journal, then runs ``migrate_storage``.
+The finished run must be migrated; the running run's document and journal
+must be byte-for-byte unchanged, because its worker keeps appending to them.
+Exits with status 1 on any failure.
+"""
+import asyncio
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Any, List
+from app.core.storage import JSONStorageService
+
+
+def run_document(test_id: str, status: str) -> Dict[str, Any]:
+    return {
+        "test_metadata": {
+            "test_id": test_id,
+            "user_id": "storage_check",
+            "started_at": "2026-01-01T10:00:00",
+            "status": status,
+            "environments": {"target": "qa", "baseline": "stage"}
+        },
+        "execution_summary": {"total_plans": 2, "completed_plans": 1, "failed_plans": 0},
+        "plan_results": {"car:basic:plan_a": {"status": "completed", "api_calls": []}}
+    }
+
+
+async def check(data_dir: Path) -> List[str]:
+    storage = JSONStorageService(str(data_dir))
+    finished, running = "test_storage_check_done", "test_storage_check_live"
+    for test_id, status in ((finished, "completed"), (running, "running")):
+        await storage.save_test_result(test_id, run_document(test_id, status))
+        await storage.append_plan_result(test_id, "car:basic:plan_b", {"status": "completed", "api_calls": []})
+
+    live_paths = [storage._test_path(running), storage._plans_path(running)]
+    before = [path.read_bytes() for path in live_paths]
+    stats = await storage.migrate_storage()
+
+    failures = []
+    if stats.get("skipped_live") != 1:
+        failures.append(f"expected one live run skipped, stats were {stats}")
+    for path, content in zip(live_paths, before):
+        if path.read_bytes() != content:
+            failures.append(f"{path.name} of the running run was rewritten")
+    migrated = await storage.get_test_document(finished)
+    if migrated is None or migrated.get("plan_results"):
+        failures.append("the finished run's inline plan results were not moved into its journal")
+    storage.index.close()
+    return failures
+
+
+def main():
+    data_dir = Path(tempfile.mkdtemp(prefix="storage_check_"))
+    try:
+        failures = asyncio.run(check(data_dir))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    print(f"storage migration: {len(failures)} failures")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -96,7 +96,7 @@ class InsuranceTestingPlatform {
       this.currentTest = result.test_id;
       this.showAlert('Test started successfully!', 'success');
       this.showPage('progress');
-      this.startProgressPolling(result.test_id);
+      this.startProgressStream(result.test_id);
     } catch (error) {
       this.showAlert(error.message || 'Failed to start test', 'error');
     }
@@ -117,6 +117,66 @@ class InsuranceTestingPlatform {
   }
 
   // Progress Tracking
+  startProgressStream(testId) {
+    if (!window.EventSource) {
+      this.startProgressPolling(testId);
+      return;
+    }
+
+    const source = new EventSource(`${this.apiBase}/tests/${testId}/events`);
+    let progress = null;
+
+    source.onmessage = (message) => {
+      const event = JSON.parse(message.data);
+
+      if (event.type === 'snapshot') {
+        progress = event;
+      } else if (progress && event.type === 'run_finished') {
+        progress.status = event.status;
+        progress.progress = event.progress;
+        progress.current_step = event.status === 'interrupted' ? 'Test interrupted'
+          : event.status === 'failed' ? 'Test failed'
+          : 'Test completed';
+      } else if (progress && event.plan) {
+        const plan = progress.plans[event.plan] || (progress.plans[event.plan] = { progress: 0 });
+        if (event.type === 'plan_started') {
+          plan.status = 'running';
+        } else if (event.type === 'step_progress') {
+          plan.status = 'running';
+          plan.progress = event.progress;
+          plan.current_step = `Processing ${event.step}`;
+          progress.current_step = `Testing ${event.plan}`;
+        } else if (event.type === 'plan_finished') {
+          plan.status = event.status;
+          plan.error = event.error;
+          plan.progress = event.status === 'completed' ? 100 : plan.progress;
+          progress.progress = event.run_progress;
+        }
+      }
+
+      if (!progress) return;
+      this.updateProgressDisplay(progress);
+
+      if (event.type === 'run_finished') {
+        source.close();
+        if (progress.status === 'completed') {
+          this.currentTestResults = progress;
+          document.getElementById('view-results-btn')?.classList.remove('hidden');
+        } else if (progress.status === 'failed') {
+          this.showAlert('Test failed. Please check configuration.', 'error');
+        }
+      }
+    };
+
+    source.onerror = () => {
+      // Fall back to polling if the stream cannot be opened or drops mid-run
+      source.close();
+      if (!progress || progress.status === 'running') {
+        this.startProgressPolling(testId);
+      }
+    };
+  }
+
   startProgressPolling(testId) {
     const pollInterval = setInterval(async () => {
       try {